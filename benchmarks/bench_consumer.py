@@ -0,0 +1,107 @@
+"""
+Throughput benchmark of the central consumer.
+
+Fills a list on a local Redis with synthetic log entries, then drains it
+with the consumer and reports events per second for the whole pipeline
+(bulk pop, batch decoding, sliding-window index) and for the decoding
+and indexing alone. --engine-only skips Redis entirely.
+
+Use a disposable Redis: the benchmark list is deleted before and after.
+
+Usage:
+    python benchmarks/bench_consumer.py [--events N] [--users N] [--batch-size N] [--engine-only]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import redis.asyncio as redis
+
+from node_agent.consumer import Consumer, ListSource, SlidingWindowIPs, decode_batch
+
+
+def make_entries(events: int, users: int, rate: float) -> List[str]:
+    """Build serialized log entries spread over events / rate seconds."""
+    rng = random.Random(1)
+    started = time.time() - events / rate
+    return [
+        json.dumps({
+            'timestamp': started + i / rate,
+            'node_id': f"node-{i % 20}",
+            'node_name': f"Node {i % 20}",
+            'email': f"{(user := rng.randrange(users))}.user_{user}",
+            'client_ip': f"10.{user % 250}.{rng.randrange(4)}.{user % 200}",
+            'raw_line': "",
+            'processed_at': started + i / rate,
+        })
+        for i in range(events)
+    ]
+
+
+def bench_engine(entries: List[str], batch_size: int, ip_limit: int) -> float:
+    """Decode and index every batch in process, returning the elapsed time."""
+    consumer = Consumer(None, None, SlidingWindowIPs(), ip_limit=ip_limit)
+    started = time.perf_counter()
+    for start in range(0, len(entries), batch_size):
+        consumer.process(decode_batch(entries[start:start + batch_size]))
+    return time.perf_counter() - started
+
+
+async def bench_redis(args: argparse.Namespace, entries: List[str]) -> float:
+    """Drain the benchmark list through Redis, returning the elapsed time."""
+    client = redis.from_url(args.redis_url, decode_responses=True)
+    await client.delete(args.key)
+    pipe = client.pipeline(transaction=False)
+    for start in range(0, len(entries), 1000):
+        pipe.lpush(args.key, *entries[start:start + 1000])
+    await pipe.execute()
+    
+    source = ListSource(client, args.key, args.batch_size, block_timeout=0.1)
+    consumer = Consumer(client, source, SlidingWindowIPs(), ip_limit=args.ip_limit, result_key=args.result_key)
+    started = time.perf_counter()
+    drained = 0
+    while drained < len(entries):
+        drained += await consumer.step()
+    elapsed = time.perf_counter() - started
+    
+    await client.delete(args.key, args.result_key)
+    await client.close()
+    return elapsed
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=5000.0, help="simulated events per second of log time")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--ip-limit", type=int, default=3)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--key", default="bench_consumer_queue")
+    parser.add_argument("--result-key", default="bench_consumer_violations")
+    parser.add_argument("--engine-only", action="store_true", help="skip Redis, measure decoding and indexing")
+    args = parser.parse_args()
+    
+    entries = make_entries(args.events, args.users, args.rate)
+    print(f"{args.events} events, {args.users} users, batch size {args.batch_size}")
+    
+    elapsed = bench_engine(entries, args.batch_size, args.ip_limit)
+    print(f"decode + index {args.events / elapsed:10.0f} events/s")
+    
+    if not args.engine_only:
+        elapsed = asyncio.run(bench_redis(args, entries))
+        print(f"redis pipeline {args.events / elapsed:10.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Payload size and serialization time of email dictionary encoding.
+
+Parses synthetic Xray access log lines into log entries and serializes
+them as plain JSON and with EMAIL_DICTIONARY (email replaced by an integer
+id), with and without raw_line (which backpressure empties). Reports bytes
+per entry and microseconds per entry, on the node and for decoding on the
+central side with a warm id cache.
+
+Usage:
+    python benchmarks/bench_email_dictionary.py [--entries N] [--users N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.email_dictionary import EmailDecoder
+from node_agent.log_formats import LogFormatParser
+from node_agent.log_forwarder import LogForwarder
+
+
+def make_entries(count: int, users: int, raw_line: bool) -> List[Dict[str, Any]]:
+    """Parse synthetic access log lines into log entries."""
+    parser = LogFormatParser("xray")
+    entries = []
+    for i in range(count):
+        user = i * 7919 % users
+        line = (
+            f"2024/01/15 10:30:{i % 60:02d} from 10.{user % 250}.{i % 200}.{i % 100}:{40000 + i % 20000} "
+            f"accepted tcp:www.example{i % 50}.com:443 [VLESS_TCP_REALITY >> DIRECT] "
+            f"email: {user}.username_with_suffix"
+        )
+        entry = parser.parse(line, "node-de-fra-01", "Frankfurt 01")
+        if not raw_line:
+            entry['raw_line'] = ""
+        entries.append(entry)
+    return entries
+
+
+async def timed(serialize: Callable[[], Awaitable[List[Any]]]) -> Tuple[List[Any], float]:
+    """Run a serializer, returning the output and the best of three timings."""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        output = await serialize()
+        best = min(best, time.perf_counter() - started)
+    return output, best
+
+
+async def run(entries: List[Dict[str, Any]], label: str) -> None:
+    """Compare plain and encoded serialization for one set of entries."""
+    config = NodeConfig(
+        node_id="node-de-fra-01",
+        node_name="Frankfurt 01",
+        central_redis_url="redis://localhost:6379/0",
+        access_log_path=os.devnull,
+        email_dictionary=True
+    )
+    forwarder = LogForwarder(config)
+    forwarder.email_dictionary.loaded = True
+    
+    async def serialize_plain() -> List[str]:
+        return [json.dumps(entry) for entry in entries]
+    
+    plain, plain_time = await timed(serialize_plain)
+    # Ids are assigned by the first run; later runs measure the steady state
+    encoded, encoded_time = await timed(lambda: forwarder._serialize_encoded(entries))
+    
+    decoder = EmailDecoder(None)
+    for email, email_id in forwarder.email_dictionary.ids.items():
+        decoder._remember((config.node_id, email_id), email)
+    
+    async def decode() -> List[Dict[str, Any]]:
+        decoded = [json.loads(item) for item in encoded]
+        await decoder.decode(decoded)
+        return decoded
+    
+    _, decode_time = await timed(decode)
+    
+    count = len(entries)
+    plain_bytes = sum(map(len, plain)) / count
+    encoded_bytes = sum(map(len, encoded)) / count
+    print(
+        f"{label:<14} plain {plain_bytes:6.1f} B {plain_time / count * 1e6:5.2f} us | "
+        f"encoded {encoded_bytes:6.1f} B ({encoded_bytes / plain_bytes - 1:+6.1%}) "
+        f"{encoded_time / count * 1e6:5.2f} us | decode {decode_time / count * 1e6:5.2f} us"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=3000)
+    args = parser.parse_args()
+    
+    print(f"{args.entries} entries, {args.users} users, per entry:")
+    asyncio.run(run(make_entries(args.entries, args.users, raw_line=True), "with raw_line"))
+    asyncio.run(run(make_entries(args.entries, args.users, raw_line=False), "raw_line empty"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the default asyncio event loop against uvloop.
+
+Writes synthetic access log lines to a file and measures how long the
+forwarder takes to tail, parse and deliver all of them, and the process
+CPU spent per line. Each loop runs in a fresh process. Lines go to the
+null sink unless --redis-url is given.
+
+Usage:
+    python benchmarks/bench_event_loop.py [--lines N] [--redis-url URL]
+
+In the Docker image:
+    docker compose run --rm -v "$PWD/benchmarks:/app/benchmarks" node-agent \\
+        python benchmarks/bench_event_loop.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.log_forwarder import LogForwarder
+from node_agent.main import setup_event_loop
+
+
+def make_line(i: int) -> str:
+    """Build a synthetic Xray access log line."""
+    return (
+        f"2024/01/15 10:30:{i % 60:02d} from 10.{i % 250}.{i % 200}.{i % 100}:{40000 + i % 20000} "
+        f"accepted tcp:www.example{i % 50}.com:443 [VLESS_TCP_REALITY >> DIRECT] "
+        f"email: {i % 3000}.user_{i % 3000}"
+    )
+
+
+async def forward_file(config: NodeConfig, lines: int) -> float:
+    """Forward the whole file and return the wall time it took."""
+    forwarder = LogForwarder(config)
+    forwarder._set_restored_position(0)
+    
+    started = time.perf_counter()
+    task = asyncio.create_task(forwarder.start())
+    while forwarder.lines_read < lines:
+        await asyncio.sleep(0.005)
+    await forwarder.stop()
+    elapsed = time.perf_counter() - started
+    
+    await asyncio.gather(task, return_exceptions=True)
+    return elapsed
+
+
+def run_child(loop_name: str, path: str, lines: int, batch_size: int, redis_url: str) -> None:
+    """Measure one loop in this process and print the result as JSON."""
+    used = setup_event_loop(loop_name)
+    config = NodeConfig(
+        node_id="bench-node",
+        node_name="Bench Node",
+        central_redis_url=redis_url,
+        access_log_path=path,
+        batch_size=batch_size,
+        flush_interval=0.05,
+        stats_log_interval=0,
+        log_level="WARNING",
+        sink="redis" if redis_url else "null"
+    )
+    
+    cpu_started = time.process_time()
+    elapsed = asyncio.run(forward_file(config, lines))
+    cpu = time.process_time() - cpu_started
+    print(json.dumps({'loop': used, 'elapsed': elapsed, 'cpu': cpu}))
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--redis-url", default="", help="deliver to this Redis instead of the null sink")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child, args.path, args.lines, args.batch_size, args.redis_url)
+        return
+    
+    with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+        f.write("".join(f"{make_line(i)}\n" for i in range(args.lines)))
+    
+    print(f"{args.lines} lines, batch size {args.batch_size}, sink {'redis' if args.redis_url else 'null'}")
+    try:
+        for loop_name in ("asyncio", "uvloop"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", loop_name, "--path", f.name,
+                 "--lines", str(args.lines), "--batch-size", str(args.batch_size),
+                 "--redis-url", args.redis_url],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            if result['loop'] != loop_name:
+                print(f"{loop_name:<8} not installed, skipped")
+                continue
+            print(
+                f"{loop_name:<8} {args.lines / result['elapsed']:9.0f} lines/s, "
+                f"{result['cpu'] / args.lines * 1e6:6.2f} us CPU/line, "
+                f"{result['elapsed']:6.2f}s wall"
+            )
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark of CPU spent in the agent's own logging.
+
+Feeds synthetic access log lines through LogForwarder with an in-memory
+Redis stand-in and profiles the run, reporting how much CPU time is
+spent inside the logging package at each log level.
+
+Usage:
+    python benchmarks/bench_logging.py [--lines N] [--batch-size N]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import time
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.log_forwarder import LogForwarder
+
+
+LOGGING_DIR = os.path.dirname(logging.__file__)
+
+
+class NullRedis:
+    """In-memory stand-in for the Redis client."""
+    
+    async def lpush(self, key, *values):
+        return len(values)
+    
+    async def set(self, key, value):
+        return True
+
+
+def make_line(i: int) -> str:
+    """Build a synthetic Xray access log line."""
+    return (
+        f"2024/01/15 10:30:{i % 60:02d} from 10.{i % 250}.{i % 200}.{i % 100}:{40000 + i % 20000} "
+        f"accepted tcp:www.example{i % 50}.com:443 [VLESS_TCP_REALITY >> DIRECT] "
+        f"email: {i % 3000}.user_{i % 3000}"
+    )
+
+
+async def feed(forwarder: LogForwarder, lines) -> None:
+    """Process all lines through the forwarder."""
+    for position, line in enumerate(lines):
+        forwarder.current_position = position
+        await forwarder._process_log_line(line)
+    await forwarder._flush_batch()
+
+
+def run(level: str, lines, batch_size: int) -> None:
+    """Profile one run at the given log level and print the result."""
+    root = logging.getLogger()
+    root.handlers = [logging.StreamHandler(open(os.devnull, "w"))]
+    root.setLevel(level)
+    
+    config = NodeConfig(
+        node_id="bench-node",
+        node_name="Bench Node",
+        central_redis_url="redis://localhost:6379/0",
+        access_log_path=os.devnull,
+        batch_size=batch_size,
+        log_level=level
+    )
+    
+    async def main():
+        forwarder = LogForwarder(config)
+        forwarder.redis_client = NullRedis()
+        
+        profiler = cProfile.Profile(time.process_time)
+        profiler.enable()
+        await feed(forwarder, lines)
+        profiler.disable()
+        return profiler
+    
+    profiler = asyncio.run(main())
+    stats = pstats.Stats(profiler)
+    total = stats.total_tt
+    in_logging = sum(
+        tottime for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items()
+        if filename.startswith(LOGGING_DIR)
+    )
+    
+    print(
+        f"{level:<8} total {total * 1000:8.1f} ms CPU, "
+        f"logging {in_logging * 1000:7.1f} ms ({in_logging / total:5.1%}), "
+        f"{total / len(lines) * 1e6:6.2f} us/line"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    
+    lines = [make_line(i) for i in range(args.lines)]
+    print(f"{args.lines} lines, batch size {args.batch_size}")
+    for level in ("WARNING", "INFO", "DEBUG"):
+        run(level, lines, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Serialization cost of the available serializers.
+
+Parses synthetic Xray access log lines into log entries and serializes
+them with every installed serializer, as the flush path does. Reports
+nanoseconds per entry to serialize, bytes per entry, and nanoseconds per
+entry to decode a batch on the central side.
+
+Usage:
+    python benchmarks/bench_serializers.py [--entries N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.log_formats import LogFormatParser
+from node_agent.serializers import SERIALIZERS, available_serializers, create_serializer, decode_batch
+
+
+def make_entries(count: int) -> List[Dict[str, Any]]:
+    """Parse synthetic access log lines into log entries."""
+    parser = LogFormatParser("xray")
+    entries = []
+    for i in range(count):
+        line = (
+            f"2024/01/15 10:30:{i % 60:02d} from 10.{i % 250}.{i % 200}.{i % 100}:{40000 + i % 20000} "
+            f"accepted tcp:www.example{i % 50}.com:443 [VLESS_TCP_REALITY >> DIRECT] "
+            f"email: {i % 3000}.username_with_suffix"
+        )
+        entries.append(parser.parse(line, "node-de-fra-01", "Frankfurt 01"))
+    return entries
+
+
+def timed(function: Callable[[], Any]) -> Tuple[Any, float]:
+    """Run a function, returning the output and the best of five timings."""
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        output = function()
+        best = min(best, time.perf_counter() - started)
+    return output, best
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=100000)
+    args = parser.parse_args()
+    
+    entries = make_entries(args.entries)
+    available = available_serializers()
+    count = len(entries)
+    print(f"{count} entries, per entry:")
+    
+    baseline = None
+    for name in SERIALIZERS:
+        if name not in available:
+            print(f"{name:<8} not installed")
+            continue
+        
+        dumps = create_serializer(name).dumps
+        serialized, dump_time = timed(lambda: list(map(dumps, entries)))
+        _, decode_time = timed(lambda: decode_batch(serialized))
+        
+        dump_ns = dump_time / count * 1e9
+        baseline = baseline or dump_ns
+        size = sum(map(len, serialized)) / count
+        print(
+            f"{name:<8} serialize {dump_ns:6.0f} ns ({dump_ns / baseline - 1:+6.1%}) | "
+            f"{size:6.1f} B | decode {decode_time / count * 1e9:6.0f} ns"
+        )
+
+
+if __name__ == "__main__":
+    main()
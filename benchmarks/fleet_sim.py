@@ -0,0 +1,252 @@
+"""
+Fleet simulator for load-testing the central queue.
+
+Runs N virtual agents (real LogForwarder instances) spread over one or
+more processes against a local Redis. Each agent generates synthetic
+access log lines at a fixed rate, and the simulator reports push
+latency, growth of node_logs_queue and Redis memory, and CPU per agent.
+Give several agent counts to find where a single central Redis saturates.
+
+Use a disposable Redis: the queue and the simulated agents' position keys
+are deleted after each step unless --keep-queue is given.
+
+Usage:
+    python benchmarks/fleet_sim.py --agents 50,100,200,500 --rate 20 --processes 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import redis.asyncio as redis
+
+from node_agent.config import ConfigService, NodeConfig
+from node_agent.log_forwarder import LogForwarder
+from node_agent.logging_utils import format_bytes
+
+
+def make_line(agent: int, i: int) -> str:
+    """Build a synthetic Xray access log line."""
+    ts = time.strftime("%Y/%m/%d %H:%M:%S")
+    return (
+        f"{ts} from 10.{agent % 250}.{i % 200}.{i % 100}:{40000 + i % 20000} "
+        f"accepted tcp:www.example{i % 50}.com:443 [VLESS_TCP_REALITY >> DIRECT] "
+        f"email: {i % 3000}.user_{agent}_{i % 3000}"
+    )
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Get a percentile of a list of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def make_config(args: argparse.Namespace, node_id: str, log_path: str) -> NodeConfig:
+    """Create the configuration of a virtual agent."""
+    return NodeConfig(
+        node_id=node_id,
+        node_name=node_id,
+        central_redis_url=args.redis_url,
+        access_log_path=log_path,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval,
+        redis_max_connections=2,
+        stats_log_interval=0,
+        log_level="WARNING"
+    )
+
+
+async def run_agent(
+    args: argparse.Namespace,
+    node_id: str,
+    agent: int,
+    latencies: List[float],
+    deadline: float
+) -> int:
+    """
+    Run one virtual agent until the deadline.
+    
+    Returns:
+        Number of lines generated
+    """
+    directory = tempfile.mkdtemp(prefix="fleet-sim-")
+    log_path = os.path.join(directory, "access.log")
+    open(log_path, "w").close()
+    forwarder = LogForwarder(make_config(args, node_id, log_path))
+    
+    # Time every push to the central queue
+    push = forwarder.sink.push
+    
+    async def timed_push(entries, sample_depth=False):
+        started = time.perf_counter()
+        try:
+            return await push(entries, sample_depth)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    
+    forwarder.sink.push = timed_push
+    
+    if args.tail:
+        # Full pipeline: append to a real file and let the forwarder tail it
+        task = asyncio.create_task(forwarder.start())
+    else:
+        # Skip file I/O and feed lines straight into the forwarder
+        await forwarder._connect_redis()
+        forwarder._running = True
+        forwarder._tasks = [asyncio.create_task(forwarder._flush_scheduler())]
+        task = None
+    
+    # Spread agents over the tick so they do not write in lockstep
+    tick = 0.1
+    await asyncio.sleep(tick * (agent % 10) / 10)
+    written = 0
+    carry = 0.0
+    log_file = open(log_path, "a") if args.tail else None
+    try:
+        while time.monotonic() < deadline:
+            carry += args.rate * tick
+            count, carry = int(carry), carry - int(carry)
+            lines = [make_line(agent, written + n) for n in range(count)]
+            written += count
+            
+            if log_file:
+                log_file.write("".join(f"{line}\n" for line in lines))
+                log_file.flush()
+            else:
+                for line in lines:
+                    await forwarder._process_log_line(line)
+            await asyncio.sleep(tick)
+    finally:
+        if log_file:
+            log_file.close()
+        await forwarder.stop()
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+        os.unlink(log_path)
+        os.rmdir(directory)
+    
+    return written
+
+
+def run_worker(args: argparse.Namespace, worker: int, agents: int) -> Dict[str, Any]:
+    """Run a process's share of the agents and return its measurements."""
+    async def simulate() -> List[int]:
+        deadline = time.monotonic() + args.duration
+        return await asyncio.gather(*[
+            run_agent(args, f"sim-{worker}-{i}", worker * 10000 + i, latencies, deadline)
+            for i in range(agents)
+        ])
+    
+    latencies: List[float] = []
+    cpu_started = time.process_time()
+    written = asyncio.run(simulate())
+    return {
+        'agents': agents,
+        'lines': sum(written),
+        'cpu': time.process_time() - cpu_started,
+        'latencies': latencies,
+    }
+
+
+async def redis_memory(client: redis.Redis, queue_key: str) -> Dict[str, int]:
+    """Sample the queue length, its memory and Redis memory."""
+    length = await client.llen(queue_key)
+    queue_bytes = await client.memory_usage(queue_key) or 0
+    info = await client.info("memory")
+    return {'length': length, 'queue_bytes': queue_bytes, 'used_memory': info['used_memory']}
+
+
+async def run_step(args: argparse.Namespace, agents: int, pool: ProcessPoolExecutor) -> None:
+    """Run one fleet size and print its report."""
+    client = redis.from_url(args.redis_url)
+    queue_key = ConfigService.get_redis_queue_key()
+    before = await redis_memory(client, queue_key)
+    
+    shares = [agents // args.processes + (i < agents % args.processes) for i in range(args.processes)]
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    workers = asyncio.gather(*[
+        loop.run_in_executor(pool, run_worker, args, worker, share)
+        for worker, share in enumerate(shares) if share
+    ])
+    
+    peak = before
+    while not workers.done():
+        await asyncio.wait([workers], timeout=args.report_interval)
+        sample = await redis_memory(client, queue_key)
+        peak = max(peak, sample, key=lambda s: s['used_memory'])
+        print(
+            f"  {time.monotonic() - started:6.1f}s queue {sample['length']:>9} entries, "
+            f"{format_bytes(sample['queue_bytes'])} queue, {format_bytes(sample['used_memory'])} used"
+        )
+    results = workers.result()
+    elapsed = time.monotonic() - started
+    after = await redis_memory(client, queue_key)
+    
+    latencies = [latency for result in results for latency in result['latencies']]
+    lines = sum(result['lines'] for result in results)
+    cpu = sum(result['cpu'] for result in results)
+    queued = after['length'] - before['length']
+    
+    print(
+        f"{agents} agents: {lines / elapsed:.0f} lines/s generated, {queued / elapsed:.0f} entries/s queued, "
+        f"push p50 {percentile(latencies, 0.5) * 1000:.1f} ms / p95 {percentile(latencies, 0.95) * 1000:.1f} ms / "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms / max {max(latencies, default=0) * 1000:.1f} ms "
+        f"({len(latencies)} pushes)"
+    )
+    print(
+        f"  queue +{format_bytes(after['queue_bytes'] - before['queue_bytes'])} "
+        f"({(after['queue_bytes'] - before['queue_bytes']) / elapsed / 1024:.1f} KiB/s), "
+        f"Redis used_memory +{format_bytes(peak['used_memory'] - before['used_memory'])} at peak, "
+        f"CPU {cpu / elapsed / agents * 100:.2f}% of a core per agent "
+        f"(mean push {statistics.fmean(latencies) * 1000 if latencies else 0:.1f} ms)"
+    )
+    
+    if not args.keep_queue:
+        await client.delete(queue_key)
+        keys = [key async for key in client.scan_iter(match="node_agent:sim-*")]
+        if keys:
+            await client.delete(*keys)
+    await client.close()
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    """Run every fleet size in turn."""
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        for agents in args.agents:
+            print(f"--- {agents} agents x {args.rate} lines/s, {args.processes} processes, {args.duration}s")
+            await run_step(args, agents, pool)
+
+
+def main() -> None:
+    """Run the simulator."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--agents", default="50", help="comma-separated agent counts, run in turn")
+    parser.add_argument("--rate", type=float, default=10.0, help="lines per second per agent")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per agent count")
+    parser.add_argument("--processes", type=int, default=1, help="processes to spread agents over")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--flush-interval", type=float, default=3.0)
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--tail", action="store_true", help="write real files and tail them")
+    parser.add_argument("--keep-queue", action="store_true", help="do not delete the queue after a step")
+    args = parser.parse_args()
+    args.agents = [int(value) for value in args.agents.split(",") if value.strip()]
+    
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,14 @@ from node servers to a central Redis server for processing.
 """
 
 from .config import NodeConfig, ConfigService
-from .log_parser import MarzbanLogParser, create_log_entry
+from .email_dictionary import EmailDecoder
+from .enrichment import IPEnricher
+from .log_formats import LogFormatParser
+from .log_parser import IPPrefixTrie, LogFilter, MarzbanLogParser, create_log_entry
 from .log_forwarder import LogForwarder
+from .relay import LogRelay, RelayClient
+from .serializers import Serializer, create_serializer, decode_batch
+from .sinks import Sink, create_sink
 
 __version__ = "1.0.0"
 __author__ = "Marzban Node Agent"
@@ -15,7 +21,19 @@ __author__ = "Marzban Node Agent"
 __all__ = [
     "NodeConfig",
     "ConfigService", 
+    "EmailDecoder",
+    "IPEnricher",
     "MarzbanLogParser",
     "create_log_entry",
-    "LogForwarder"
+    "LogFilter",
+    "IPPrefixTrie",
+    "LogFormatParser",
+    "LogForwarder",
+    "LogRelay",
+    "RelayClient",
+    "Serializer",
+    "create_serializer",
+    "decode_batch",
+    "Sink",
+    "create_sink"
 ]
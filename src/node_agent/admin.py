@@ -0,0 +1,123 @@
+"""
+Admin endpoint module for Marzban Node Agent.
+
+This module serves a minimal HTTP interface on a local address for
+inspecting a running agent and toggling profiling without signals.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+from .profiling import Profiler
+
+
+MAX_REQUEST_LINE = 8192
+
+
+class AdminServer:
+    """
+    Minimal HTTP admin server.
+    
+    Routes:
+        GET  /health          - liveness check
+        GET  /stats           - agent statistics as JSON
+        POST /profile/cpu     - start or stop a CPU profiling session
+        POST /profile/memory  - capture a tracemalloc snapshot
+    """
+    
+    def __init__(
+        self,
+        listen: str,
+        profiler: Profiler,
+        stats: Callable[[], Dict[str, Any]]
+    ):
+        """
+        Initialize the admin server.
+        
+        Args:
+            listen: Address in host:port form
+            profiler: Profiler driven by the /profile routes
+            stats: Callable returning the statistics served on /stats
+        """
+        host, _, port = listen.rpartition(":")
+        self.host = host.strip("[]")
+        self.port = int(port)
+        self.profiler = profiler
+        self.stats = stats
+        self.logger = logging.getLogger(__name__)
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self) -> None:
+        """Start listening for admin requests."""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.logger.info(f"Admin endpoint listening on {self.host}:{self.port}")
+    
+    async def stop(self) -> None:
+        """Stop the admin server."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve a single request and close the connection."""
+        try:
+            request_line = await reader.readline()
+            if not request_line or len(request_line) > MAX_REQUEST_LINE:
+                return
+            # Headers (and any body) are not used
+            while (await reader.readline()).strip():
+                pass
+            
+            method, _, rest = request_line.decode("latin-1").partition(" ")
+            path = rest.split(" ", 1)[0].split("?", 1)[0]
+            # Run on the loop thread: cProfile only profiles the thread it is enabled on
+            status, body = self._dispatch(method, path)
+            
+            payload = json.dumps(body).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except Exception as e:
+            self.logger.error(f"Error handling admin request: {e}")
+        finally:
+            writer.close()
+    
+    def _dispatch(self, method: str, path: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Route a request.
+        
+        Args:
+            method: HTTP method
+            path: Request path without the query string
+        
+        Returns:
+            Tuple of HTTP status line and JSON body
+        """
+        if method == "GET" and path == "/health":
+            return "200 OK", {'status': "ok"}
+        
+        if method == "GET" and path == "/stats":
+            return "200 OK", self.stats()
+        
+        if method == "POST" and path == "/profile/cpu":
+            report = self.profiler.toggle_cpu()
+            return "200 OK", {'running': self.profiler.cpu_running, 'report': report}
+        
+        if method == "POST" and path == "/profile/memory":
+            report = self.profiler.snapshot_memory()
+            return "200 OK", {'tracing': True, 'report': report}
+        
+        return "404 Not Found", {'error': f"No route for {method} {path}"}
@@ -0,0 +1,166 @@
+"""
+Checkpoint module for Marzban Node Agent.
+
+This module provides the local checkpoint file used to persist the
+acknowledged log file position without a round trip to Redis, and the
+state file a stopping agent hands its buffer and caches over in.
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+
+def _fsync_directory(directory: str) -> None:
+    """
+    Flush a directory, so a rename or removal in it survives a power failure.
+    
+    Args:
+        directory: Path of the directory
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: str, data: Dict[str, Any]) -> None:
+    """
+    Atomically and durably replace a JSON file.
+    
+    The data is written to a temporary file, fsynced and renamed over the
+    file, and the directory is fsynced after the rename, so a crash or
+    power failure leaves either the old or the new one.
+    
+    Args:
+        path: Path of the file
+        data: JSON-serializable data
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+class CheckpointFile:
+    """Local file holding the last acknowledged log file position."""
+    
+    def __init__(self, path: str, node_id: str):
+        """
+        Initialize the checkpoint file.
+        
+        Args:
+            path: Path of the checkpoint file
+            node_id: Unique identifier for the node
+        """
+        self.path = path
+        self.node_id = node_id
+    
+    def load(self) -> Optional[int]:
+        """
+        Read the saved position.
+        
+        Returns:
+            Saved position, or None if there is no usable checkpoint
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        
+        # Ignore checkpoints written by another node sharing the volume
+        if data.get('node_id') != self.node_id:
+            return None
+        
+        position = data.get('position')
+        return position if isinstance(position, int) and position >= 0 else None
+    
+    def save(self, position: int) -> None:
+        """
+        Atomically replace the checkpoint with a new position.
+        
+        The data is written to a temporary file, fsynced and renamed over
+        the checkpoint (then the directory is fsynced), so a crash leaves
+        either the old or the new one.
+        
+        Args:
+            position: Acknowledged log file position
+        """
+        _write_atomic(self.path, {'node_id': self.node_id, 'position': position, 'updated_at': time.time()})
+
+
+class StateFile:
+    """
+    Local file holding a stopped forwarder's in-memory state.
+    
+    Written on shutdown and consumed by the next start: the file is removed
+    once loaded, so a state is never restored twice.
+    """
+    
+    def __init__(self, path: str, node_id: str):
+        """
+        Initialize the state file.
+        
+        Args:
+            path: Path of the state file
+            node_id: Unique identifier for the node
+        """
+        self.path = path
+        self.node_id = node_id
+    
+    def save(self, state: Dict[str, Any]) -> None:
+        """
+        Atomically write the state.
+        
+        Args:
+            state: JSON-serializable forwarder state
+        """
+        _write_atomic(self.path, {'node_id': self.node_id, 'saved_at': time.time(), 'state': state})
+    
+    def discard(self) -> None:
+        """Durably remove the state file, if present."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            return
+        _fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+    
+    def take(self) -> Optional[Dict[str, Any]]:
+        """
+        Read and remove the saved state.
+        
+        Returns:
+            Saved state, or None if there is no usable state file
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # A torn write cannot be resumed from
+            os.unlink(self.path)
+            return None
+        
+        # Leave state written by another node sharing the volume alone
+        if data.get('node_id') != self.node_id:
+            return None
+        self.discard()
+        
+        state = data.get('state')
+        return state if isinstance(state, dict) else None
@@ -6,9 +6,43 @@ including environment variable loading and validation.
 """
 
 import os
-from dataclasses import dataclass
-from typing import Optional
+import re
+from dataclasses import dataclass, field, fields
+from typing import List, Optional
 from dotenv import load_dotenv
+from .log_formats import FORMAT_AUTO, LOG_FORMATS
+from .serializers import SERIALIZER_JSON, SERIALIZER_MSGPACK, SERIALIZERS
+from .sinks import REDIS_SINKS, SINK_FILE, SINK_REDIS, SINKS
+
+
+def _getenv_bool(name: str, default: bool) -> bool:
+    """Read a boolean environment variable (1/true/yes/on)."""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _getenv_list(name: str) -> List[str]:
+    """Read a comma-separated environment variable, skipping empty items."""
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+# Settings a running agent can apply on SIGHUP; changing any other
+# setting requires a restart
+RELOADABLE_SETTINGS = frozenset({
+    "batch_size", "flush_interval", "max_retries", "retry_delay",
+    "log_level", "stats_log_interval",
+    "circuit_breaker_threshold", "circuit_breaker_reset", "failover_check_interval",
+    "checkpoint_interval", "checkpoint_bytes", "checkpoint_mirror_interval", "dedup_ttl",
+    "backpressure_degraded_depth", "backpressure_critical_depth",
+    "backpressure_check_interval", "backpressure_batch_multiplier",
+    "filter_include_inbounds", "filter_exclude_inbounds",
+    "filter_include_email", "filter_exclude_email", "filter_ip_file",
+    "profile_dir", "loop_lag_threshold", "heavy_hitters_interval",
+    "governor_bytes_per_second", "governor_batches_per_second", "governor_burst",
+    "shutdown_timeout", "enrich_databases", "enrich_cache_size", "memory_budget",
+})
 
 
 @dataclass
@@ -19,11 +53,64 @@ class NodeConfig:
     node_name: str
     central_redis_url: str
     access_log_path: str
+    central_redis_fallback_urls: List[str] = field(default_factory=list)
+    failover_check_interval: float = 30.0
     batch_size: int = 50
     flush_interval: float = 3.0
     max_retries: int = 5
     retry_delay: float = 2.0
     log_level: str = "INFO"
+    stats_log_interval: float = 60.0
+    redis_connect_timeout: float = 5.0
+    redis_socket_timeout: float = 5.0
+    redis_max_connections: int = 10
+    circuit_breaker_threshold: int = 5
+    circuit_breaker_reset: float = 30.0
+    checkpoint_file: str = ""
+    checkpoint_interval: float = 5.0
+    checkpoint_bytes: int = 1048576
+    checkpoint_mirror_interval: float = 60.0
+    idempotent_delivery: bool = False
+    dedup_ttl: int = 900
+    relay_listen: str = ""
+    relay_url: str = ""
+    relay_secret: str = ""
+    backpressure_degraded_depth: int = 0
+    backpressure_critical_depth: int = 0
+    backpressure_check_interval: float = 10.0
+    backpressure_batch_multiplier: int = 4
+    profile_dir: str = "/tmp/node-agent-profiles"
+    loop_lag_interval: float = 1.0
+    loop_lag_threshold: float = 0.1
+    slow_callback_duration: float = 0.0
+    admin_listen: str = ""
+    filter_include_inbounds: List[str] = field(default_factory=list)
+    filter_exclude_inbounds: List[str] = field(default_factory=list)
+    filter_include_email: str = ""
+    filter_exclude_email: str = ""
+    filter_ip_file: str = ""
+    sink: str = SINK_REDIS
+    sink_path: str = ""
+    sink_max_bytes: int = 104857600
+    sink_backups: int = 5
+    sink_stream_key: str = "node_logs_stream"
+    sink_stream_maxlen: int = 0
+    event_loop: str = "asyncio"
+    heavy_hitters_top_k: int = 0
+    heavy_hitters_interval: float = 60.0
+    heavy_hitters_precision: int = 10
+    log_format: str = FORMAT_AUTO
+    log_format_miss_threshold: float = 0.5
+    governor_bytes_per_second: int = 0
+    governor_batches_per_second: float = 0.0
+    governor_burst: float = 2.0
+    email_dictionary: bool = False
+    state_file: str = ""
+    shutdown_timeout: float = 5.0
+    serializer: str = SERIALIZER_JSON
+    enrich_databases: List[str] = field(default_factory=list)
+    enrich_cache_size: int = 65536
+    memory_budget: int = 0
     
     def __post_init__(self):
         """Validate configuration after initialization."""
@@ -31,7 +118,11 @@ class NodeConfig:
             raise ValueError("NODE_ID is required")
         if not self.node_name:
             raise ValueError("NODE_NAME is required")
-        if not self.central_redis_url:
+        # Only Redis sinks need the central server
+        self.sink = self.sink.lower()
+        if self.sink not in SINKS:
+            raise ValueError(f"SINK must be one of: {', '.join(SINKS)}")
+        if not self.central_redis_url and self.sink in REDIS_SINKS:
             raise ValueError("CENTRAL_REDIS_URL is required")
         if not self.access_log_path:
             raise ValueError("ACCESS_LOG_PATH is required")
@@ -44,23 +135,142 @@ class NodeConfig:
             raise ValueError("MAX_RETRIES must be non-negative")
         if self.retry_delay < 0:
             raise ValueError("RETRY_DELAY must be non-negative")
+        if self.checkpoint_interval <= 0:
+            raise ValueError("CHECKPOINT_INTERVAL must be positive")
+        if self.checkpoint_bytes <= 0:
+            raise ValueError("CHECKPOINT_BYTES must be positive")
+        if self.checkpoint_mirror_interval <= 0:
+            raise ValueError("CHECKPOINT_MIRROR_INTERVAL must be positive")
+        if self.dedup_ttl <= 0:
+            raise ValueError("DEDUP_TTL must be positive")
+        if self.failover_check_interval <= 0:
+            raise ValueError("FAILOVER_CHECK_INTERVAL must be positive")
+        if self.redis_connect_timeout <= 0:
+            raise ValueError("REDIS_CONNECTION_TIMEOUT must be positive")
+        if self.redis_socket_timeout <= 0:
+            raise ValueError("REDIS_SOCKET_TIMEOUT must be positive")
+        if self.redis_max_connections <= 0:
+            raise ValueError("REDIS_MAX_CONNECTIONS must be positive")
+        if self.circuit_breaker_threshold < 0:
+            raise ValueError("CIRCUIT_BREAKER_THRESHOLD must be non-negative")
+        if self.circuit_breaker_reset <= 0:
+            raise ValueError("CIRCUIT_BREAKER_RESET must be positive")
+        
+        if self.stats_log_interval < 0:
+            raise ValueError("STATS_LOG_INTERVAL must be non-negative")
         
         # Normalize log level
         self.log_level = self.log_level.upper()
         if self.log_level not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
             raise ValueError(f"Invalid LOG_LEVEL: {self.log_level}")
+        
+        if self.backpressure_degraded_depth < 0:
+            raise ValueError("BACKPRESSURE_DEGRADED_DEPTH must be non-negative")
+        if self.backpressure_critical_depth < 0:
+            raise ValueError("BACKPRESSURE_CRITICAL_DEPTH must be non-negative")
+        if (self.backpressure_degraded_depth and self.backpressure_critical_depth
+                and self.backpressure_critical_depth < self.backpressure_degraded_depth):
+            raise ValueError("BACKPRESSURE_CRITICAL_DEPTH must not be below BACKPRESSURE_DEGRADED_DEPTH")
+        if self.backpressure_check_interval <= 0:
+            raise ValueError("BACKPRESSURE_CHECK_INTERVAL must be positive")
+        if self.backpressure_batch_multiplier < 1:
+            raise ValueError("BACKPRESSURE_BATCH_MULTIPLIER must be at least 1")
+        
+        if not self.profile_dir:
+            raise ValueError("PROFILE_DIR is required")
+        if self.loop_lag_interval < 0:
+            raise ValueError("LOOP_LAG_INTERVAL must be non-negative")
+        if self.loop_lag_threshold <= 0:
+            raise ValueError("LOOP_LAG_THRESHOLD must be positive")
+        if self.slow_callback_duration < 0:
+            raise ValueError("SLOW_CALLBACK_DURATION must be non-negative")
+        if self.admin_listen:
+            host, sep, port = self.admin_listen.rpartition(":")
+            if not sep or not host or not port.isdigit():
+                raise ValueError("ADMIN_LISTEN must be in host:port form")
+        
+        for name, pattern in (("FILTER_INCLUDE_EMAIL", self.filter_include_email),
+                              ("FILTER_EXCLUDE_EMAIL", self.filter_exclude_email)):
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"{name} is not a valid regular expression: {e}")
+        
+        if self.heavy_hitters_top_k < 0:
+            raise ValueError("HEAVY_HITTERS_TOP_K must be non-negative")
+        if self.heavy_hitters_interval <= 0:
+            raise ValueError("HEAVY_HITTERS_INTERVAL must be positive")
+        if not 4 <= self.heavy_hitters_precision <= 16:
+            raise ValueError("HEAVY_HITTERS_PRECISION must be between 4 and 16")
+        
+        self.log_format = self.log_format.lower()
+        if self.log_format not in LOG_FORMATS:
+            raise ValueError(f"LOG_FORMAT must be one of: {', '.join(LOG_FORMATS)}")
+        if not 0 < self.log_format_miss_threshold <= 1:
+            raise ValueError("LOG_FORMAT_MISS_THRESHOLD must be between 0 and 1")
+        
+        if self.governor_bytes_per_second < 0:
+            raise ValueError("GOVERNOR_BYTES_PER_SECOND must be non-negative")
+        if self.governor_batches_per_second < 0:
+            raise ValueError("GOVERNOR_BATCHES_PER_SECOND must be non-negative")
+        if self.governor_burst <= 0:
+            raise ValueError("GOVERNOR_BURST must be positive")
+        
+        if self.shutdown_timeout <= 0:
+            raise ValueError("SHUTDOWN_TIMEOUT must be positive")
+        
+        if self.enrich_cache_size <= 0:
+            raise ValueError("ENRICH_CACHE_SIZE must be positive")
+        
+        if self.memory_budget < 0:
+            raise ValueError("MEMORY_BUDGET must be non-negative")
+        
+        if self.sink == SINK_FILE and not self.sink_path:
+            raise ValueError("SINK_PATH is required for the file sink")
+        if self.sink_max_bytes <= 0:
+            raise ValueError("SINK_MAX_BYTES must be positive")
+        if self.sink_backups < 0:
+            raise ValueError("SINK_BACKUPS must be non-negative")
+        if self.sink_stream_maxlen < 0:
+            raise ValueError("SINK_STREAM_MAXLEN must be non-negative")
+        if self.idempotent_delivery and self.sink != SINK_REDIS:
+            raise ValueError("IDEMPOTENT_DELIVERY requires the redis sink")
+        if self.relay_url and self.sink != SINK_REDIS:
+            raise ValueError("RELAY_URL requires the redis sink")
+        # The agent-to-relay hop has no batch ids, so a retry there duplicates
+        if self.idempotent_delivery and self.relay_url:
+            raise ValueError("IDEMPOTENT_DELIVERY cannot be used with RELAY_URL")
+        if self.email_dictionary and (self.sink not in REDIS_SINKS or self.relay_url or self.relay_listen):
+            raise ValueError("EMAIL_DICTIONARY requires a Redis sink and cannot be used with relays")
+        
+        self.serializer = self.serializer.lower()
+        if self.serializer not in SERIALIZERS:
+            raise ValueError(f"SERIALIZER must be one of: {', '.join(SERIALIZERS)}")
+        # Binary entries need a sink storing bytes; the relay protocol is line-based
+        if self.serializer == SERIALIZER_MSGPACK and (self.sink not in REDIS_SINKS or self.relay_url):
+            raise ValueError("SERIALIZER=msgpack requires a Redis sink and cannot be used with RELAY_URL")
+        
+        self.event_loop = self.event_loop.lower()
+        if self.event_loop not in ("asyncio", "uvloop"):
+            raise ValueError("EVENT_LOOP must be asyncio or uvloop")
+        
+        # Relay addresses use tcp://host:port or unix:///path
+        for name, value in (("RELAY_LISTEN", self.relay_listen), ("RELAY_URL", self.relay_url)):
+            if value and not value.startswith(("tcp://", "unix://")):
+                raise ValueError(f"{name} must start with tcp:// or unix://")
 
 
 class ConfigService:
     """Service for loading configuration from environment variables."""
     
     @staticmethod
-    def load_from_env(env_file: Optional[str] = None) -> NodeConfig:
+    def load_from_env(env_file: Optional[str] = None, override: bool = False) -> NodeConfig:
         """
         Load configuration from environment variables.
         
         Args:
             env_file: Optional path to .env file
+            override: Let .env values replace variables already set (for reloads)
             
         Returns:
             NodeConfig instance with loaded configuration
@@ -69,41 +279,174 @@ class ConfigService:
             ValueError: If required configuration is missing or invalid
         """
         if env_file and os.path.exists(env_file):
-            load_dotenv(env_file)
+            load_dotenv(env_file, override=override)
         else:
-            load_dotenv()
+            load_dotenv(override=override)
         
         return NodeConfig(
             node_id=os.getenv("NODE_ID", "").strip(),
             node_name=os.getenv("NODE_NAME", "").strip(),
             central_redis_url=os.getenv("CENTRAL_REDIS_URL", "").strip(),
             access_log_path=os.getenv("ACCESS_LOG_PATH", "/var/lib/marzban-node/access.log").strip(),
+            central_redis_fallback_urls=_getenv_list("CENTRAL_REDIS_FALLBACK_URLS"),
+            failover_check_interval=float(os.getenv("FAILOVER_CHECK_INTERVAL", "30.0")),
             batch_size=int(os.getenv("BATCH_SIZE", "50")),
             flush_interval=float(os.getenv("FLUSH_INTERVAL", "3.0")),
             max_retries=int(os.getenv("MAX_RETRIES", "5")),
             retry_delay=float(os.getenv("RETRY_DELAY", "2.0")),
             log_level=os.getenv("LOG_LEVEL", "INFO").strip(),
+            stats_log_interval=float(os.getenv("STATS_LOG_INTERVAL", "60.0")),
+            redis_connect_timeout=float(os.getenv("REDIS_CONNECTION_TIMEOUT", "5.0")),
+            redis_socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "5.0")),
+            redis_max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "10")),
+            circuit_breaker_threshold=int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5")),
+            circuit_breaker_reset=float(os.getenv("CIRCUIT_BREAKER_RESET", "30.0")),
+            checkpoint_file=os.getenv("CHECKPOINT_FILE", "").strip(),
+            checkpoint_interval=float(os.getenv("CHECKPOINT_INTERVAL", "5.0")),
+            checkpoint_bytes=int(os.getenv("CHECKPOINT_BYTES", "1048576")),
+            checkpoint_mirror_interval=float(os.getenv("CHECKPOINT_MIRROR_INTERVAL", "60.0")),
+            idempotent_delivery=_getenv_bool("IDEMPOTENT_DELIVERY", False),
+            dedup_ttl=int(os.getenv("DEDUP_TTL", "900")),
+            relay_listen=os.getenv("RELAY_LISTEN", "").strip(),
+            relay_url=os.getenv("RELAY_URL", "").strip(),
+            relay_secret=os.getenv("RELAY_SECRET", "").strip(),
+            backpressure_degraded_depth=int(os.getenv("BACKPRESSURE_DEGRADED_DEPTH", "0")),
+            backpressure_critical_depth=int(os.getenv("BACKPRESSURE_CRITICAL_DEPTH", "0")),
+            backpressure_check_interval=float(os.getenv("BACKPRESSURE_CHECK_INTERVAL", "10.0")),
+            backpressure_batch_multiplier=int(os.getenv("BACKPRESSURE_BATCH_MULTIPLIER", "4")),
+            profile_dir=os.getenv("PROFILE_DIR", "/tmp/node-agent-profiles").strip(),
+            loop_lag_interval=float(os.getenv("LOOP_LAG_INTERVAL", "1.0")),
+            loop_lag_threshold=float(os.getenv("LOOP_LAG_THRESHOLD", "0.1")),
+            slow_callback_duration=float(os.getenv("SLOW_CALLBACK_DURATION", "0")),
+            admin_listen=os.getenv("ADMIN_LISTEN", "").strip(),
+            filter_include_inbounds=_getenv_list("FILTER_INCLUDE_INBOUNDS"),
+            filter_exclude_inbounds=_getenv_list("FILTER_EXCLUDE_INBOUNDS"),
+            filter_include_email=os.getenv("FILTER_INCLUDE_EMAIL", "").strip(),
+            filter_exclude_email=os.getenv("FILTER_EXCLUDE_EMAIL", "").strip(),
+            filter_ip_file=os.getenv("FILTER_IP_FILE", "").strip(),
+            sink=os.getenv("SINK", SINK_REDIS).strip(),
+            sink_path=os.getenv("SINK_PATH", "").strip(),
+            sink_max_bytes=int(os.getenv("SINK_MAX_BYTES", "104857600")),
+            sink_backups=int(os.getenv("SINK_BACKUPS", "5")),
+            sink_stream_key=os.getenv("SINK_STREAM_KEY", "node_logs_stream").strip(),
+            sink_stream_maxlen=int(os.getenv("SINK_STREAM_MAXLEN", "0")),
+            event_loop=os.getenv("EVENT_LOOP", "asyncio").strip(),
+            heavy_hitters_top_k=int(os.getenv("HEAVY_HITTERS_TOP_K", "0")),
+            heavy_hitters_interval=float(os.getenv("HEAVY_HITTERS_INTERVAL", "60.0")),
+            heavy_hitters_precision=int(os.getenv("HEAVY_HITTERS_PRECISION", "10")),
+            log_format=os.getenv("LOG_FORMAT", FORMAT_AUTO).strip(),
+            log_format_miss_threshold=float(os.getenv("LOG_FORMAT_MISS_THRESHOLD", "0.5")),
+            governor_bytes_per_second=int(os.getenv("GOVERNOR_BYTES_PER_SECOND", "0")),
+            governor_batches_per_second=float(os.getenv("GOVERNOR_BATCHES_PER_SECOND", "0")),
+            governor_burst=float(os.getenv("GOVERNOR_BURST", "2.0")),
+            email_dictionary=_getenv_bool("EMAIL_DICTIONARY", False),
+            state_file=os.getenv("STATE_FILE", "").strip(),
+            shutdown_timeout=float(os.getenv("SHUTDOWN_TIMEOUT", "5.0")),
+            serializer=os.getenv("SERIALIZER", SERIALIZER_JSON).strip(),
+            enrich_databases=_getenv_list("ENRICH_DATABASES"),
+            enrich_cache_size=int(os.getenv("ENRICH_CACHE_SIZE", "65536")),
+            memory_budget=int(os.getenv("MEMORY_BUDGET", "0")),
         )
     
     @staticmethod
-    def get_redis_position_key(node_id: str) -> str:
+    def changed_settings(old: NodeConfig, new: NodeConfig) -> List[str]:
+        """
+        Get the settings that differ between two configurations.
+        
+        Args:
+            old: Current configuration
+            new: Reloaded configuration
+            
+        Returns:
+            Names of the changed settings, in declaration order
+        """
+        return [f.name for f in fields(NodeConfig) if getattr(old, f.name) != getattr(new, f.name)]
+    
+    @staticmethod
+    def get_redis_position_key(node_id: str, hash_tag: bool = False) -> str:
         """
         Get Redis key for storing log file position.
         
         Args:
             node_id: Unique identifier for the node
+            hash_tag: Prefix the queue hash tag so the key shares the
+                queue's Redis Cluster slot
             
         Returns:
             Redis key for position storage
         """
-        return f"node_agent:{node_id}:position"
+        key = f"node_agent:{node_id}:position"
+        if hash_tag:
+            return f"{{node_logs_queue}}:{key}"
+        return key
     
     @staticmethod
-    def get_redis_queue_key() -> str:
+    def get_redis_batch_key(node_id: str, epoch: int, seq: int, hash_tag: bool = False) -> str:
+        """
+        Get Redis key marking a delivered batch, used for deduplication.
+        
+        Args:
+            node_id: Unique identifier for the node
+            epoch: Forwarder epoch (start time in milliseconds)
+            seq: Batch sequence number within the epoch
+            hash_tag: Prefix the queue hash tag so the key shares the
+                queue's Redis Cluster slot
+            
+        Returns:
+            Redis key for the batch marker
+        """
+        key = f"node_agent:{node_id}:batch:{epoch}:{seq}"
+        if hash_tag:
+            return f"{{node_logs_queue}}:{key}"
+        return key
+    
+    @staticmethod
+    def get_redis_heavy_hitters_key(node_id: str, hash_tag: bool = False) -> str:
+        """
+        Get Redis key for the node's published heavy hitters.
+        
+        Args:
+            node_id: Unique identifier for the node
+            hash_tag: Prefix the queue hash tag so the key shares the
+                queue's Redis Cluster slot
+            
+        Returns:
+            Redis key for the heavy hitters hash
+        """
+        key = f"node_agent:{node_id}:heavy_hitters"
+        if hash_tag:
+            return f"{{node_logs_queue}}:{key}"
+        return key
+    
+    @staticmethod
+    def get_redis_email_dictionary_key(node_id: str, hash_tag: bool = False) -> str:
+        """
+        Get Redis key for the node's email dictionary.
+        
+        Args:
+            node_id: Unique identifier for the node
+            hash_tag: Prefix the queue hash tag so the key shares the
+                queue's Redis Cluster slot
+            
+        Returns:
+            Redis key for the hash of email ids to emails
+        """
+        key = f"node_agent:{node_id}:emails"
+        if hash_tag:
+            return f"{{node_logs_queue}}:{key}"
+        return key
+    
+    @staticmethod
+    def get_redis_queue_key(hash_tag: bool = False) -> str:
         """
         Get Redis key for the log queue.
         
+        Args:
+            hash_tag: Wrap the key in a Redis Cluster hash tag
+            
         Returns:
             Redis key for log queue
         """
+        if hash_tag:
+            return "{node_logs_queue}"
         return "node_logs_queue"
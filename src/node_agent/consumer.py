@@ -0,0 +1,568 @@
+"""
+Central consumer module for Marzban Node Agent.
+
+This module is the companion of the agents on the central server. It
+drains node_logs_queue (or the redis-stream sink's stream) in bulk,
+keeps a sliding-window index of distinct client IPs per user across
+all nodes, and writes users over their IP limit to a result hash.
+
+Usage:
+    python -m node_agent.consumer [--ip-limit N] [--window SECONDS] [--stream KEY]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+from dotenv import load_dotenv
+from redis.exceptions import ResponseError
+from .config import ConfigService
+from .email_dictionary import EmailDecoder
+from .endpoints import create_redis_client, is_cluster_url, redact_url
+from .logging_utils import RateLimitedLogger
+from .serializers import decode_batch
+
+
+# IPs listed per flagged user in the result hash
+MAX_REPORTED_IPS = 32
+
+
+class SlidingWindowIPs:
+    """
+    Per-user distinct IPs over a sliding time window.
+    
+    Events are grouped into buckets of `bucket_seconds`. Each bucket holds
+    the (user, ip) pairs first seen in it, and a per-user reference count
+    tells how many live buckets contain each IP. Adding an event and
+    expiring it later are both O(1); a whole bucket is dropped at once
+    when it leaves the window. Time is event time: the window ends at the
+    newest timestamp seen, and events older than the window are ignored.
+    """
+    
+    def __init__(self, window: float = 300.0, bucket_seconds: float = 10.0):
+        """
+        Initialize the index.
+        
+        Args:
+            window: Window length in seconds
+            bucket_seconds: Expiry granularity in seconds
+        """
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self._span = max(1, int(round(window / bucket_seconds)))
+        self._buckets: Dict[int, Dict[str, Set[str]]] = {}
+        self._ips: Dict[str, Dict[str, int]] = {}
+        self._newest: Optional[int] = None
+        self.late_events = 0
+    
+    def add(self, user: str, ip: str, timestamp: float) -> int:
+        """
+        Record a connection.
+        
+        Args:
+            user: User email
+            ip: Client IP address
+            timestamp: Event time (Unix seconds)
+        
+        Returns:
+            Distinct IPs of the user within the window
+        """
+        bucket = int(timestamp // self.bucket_seconds)
+        if self._newest is None or bucket > self._newest:
+            self._newest = bucket
+            self._expire(bucket - self._span)
+        elif bucket <= self._newest - self._span:
+            self.late_events += 1
+            return len(self._ips.get(user, ()))
+        
+        users = self._buckets.get(bucket)
+        if users is None:
+            users = self._buckets[bucket] = {}
+        seen = users.get(user)
+        if seen is None:
+            seen = users[user] = set()
+        
+        counts = self._ips.get(user)
+        if counts is None:
+            counts = self._ips[user] = {}
+        if ip not in seen:
+            seen.add(ip)
+            counts[ip] = counts.get(ip, 0) + 1
+        return len(counts)
+    
+    def _expire(self, cutoff: int) -> None:
+        """Drop every bucket at or before `cutoff`."""
+        for bucket in [bucket for bucket in self._buckets if bucket <= cutoff]:
+            for user, ips in self._buckets.pop(bucket).items():
+                counts = self._ips[user]
+                for ip in ips:
+                    remaining = counts[ip] - 1
+                    if remaining:
+                        counts[ip] = remaining
+                    else:
+                        del counts[ip]
+                if not counts:
+                    del self._ips[user]
+    
+    def distinct_ips(self, user: str) -> int:
+        """Get the number of distinct IPs of a user within the window."""
+        return len(self._ips.get(user, ()))
+    
+    def ips(self, user: str) -> List[str]:
+        """Get the distinct IPs of a user within the window."""
+        return list(self._ips.get(user, ()))
+    
+    @property
+    def users(self) -> int:
+        """Number of users with connections within the window."""
+        return len(self._ips)
+
+
+class ListSource:
+    """
+    Bulk reader of a Redis list filled with LPUSH.
+    
+    Pops up to `count` of the oldest entries per call with RPOP (Redis 6.2
+    or later) and only blocks (BRPOP) while the list is empty. Popped
+    entries are gone, so a consumer crash loses at most the batch being
+    processed.
+    """
+    
+    def __init__(self, client: Any, key: str, count: int = 1000, block_timeout: float = 1.0):
+        """
+        Initialize the source.
+        
+        Args:
+            client: Redis client
+            key: List key
+            count: Maximum entries per batch
+            block_timeout: Seconds to block while the list is empty
+        """
+        self.client = client
+        self.key = key
+        self.count = count
+        self.block_timeout = block_timeout
+    
+    async def fetch(self) -> List[str]:
+        """Get the next batch, oldest entry first (empty on timeout)."""
+        items = await self.client.rpop(self.key, self.count)
+        if items:
+            return items
+        
+        popped = await self.client.brpop([self.key], timeout=self.block_timeout)
+        return [popped[1]] if popped else []
+    
+    async def ack(self) -> None:
+        """Entries are removed when popped, so there is nothing to acknowledge."""
+
+
+class StreamSource:
+    """
+    Bulk reader of a Redis stream through a consumer group.
+    
+    Entries are acknowledged after their batch is processed. On start the
+    consumer's own pending entries (read but not acknowledged before a
+    crash) are processed again before new ones.
+    """
+    
+    def __init__(
+        self,
+        client: Any,
+        key: str,
+        group: str,
+        consumer: str,
+        count: int = 1000,
+        block_timeout: float = 1.0
+    ):
+        """
+        Initialize the source.
+        
+        Args:
+            client: Redis client
+            key: Stream key
+            group: Consumer group name
+            consumer: Consumer name within the group
+            count: Maximum entries per batch
+            block_timeout: Seconds to block while no entries are available
+        """
+        self.client = client
+        self.key = key
+        self.group = group
+        self.consumer = consumer
+        self.count = count
+        self.block_timeout = block_timeout
+        self._cursor = "0"
+        self._ids: List[str] = []
+        self._group_ready = False
+    
+    async def _ensure_group(self) -> None:
+        """Create the consumer group (and the stream) if needed."""
+        try:
+            await self.client.xgroup_create(self.key, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+    
+    async def fetch(self) -> List[str]:
+        """Get the next batch, oldest entry first (empty on timeout)."""
+        if not self._group_ready:
+            await self._ensure_group()
+        
+        # Block only for new entries, not while replaying pending ones
+        block = int(self.block_timeout * 1000) if self._cursor == ">" else None
+        response = await self.client.xreadgroup(
+            self.group, self.consumer, {self.key: self._cursor}, count=self.count, block=block
+        )
+        messages = response[0][1] if response else []
+        if not messages and self._cursor != ">":
+            self._cursor = ">"
+        
+        self._ids = [message_id for message_id, _ in messages]
+        # Field names are bytes when the client returns raw replies
+        items = []
+        for _, fields in messages:
+            data = fields.get('data', fields.get(b'data')) if fields else None
+            if data is not None:
+                items.append(data)
+        return items
+    
+    async def ack(self) -> None:
+        """Acknowledge the last batch."""
+        if self._ids:
+            await self.client.xack(self.key, self.group, *self._ids)
+            self._ids = []
+
+
+class Consumer:
+    """Central consumer flagging users connected from too many IPs."""
+    
+    def __init__(
+        self,
+        client: Any,
+        source: Any,
+        index: SlidingWindowIPs,
+        ip_limit: int,
+        result_key: str = "ip_limit_violations",
+        limits_key: str = "",
+        limits_refresh: float = 30.0,
+        decoder: Optional[EmailDecoder] = None
+    ):
+        """
+        Initialize the consumer.
+        
+        Args:
+            client: Redis client for the result and limits keys
+            source: ListSource or StreamSource to read batches from
+            index: Sliding-window distinct IP index
+            ip_limit: Default number of distinct IPs allowed per user (0 for no limit)
+            result_key: Hash receiving users over their limit
+            limits_key: Optional hash of per-user limits (email -> limit)
+            limits_refresh: Seconds between reloads of the per-user limits
+            decoder: Resolves email ids from nodes using EMAIL_DICTIONARY
+        """
+        self.client = client
+        self.source = source
+        self.index = index
+        self.ip_limit = ip_limit
+        self.result_key = result_key
+        self.limits_key = limits_key
+        self.limits_refresh = limits_refresh
+        self.decoder = decoder
+        self.logger = logging.getLogger(__name__)
+        self.rate_limited_logger = RateLimitedLogger(self.logger)
+        
+        self.limits: Dict[str, int] = {}
+        self._limits_loaded = float("-inf")
+        self._flagged: Set[str] = set()
+        self._running = False
+        
+        self.events = 0
+        self.batches = 0
+        self.decode_errors = 0
+        self.violations = 0
+        self.cleared = 0
+        self._started_at = time.monotonic()
+    
+    def limit_for(self, user: str) -> int:
+        """Get the distinct IP limit of a user (0 for no limit)."""
+        return self.limits.get(user, self.ip_limit)
+    
+    async def _load_limits(self) -> None:
+        """Reload per-user limits if they are due."""
+        now = time.monotonic()
+        if not self.limits_key or now - self._limits_loaded < self.limits_refresh:
+            return
+        self._limits_loaded = now
+        
+        try:
+            raw = await self.client.hgetall(self.limits_key)
+        except Exception as e:
+            self.rate_limited_logger.warning("limits", "Failed to load per-user limits: %s", e)
+            return
+        
+        limits = {}
+        for user, value in raw.items():
+            try:
+                limits[user] = int(value)
+            except ValueError:
+                self.rate_limited_logger.warning("limits", "Invalid IP limit for %s: %s", user, value)
+        self.limits = limits
+    
+    def process(self, entries: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Feed a batch into the index.
+        
+        Args:
+            entries: Decoded log entries
+        
+        Returns:
+            Users over their limit after the batch, with their distinct IP count
+        """
+        index_add = self.index.add
+        offenders: Dict[str, int] = {}
+        for entry in entries:
+            try:
+                user = entry['email']
+                distinct = index_add(user, entry['client_ip'], entry['timestamp'])
+            except (KeyError, TypeError):
+                self.decode_errors += 1
+                continue
+            
+            if distinct > 1:
+                limit = self.limit_for(user)
+                if limit and distinct > limit:
+                    offenders[user] = distinct
+        
+        self.events += len(entries)
+        self.batches += 1
+        return offenders
+    
+    async def _publish(self, offenders: Dict[str, int]) -> None:
+        """Write users over their limit to the result hash."""
+        now = time.time()
+        mapping = {
+            user: json.dumps({
+                'distinct_ips': distinct,
+                'limit': self.limit_for(user),
+                'ips': self.index.ips(user)[:MAX_REPORTED_IPS],
+                'detected_at': now
+            })
+            for user, distinct in offenders.items()
+        }
+        await self.client.hset(self.result_key, mapping=mapping)
+        self.violations += len(offenders.keys() - self._flagged)
+        self._flagged.update(offenders)
+    
+    async def _clear_recovered(self) -> None:
+        """Remove users back within their limit from the result hash."""
+        recovered = [
+            user for user in self._flagged
+            if not (self.limit_for(user) and self.index.distinct_ips(user) > self.limit_for(user))
+        ]
+        if recovered:
+            await self.client.hdel(self.result_key, *recovered)
+            self._flagged.difference_update(recovered)
+            self.cleared += len(recovered)
+    
+    async def step(self) -> int:
+        """
+        Fetch, process and acknowledge one batch.
+        
+        Returns:
+            Number of entries in the batch
+        """
+        await self._load_limits()
+        items = await self.source.fetch()
+        if not items:
+            return 0
+        
+        entries = decode_batch(items)
+        self.decode_errors += len(items) - len(entries)
+        if self.decoder is not None:
+            await self.decoder.decode(entries)
+        offenders = self.process(entries)
+        if offenders:
+            await self._publish(offenders)
+        await self.source.ack()
+        return len(items)
+    
+    async def run(self, report_interval: float = 10.0) -> None:
+        """
+        Consume until stopped.
+        
+        Args:
+            report_interval: Seconds between progress reports and
+                clean-ups of recovered users
+        """
+        self._running = True
+        last_report = time.monotonic()
+        while self._running:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.rate_limited_logger.error("consume", "Failed to consume batch: %s", e)
+                await asyncio.sleep(1)
+            
+            now = time.monotonic()
+            if now - last_report >= report_interval:
+                last_report = now
+                try:
+                    await self._clear_recovered()
+                except Exception as e:
+                    self.rate_limited_logger.warning("clear", "Failed to clear recovered users: %s", e)
+                self.logger.info(self.format_progress())
+    
+    def stop(self) -> None:
+        """Stop after the current batch."""
+        self._running = False
+    
+    def format_progress(self) -> str:
+        """
+        Build a throughput report.
+        
+        Returns:
+            One-line summary of the consumer so far
+        """
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        return (
+            f"{self.events} events ({self.events / elapsed:.0f}/s) in {self.batches} batches, "
+            f"{self.index.users} users in window, {len(self._flagged)} over limit, "
+            f"{self.decode_errors} malformed, {self.index.late_events} late"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get consumer statistics.
+        
+        Returns:
+            Dictionary with counters and the index size
+        """
+        stats = {
+            'events': self.events,
+            'batches': self.batches,
+            'decode_errors': self.decode_errors,
+            'late_events': self.index.late_events,
+            'users_in_window': self.index.users,
+            'users_over_limit': len(self._flagged),
+            'violations': self.violations,
+            'cleared': self.cleared,
+            'elapsed': time.monotonic() - self._started_at,
+        }
+        if self.decoder is not None:
+            stats.update(self.decoder.get_stats())
+        return stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m node_agent.consumer",
+        description="Consume the central queue and flag users connected from too many IPs."
+    )
+    parser.add_argument("--redis-url", help="central Redis (default: CENTRAL_REDIS_URL)")
+    parser.add_argument("--queue-key", help="list to drain (default: node_logs_queue)")
+    parser.add_argument("--stream", help="read this stream through a consumer group instead of the list")
+    parser.add_argument("--group", default="node-agent-consumers", help="stream consumer group")
+    parser.add_argument("--consumer-name", default=socket.gethostname(), help="name within the consumer group")
+    parser.add_argument("--batch-size", type=int, default=1000, help="entries per fetch")
+    parser.add_argument("--window", type=float, default=300.0, help="sliding window in seconds")
+    parser.add_argument("--bucket", type=float, default=10.0, help="expiry granularity in seconds")
+    parser.add_argument("--ip-limit", type=int, default=0, help="default distinct IPs per user (0: per-user limits only)")
+    parser.add_argument("--limits-key", default="", help="hash of per-user limits (email -> limit)")
+    parser.add_argument("--result-key", default="ip_limit_violations", help="hash receiving users over their limit")
+    parser.add_argument("--email-cache-size", type=int, default=100000, help="cached email ids of dictionary-encoding nodes")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="seconds between progress reports")
+    parser.add_argument("--env-file", help="path to a .env file")
+    args = parser.parse_args(argv)
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive")
+    if args.email_cache_size <= 0:
+        parser.error("--email-cache-size must be positive")
+    if args.window <= 0 or args.bucket <= 0 or args.bucket > args.window:
+        parser.error("--window and --bucket must be positive, with --bucket at most --window")
+    if not args.ip_limit and not args.limits_key:
+        parser.error("either --ip-limit or --limits-key is required")
+    return args
+
+
+async def consume(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the consumer command.
+    
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    
+    Returns:
+        Process exit code
+    """
+    args = parse_args(argv)
+    if args.env_file and os.path.exists(args.env_file):
+        load_dotenv(args.env_file)
+    else:
+        load_dotenv()
+    
+    logging.basicConfig(
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").strip().upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+    logging.getLogger('redis').setLevel(logging.WARNING)
+    logger = logging.getLogger(__name__)
+    
+    url = args.redis_url or os.getenv("CENTRAL_REDIS_URL", "").strip()
+    if not url:
+        logger.error("No Redis URL: pass --redis-url or set CENTRAL_REDIS_URL")
+        return 1
+    
+    client = create_redis_client(url, max_connections=4)
+    # Entries are read as bytes: nodes may send msgpack, and JSON is parsed
+    # from bytes without decoding it to str first
+    source_client = create_redis_client(url, max_connections=2, decode_responses=False)
+    decoder = EmailDecoder(client, args.email_cache_size, is_cluster_url(url))
+    if args.stream:
+        source = StreamSource(source_client, args.stream, args.group, args.consumer_name, args.batch_size)
+    else:
+        queue_key = args.queue_key or ConfigService.get_redis_queue_key(is_cluster_url(url))
+        source = ListSource(source_client, queue_key, args.batch_size)
+    
+    consumer = Consumer(
+        client,
+        source,
+        SlidingWindowIPs(args.window, args.bucket),
+        ip_limit=args.ip_limit,
+        result_key=args.result_key,
+        limits_key=args.limits_key,
+        decoder=decoder
+    )
+    
+    try:
+        await client.ping()
+        logger.info(f"Consuming from {redact_url(url)} ({args.stream or source.key})")
+        await consumer.run(args.report_interval)
+    except Exception as e:
+        logger.error(f"Consumer failed: {e}")
+        return 1
+    finally:
+        await source_client.close()
+        await client.close()
+    return 0
+
+
+def main() -> None:
+    """Entry point for python -m node_agent.consumer."""
+    try:
+        sys.exit(asyncio.run(consume()))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Flush deadline for Marzban Node Agent.
+
+This module provides the timer that bounds how long an entry waits in the
+forwarder's buffer: it is armed when the first entry enters an empty
+buffer, so the flush happens at most one flush interval after that entry
+arrived, and it is not armed at all while there is nothing to flush.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class FlushDeadline:
+    """
+    Deadline by which the buffer must be flushed.
+    
+    While no deadline is armed, wait() blocks on an event instead of
+    polling, so an idle forwarder does not wake up. A cancelled deadline
+    is never replaced by an earlier one (the next arm() is later), so a
+    sleep started for the old deadline never overshoots the new one.
+    """
+    
+    def __init__(
+        self,
+        delay: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        """
+        Initialize the timer.
+        
+        Args:
+            delay: Seconds from arming to the deadline
+            clock: Monotonic clock, injectable for tests
+            sleep: Coroutine function sleeping for a number of seconds,
+                injectable for tests
+        """
+        self.delay = delay
+        self.deadline: Optional[float] = None
+        self.wakeups = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._armed = asyncio.Event()
+    
+    def arm(self) -> None:
+        """Start the timer, unless a deadline is already set."""
+        if self.deadline is None:
+            self.deadline = self._clock() + self.delay
+            self._armed.set()
+    
+    def cancel(self) -> None:
+        """Drop the deadline, after the buffer has been emptied."""
+        self.deadline = None
+    
+    async def wait(self) -> None:
+        """Wait until the armed deadline passes, then disarm the timer."""
+        while True:
+            if self.deadline is None:
+                self._armed.clear()
+                await self._armed.wait()
+                continue
+            
+            remaining = self.deadline - self._clock()
+            if remaining <= 0:
+                self.deadline = None
+                return
+            await self._sleep(remaining)
+            self.wakeups += 1
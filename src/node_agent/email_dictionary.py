@@ -0,0 +1,260 @@
+"""
+Email dictionary encoding for Marzban Node Agent.
+
+This module provides the node side of dictionary encoding, which replaces
+emails in log entries with compact integer ids registered in a per-node
+Redis hash, and the decoder the central side uses to resolve them.
+"""
+
+import logging
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+from .config import ConfigService
+
+
+# Bytes per mapping besides the email string: the id and dict slots
+MAPPING_OVERHEAD = 120
+
+
+class EmailDictionary:
+    """
+    Integer ids for the emails of one node.
+    
+    Ids are assigned locally in increasing order. New mappings stay pending
+    until they have been registered in Redis together with the batch using
+    them, and the mappings already in Redis are loaded before the first
+    batch (and after switching endpoints) so restarts keep their ids.
+    """
+    
+    def __init__(self):
+        """Initialize an empty dictionary."""
+        self.ids: Dict[str, int] = {}
+        self.pending: Dict[int, str] = {}
+        self.loaded = False
+        self.conflicts = 0
+        self._next_id = 1
+    
+    def __len__(self) -> int:
+        """Number of emails with an id."""
+        return len(self.ids)
+    
+    def memory_size(self) -> int:
+        """Approximate bytes held by the mappings."""
+        return sum(sys.getsizeof(email) for email in self.ids) + len(self.ids) * MAPPING_OVERHEAD
+    
+    def encode(self, email: str) -> int:
+        """
+        Get the id of an email, assigning a new one if needed.
+        
+        Args:
+            email: User email
+        
+        Returns:
+            Integer id of the email
+        """
+        email_id = self.ids.get(email)
+        if email_id is None:
+            email_id = self._next_id
+            self._next_id += 1
+            self.ids[email] = email_id
+            self.pending[email_id] = email
+        return email_id
+    
+    def encode_entries(self, entries: List[Dict[str, Any]], dumps: Callable[[Dict[str, Any]], Any]) -> List[Any]:
+        """
+        Serialize log entries with their email replaced by its id.
+        
+        The entries themselves keep their email, so a batch that has to be
+        sent again can be encoded again.
+        
+        Args:
+            entries: Log entries
+            dumps: Serializer for one entry
+        
+        Returns:
+            Serialized entries with email_id instead of email
+        """
+        encode = self.encode
+        serialized = []
+        for entry in entries:
+            encoded = entry.copy()
+            encoded['email_id'] = encode(encoded.pop('email'))
+            serialized.append(dumps(encoded))
+        return serialized
+    
+    def load(self, registered: Dict[str, str]) -> int:
+        """
+        Merge the mappings registered in Redis with the local ones.
+        
+        Registered mappings win. Local mappings missing from Redis become
+        pending again; a local id registered for another email is dropped,
+        and the email gets a new id when it is next encoded.
+        
+        Args:
+            registered: Registered mappings, id -> email as stored in the hash
+        
+        Returns:
+            Number of local ids that conflicted with registered ones
+        """
+        ids: Dict[str, int] = {}
+        for field, email in registered.items():
+            try:
+                ids[email] = int(field)
+            except ValueError:
+                continue
+        taken = set(ids.values())
+        
+        pending: Dict[int, str] = {}
+        conflicts = 0
+        for email, email_id in self.ids.items():
+            if email in ids:
+                continue
+            if email_id in taken:
+                conflicts += 1
+                continue
+            ids[email] = email_id
+            pending[email_id] = email
+            taken.add(email_id)
+        
+        self.ids = ids
+        self.pending = pending
+        self._next_id = max(taken, default=0) + 1
+        self.conflicts += conflicts
+        self.loaded = True
+        return conflicts
+    
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get the mappings for a state file.
+        
+        Returns:
+            JSON-serializable state for set_state
+        """
+        return {'ids': self.ids, 'pending': list(self.pending)}
+    
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """
+        Restore mappings saved with get_state.
+        
+        The registered mappings are still loaded before the next batch, so
+        pending ones are checked against Redis.
+        
+        Args:
+            state: State from get_state
+        """
+        self.ids = dict(state['ids'])
+        emails = {email_id: email for email, email_id in self.ids.items()}
+        self.pending = {email_id: emails[email_id] for email_id in state['pending'] if email_id in emails}
+        self._next_id = max(self.ids.values(), default=0) + 1
+        self.loaded = False
+    
+    def registered(self, mappings: Dict[int, str]) -> None:
+        """
+        Mark mappings as registered in Redis.
+        
+        Args:
+            mappings: Mappings sent with a delivered batch
+        """
+        for email_id in mappings:
+            self.pending.pop(email_id, None)
+
+
+class EmailDecoder:
+    """
+    Resolve email ids in entries from dictionary-encoding nodes.
+    
+    Mappings never change once registered, so resolved ids are cached in an
+    LRU cache and only misses are fetched, with one HMGET per node per batch.
+    """
+    
+    def __init__(self, client: Any, cache_size: int = 100000, hash_tag: bool = False):
+        """
+        Initialize the decoder.
+        
+        Args:
+            client: Redis client for the dictionary hashes
+            cache_size: Maximum number of cached mappings
+            hash_tag: Whether the hashes use the cluster hash tag
+        """
+        self.client = client
+        self.cache_size = cache_size
+        self.hash_tag = hash_tag
+        self.logger = logging.getLogger(__name__)
+        self._cache: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        self.unresolved = 0
+    
+    def _remember(self, key: Tuple[str, int], email: str) -> None:
+        """Cache a mapping, evicting the least recently used one if full."""
+        self._cache[key] = email
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    async def decode(self, entries: List[Dict[str, Any]]) -> int:
+        """
+        Replace email_id with email in encoded entries, in place.
+        
+        Entries that already carry an email are left alone. Entries whose id
+        cannot be resolved keep no email.
+        
+        Args:
+            entries: Decoded log entries
+        
+        Returns:
+            Number of entries left unresolved
+        """
+        cache = self._cache
+        missing: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+        for entry in entries:
+            email_id = entry.get('email_id')
+            if email_id is None or 'email' in entry:
+                continue
+            key = (entry.get('node_id'), email_id)
+            email = cache.get(key)
+            if email is not None:
+                cache.move_to_end(key)
+                entry['email'] = email
+                self.hits += 1
+            else:
+                missing.setdefault(key[0], {}).setdefault(email_id, []).append(entry)
+        
+        if not missing:
+            return 0
+        
+        pipe = self.client.pipeline(transaction=False)
+        for node_id, by_id in missing.items():
+            pipe.hmget(ConfigService.get_redis_email_dictionary_key(node_id, self.hash_tag), *by_id)
+        results = await pipe.execute()
+        
+        unresolved = 0
+        for (node_id, by_id), emails in zip(missing.items(), results):
+            for (email_id, waiting), email in zip(by_id.items(), emails):
+                self.misses += 1
+                if email is None:
+                    unresolved += len(waiting)
+                    continue
+                self._remember((node_id, email_id), email)
+                for entry in waiting:
+                    entry['email'] = email
+        
+        if unresolved:
+            self.logger.debug("%d entries with unregistered email ids", unresolved)
+        self.unresolved += unresolved
+        return unresolved
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get decoder statistics.
+        
+        Returns:
+            Dictionary with cache hits, misses and unresolved entries
+        """
+        return {
+            'email_cache_size': len(self._cache),
+            'email_cache_hits': self.hits,
+            'email_cache_misses': self.misses,
+            'email_unresolved': self.unresolved,
+        }
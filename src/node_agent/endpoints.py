@@ -0,0 +1,278 @@
+"""
+Redis endpoint module for Marzban Node Agent.
+
+This module creates Redis clients for plain, Sentinel and Cluster URLs
+and keeps track of endpoint health for failover between an ordered list
+of central Redis endpoints.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+
+SENTINEL_SCHEMES = ("redis+sentinel", "rediss+sentinel")
+CLUSTER_SCHEMES = ("redis+cluster", "rediss+cluster")
+
+# Transparent reconnects inside the Redis client, before a command fails
+REDIS_RECONNECT_RETRIES = 2
+REDIS_RECONNECT_BACKOFF_CAP = 1.0
+REDIS_RECONNECT_BACKOFF_BASE = 0.05
+
+
+def _split_url(url: str) -> Tuple[str, Optional[str], Optional[str], List[Tuple[str, int]], str]:
+    """
+    Split a multi-host Redis URL.
+    
+    Args:
+        url: URL in scheme://[[user]:password@]host[:port][,host[:port]...][/path] form
+    
+    Returns:
+        Tuple of scheme, username, password, hosts and path
+    
+    Raises:
+        ValueError: If the URL is malformed
+    """
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        raise ValueError(f"Invalid Redis URL: {redact_url(url)}")
+    
+    netloc, _, path = rest.partition("/")
+    auth, _, hostlist = netloc.rpartition("@")
+    username = password = None
+    if auth:
+        user, has_password, secret = auth.partition(":")
+        username = unquote(user) or None
+        password = unquote(secret) if has_password else None
+    
+    hosts = []
+    for item in hostlist.split(","):
+        host, _, port = item.strip().rpartition(":")
+        if not host:
+            host, port = port, ""
+        if not host or (port and not port.isdigit()):
+            raise ValueError(f"Invalid Redis URL: {redact_url(url)}")
+        default_port = 26379 if scheme in SENTINEL_SCHEMES else 6379
+        hosts.append((host.strip("[]"), int(port) if port else default_port))
+    
+    return scheme, username, password, hosts, path
+
+
+def redact_url(url: str) -> str:
+    """
+    Hide the password in a Redis URL for logging.
+    
+    Args:
+        url: Redis URL
+    
+    Returns:
+        URL with the password replaced by ***
+    """
+    scheme, sep, rest = url.partition("://")
+    auth, at, hostlist = rest.rpartition("@")
+    if not sep or not at or ":" not in auth:
+        return url
+    user = auth.partition(":")[0]
+    return f"{scheme}://{user}:***@{hostlist}"
+
+
+def is_cluster_url(url: str) -> bool:
+    """Check whether a URL points at a Redis Cluster."""
+    return url.partition("://")[0] in CLUSTER_SCHEMES
+
+
+def parse_sentinel_url(url: str) -> Dict[str, Any]:
+    """
+    Parse a Sentinel URL.
+    
+    Args:
+        url: URL in redis+sentinel://[:password@]host:port[,host:port...]/service[/db] form
+    
+    Returns:
+        Dictionary with sentinels, service_name, db, username, password and ssl
+    """
+    scheme, username, password, hosts, path = _split_url(url)
+    service_name, _, db = path.partition("/")
+    if not service_name:
+        raise ValueError(f"Sentinel URL needs a service name: {redact_url(url)}")
+    if db and not db.isdigit():
+        raise ValueError(f"Invalid database in Sentinel URL: {redact_url(url)}")
+    
+    return {
+        'sentinels': hosts,
+        'service_name': service_name,
+        'db': int(db) if db else 0,
+        'username': username,
+        'password': password,
+        'ssl': scheme.startswith("rediss"),
+    }
+
+
+def parse_cluster_url(url: str) -> Dict[str, Any]:
+    """
+    Parse a Cluster URL.
+    
+    Args:
+        url: URL in redis+cluster://[:password@]host:port[,host:port...] form
+    
+    Returns:
+        Dictionary with startup_nodes, username, password and ssl
+    """
+    scheme, username, password, hosts, _ = _split_url(url)
+    return {
+        'startup_nodes': hosts,
+        'username': username,
+        'password': password,
+        'ssl': scheme.startswith("rediss"),
+    }
+
+
+def create_redis_client(
+    url: str,
+    connect_timeout: float = 5.0,
+    socket_timeout: float = 5.0,
+    max_connections: int = 10,
+    decode_responses: bool = True
+) -> Any:
+    """
+    Create a Redis client for a plain, Sentinel or Cluster URL.
+    
+    The client keeps a connection pool and reconnects transparently with
+    jittered backoff, so a short outage costs milliseconds rather than a
+    forwarder restart. No connection is made until the first command.
+    
+    Args:
+        url: Redis URL (redis://, rediss://, unix://, redis+sentinel://, redis+cluster://)
+        connect_timeout: Connect timeout in seconds
+        socket_timeout: Command timeout in seconds
+        max_connections: Connection pool size
+        decode_responses: Decode replies to str (False returns bytes, as
+            needed to read binary entries)
+    
+    Returns:
+        Redis or RedisCluster client
+    """
+    # redis-py takes a large share of the startup time, and agents using
+    # other sinks never need it
+    import redis.asyncio as redis
+    from redis.asyncio.retry import Retry
+    from redis.backoff import FullJitterBackoff
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    
+    backoff = FullJitterBackoff(cap=REDIS_RECONNECT_BACKOFF_CAP, base=REDIS_RECONNECT_BACKOFF_BASE)
+    options: Dict[str, Any] = {
+        'encoding': "utf-8",
+        'decode_responses': decode_responses,
+        'socket_keepalive': True,
+        'socket_keepalive_options': {},
+        'socket_connect_timeout': connect_timeout,
+        'socket_timeout': socket_timeout,
+        'retry': Retry(backoff, REDIS_RECONNECT_RETRIES),
+        'retry_on_error': [RedisConnectionError, RedisTimeoutError],
+        'health_check_interval': 30,
+    }
+    scheme = url.partition("://")[0]
+    
+    if scheme in SENTINEL_SCHEMES:
+        from redis.asyncio.sentinel import Sentinel, SentinelManagedSSLConnection
+        
+        params = parse_sentinel_url(url)
+        sentinel = Sentinel(
+            params['sentinels'],
+            sentinel_kwargs={
+                'socket_connect_timeout': connect_timeout,
+                'socket_timeout': socket_timeout,
+            }
+        )
+        if params['ssl']:
+            options['connection_class'] = SentinelManagedSSLConnection
+        return sentinel.master_for(
+            params['service_name'],
+            db=params['db'],
+            username=params['username'],
+            password=params['password'],
+            max_connections=max_connections,
+            **options
+        )
+    
+    if scheme in CLUSTER_SCHEMES:
+        from redis.asyncio.cluster import ClusterNode, RedisCluster
+        
+        params = parse_cluster_url(url)
+        return RedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in params['startup_nodes']],
+            username=params['username'],
+            password=params['password'],
+            ssl=params['ssl'],
+            max_connections=max_connections,
+            **options
+        )
+    
+    return redis.from_url(url, max_connections=max_connections, **options)
+
+
+class EndpointSelector:
+    """
+    Health-based selection from an ordered list of endpoints.
+    
+    Endpoints are preferred in the configured order. An endpoint that
+    failed is moved behind the healthy ones until its cooldown expires.
+    """
+    
+    def __init__(
+        self,
+        urls: List[str],
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the selector.
+        
+        Args:
+            urls: Endpoints in order of preference
+            cooldown: Seconds a failed endpoint is deprioritized
+            clock: Monotonic clock, injectable for tests
+        """
+        self.urls = list(urls)
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failed_at: Dict[str, float] = {}
+        self.current: Optional[str] = None
+        self.failovers = 0
+    
+    @property
+    def preferred(self) -> str:
+        """The most preferred endpoint."""
+        return self.urls[0]
+    
+    def is_healthy(self, url: str) -> bool:
+        """Check whether an endpoint is outside its failure cooldown."""
+        failed_at = self._failed_at.get(url)
+        return failed_at is None or self._clock() - failed_at >= self.cooldown
+    
+    def candidates(self, exclude: Optional[str] = None) -> List[str]:
+        """
+        Get endpoints to try, healthy ones first, each group in configured order.
+        
+        Args:
+            exclude: Endpoint to leave out (usually the current one)
+        
+        Returns:
+            Ordered list of endpoints
+        """
+        urls = [url for url in self.urls if url != exclude]
+        return sorted(urls, key=lambda url: not self.is_healthy(url))
+    
+    def mark_healthy(self, url: str) -> None:
+        """Record a successful check of an endpoint."""
+        self._failed_at.pop(url, None)
+    
+    def mark_failed(self, url: str) -> None:
+        """Record a failed check of an endpoint."""
+        self._failed_at[url] = self._clock()
+    
+    def switch_to(self, url: str) -> None:
+        """Make an endpoint the current one."""
+        if self.current is not None and url != self.current:
+            self.failovers += 1
+        self.current = url
@@ -0,0 +1,357 @@
+"""
+IP enrichment for Marzban Node Agent.
+
+This module resolves client IPs to their autonomous system number and
+country code on the node, so the central limiter gets them with every
+entry instead of looking up each entry itself. Lookups go to a plain
+CIDR table searched by binary search or to MaxMind databases, behind an
+LRU cache keyed by IP.
+"""
+
+import bisect
+import functools
+import ipaddress
+import re
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Lookup result: (asn, cc), either may be None
+Enrichment = Tuple[Optional[int], Optional[str]]
+NOT_FOUND: Enrichment = (None, None)
+
+# Bytes per cached IP: the key string, the result tuple and cache links
+CACHE_ENTRY_BYTES = 250
+
+# Fields of a CIDR table line: "network,asn,cc" or "network asn cc"
+FIELD_SEPARATOR = re.compile(r"[,\s]+")
+
+
+class CidrTable:
+    """
+    Sorted table of IP ranges searched with binary search.
+    
+    Networks may nest (a more specific prefix inside a wider one); they
+    are flattened on load into disjoint ranges where the most specific
+    network wins. Range bounds are kept in typed arrays and values are
+    interned, so a table costs about 20 bytes per IPv4 range.
+    """
+    
+    def __init__(self, ranges: Iterable[Tuple[int, int, int, Enrichment]] = ()):
+        """
+        Build the table.
+        
+        Args:
+            ranges: (version, first address, last address, value) per network,
+                as integers
+        """
+        self._starts: Dict[int, Any] = {4: array("Q"), 6: []}
+        self._ends: Dict[int, Any] = {4: array("Q"), 6: []}
+        self._indexes: Dict[int, array] = {4: array("I"), 6: array("I")}
+        self._values: List[Enrichment] = []
+        interned: Dict[Enrichment, int] = {}
+        
+        by_version: Dict[int, List[Tuple[int, int, Enrichment]]] = {4: [], 6: []}
+        for version, first, last, value in ranges:
+            by_version[version].append((first, last, value))
+        
+        for version, networks in by_version.items():
+            starts, ends, indexes = self._starts[version], self._ends[version], self._indexes[version]
+            for first, last, value in self._flatten(networks):
+                if value not in interned:
+                    interned[value] = len(self._values)
+                    self._values.append(value)
+                starts.append(first)
+                ends.append(last)
+                indexes.append(interned[value])
+    
+    @staticmethod
+    def _flatten(networks: List[Tuple[int, int, Enrichment]]) -> List[Tuple[int, int, Enrichment]]:
+        """
+        Turn nested networks into disjoint ranges, innermost network first.
+        
+        CIDR networks either nest or are disjoint, so a stack of the
+        networks enclosing the current address is enough.
+        """
+        # Wider networks first among those starting at the same address;
+        # of identical networks the one listed last wins
+        networks.sort(key=lambda network: (network[0], -network[1]))
+        ranges = []
+        stack: List[Tuple[int, Enrichment]] = []
+        cursor = 0
+        
+        def close_until(limit: float) -> None:
+            nonlocal cursor
+            while stack and stack[-1][0] < limit:
+                last, value = stack.pop()
+                if cursor <= last:
+                    ranges.append((cursor, last, value))
+                cursor = last + 1
+        
+        for first, last, value in networks:
+            close_until(first)
+            if stack and cursor < first:
+                ranges.append((cursor, first - 1, stack[-1][1]))
+            stack.append((last, value))
+            cursor = first
+        close_until(float("inf"))
+        return ranges
+    
+    def __len__(self) -> int:
+        """Number of disjoint ranges."""
+        return len(self._starts[4]) + len(self._starts[6])
+    
+    def lookup(self, ip: str) -> Enrichment:
+        """
+        Find the ASN and country of an address.
+        
+        Args:
+            ip: IPv4 or IPv6 address
+        
+        Returns:
+            (asn, cc) of the range containing the address, or (None, None)
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return NOT_FOUND
+        value = int(address)
+        version = address.version
+        
+        i = bisect.bisect_right(self._starts[version], value) - 1
+        if i < 0 or value > self._ends[version][i]:
+            return NOT_FOUND
+        return self._values[self._indexes[version][i]]
+    
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "CidrTable":
+        """
+        Build a table from "network,asn,cc" lines.
+        
+        Fields may also be separated by whitespace. The ASN may carry an
+        "AS" prefix; an empty or "-" field means unknown. Blank lines and
+        # comments are ignored.
+        
+        Args:
+            lines: Table lines
+        
+        Returns:
+            Table of the listed networks
+        
+        Raises:
+            ValueError: If a line is malformed
+        """
+        ranges = []
+        for number, line in enumerate(lines, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            
+            parts = FIELD_SEPARATOR.split(line) + ["", ""]
+            try:
+                network = ipaddress.ip_network(parts[0], strict=False)
+                asn_field = parts[1].upper().removeprefix("AS")
+                asn = int(asn_field) if asn_field not in ("", "-") else None
+            except ValueError:
+                raise ValueError(f"Invalid enrichment entry on line {number}: {line}")
+            cc = parts[2].upper() if parts[2] not in ("", "-") else None
+            
+            ranges.append((
+                network.version,
+                int(network.network_address),
+                int(network.broadcast_address),
+                (asn, cc)
+            ))
+        return cls(ranges)
+    
+    @classmethod
+    def from_file(cls, path: str) -> "CidrTable":
+        """
+        Load a table from a CIDR file.
+        
+        Args:
+            path: Path to the table
+        
+        Returns:
+            Table of the listed networks
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_lines(f)
+
+
+class MaxMindDatabase:
+    """
+    MaxMind (.mmdb) database, memory-mapped through the maxminddb package.
+    
+    Works with ASN, Country and City databases (GeoLite2 or commercial);
+    each provides the fields it has.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open the database.
+        
+        Args:
+            path: Path to the .mmdb file
+        
+        Raises:
+            ImportError: If maxminddb is not installed
+        """
+        import maxminddb
+        
+        self._reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+    
+    def lookup(self, ip: str) -> Enrichment:
+        """
+        Find the ASN and country of an address.
+        
+        Args:
+            ip: IPv4 or IPv6 address
+        
+        Returns:
+            (asn, cc) from the record of the address, or (None, None)
+        """
+        try:
+            record = self._reader.get(ip)
+        except ValueError:
+            return NOT_FOUND
+        if not record:
+            return NOT_FOUND
+        country = record.get('country') or record.get('registered_country') or {}
+        return record.get('autonomous_system_number'), country.get('iso_code')
+    
+    def close(self) -> None:
+        """Unmap the database file."""
+        self._reader.close()
+
+
+def open_database(path: str) -> Any:
+    """
+    Open an enrichment database, by file extension.
+    
+    Args:
+        path: .mmdb file, or a CIDR table in any other file
+    
+    Returns:
+        Database with a lookup(ip) method
+    
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is malformed, or is an .mmdb file and
+            maxminddb is not installed
+    """
+    if path.endswith(".mmdb"):
+        try:
+            return MaxMindDatabase(path)
+        except ImportError:
+            raise ValueError(f"{path} needs the maxminddb package (pip install maxminddb)")
+    return CidrTable.from_file(path)
+
+
+class IPEnricher:
+    """
+    Enrichment stage adding "asn" and "cc" to log entries.
+    
+    Databases are consulted in order and each field is taken from the
+    first one that has it, so an ASN and a Country database can be
+    combined. Results are cached per IP; fields that are unknown are left
+    out of the entry.
+    """
+    
+    def __init__(self, databases: List[Any], cache_size: int = 65536):
+        """
+        Initialize the stage.
+        
+        Args:
+            databases: Databases with a lookup(ip) method
+            cache_size: Maximum number of cached IPs
+        """
+        self.databases = databases
+        self.unresolved = 0
+        # Counts from before the cache was last cleared, which resets them
+        self._hits = 0
+        self._misses = 0
+        self._lookup = functools.lru_cache(maxsize=cache_size)(self._resolve)
+    
+    def _resolve(self, ip: str) -> Enrichment:
+        """Look an IP up in the databases."""
+        asn = cc = None
+        for database in self.databases:
+            found_asn, found_cc = database.lookup(ip)
+            if asn is None:
+                asn = found_asn
+            if cc is None:
+                cc = found_cc
+            if asn is not None and cc is not None:
+                break
+        return asn, cc
+    
+    def enrich(self, entry: Dict[str, Any]) -> None:
+        """
+        Add the ASN and country of the client IP to an entry, in place.
+        
+        Args:
+            entry: Log entry
+        """
+        asn, cc = self._lookup(entry['client_ip'])
+        if asn is not None:
+            entry['asn'] = asn
+        if cc is not None:
+            entry['cc'] = cc
+        if asn is None and cc is None:
+            self.unresolved += 1
+    
+    def memory_size(self) -> int:
+        """Approximate bytes held by the lookup cache."""
+        return self._lookup.cache_info().currsize * CACHE_ENTRY_BYTES
+    
+    def clear_cache(self) -> None:
+        """Drop the cached lookups, keeping the statistics."""
+        info = self._lookup.cache_info()
+        self._hits += info.hits
+        self._misses += info.misses
+        self._lookup.cache_clear()
+    
+    def close(self) -> None:
+        """Release the databases holding files open (MaxMind readers)."""
+        for database in self.databases:
+            close = getattr(database, 'close', None)
+            if close is not None:
+                close()
+    
+    @classmethod
+    def from_config(cls, config: Any) -> Optional["IPEnricher"]:
+        """
+        Create the stage from node configuration.
+        
+        Args:
+            config: Node configuration
+        
+        Returns:
+            Enricher, or None when no database is configured
+        
+        Raises:
+            OSError: If a database cannot be read
+            ValueError: If a database is malformed or unsupported
+        """
+        if not config.enrich_databases:
+            return None
+        return cls([open_database(path) for path in config.enrich_databases], config.enrich_cache_size)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get enrichment statistics.
+        
+        Returns:
+            Dictionary with cache hits, misses and hit rate
+        """
+        info = self._lookup.cache_info()
+        hits = self._hits + info.hits
+        misses = self._misses + info.misses
+        return {
+            'enrich_cache_size': info.currsize,
+            'enrich_cache_hits': hits,
+            'enrich_cache_misses': misses,
+            'enrich_cache_hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'enrich_unresolved': self.unresolved,
+        }
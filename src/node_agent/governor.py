@@ -0,0 +1,166 @@
+"""
+Delivery governor for Marzban Node Agent.
+
+This module provides token buckets capping the bytes and batches per
+second the forwarder sends to its sink, so a backlog flush after an
+outage cannot saturate a metered or congested uplink. Live-tail batches
+are exempt from waiting but still draw from the buckets, leaving
+backfill only the capacity live traffic does not use.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`.
+    
+    Reservations may take more tokens than are available; the bucket then
+    goes into debt and the caller is told how long to wait until the debt
+    is repaid, so the average rate holds even for requests larger than
+    the capacity.
+    """
+    
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the bucket, full.
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens held (the burst allowance)
+            clock: Monotonic clock, injectable for tests
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+    
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    @property
+    def tokens(self) -> float:
+        """Tokens currently available (negative while in debt)."""
+        self._refill()
+        return self._tokens
+    
+    def reserve(self, amount: float) -> float:
+        """
+        Take tokens.
+        
+        Args:
+            amount: Tokens to take
+        
+        Returns:
+            Seconds to wait before using them (0 if they were available)
+        """
+        self._refill()
+        self._tokens -= amount
+        return max(0.0, -self._tokens / self.rate)
+
+
+class DeliveryGovernor:
+    """Bytes/s and batches/s caps for outgoing batches."""
+    
+    def __init__(
+        self,
+        bytes_per_second: float = 0,
+        batches_per_second: float = 0,
+        burst: float = 1.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the governor.
+        
+        Args:
+            bytes_per_second: Byte rate cap (0 disables)
+            batches_per_second: Batch rate cap (0 disables)
+            burst: Seconds of the capped rate that may be sent at once
+            clock: Monotonic clock, injectable for tests
+        """
+        self._clock = clock
+        self._settings = None
+        self.bytes_bucket: Optional[TokenBucket] = None
+        self.batches_bucket: Optional[TokenBucket] = None
+        self.configure(bytes_per_second, batches_per_second, burst)
+        
+        self.throttle_time = 0.0
+        self.bytes_deferred = 0
+        self.batches_deferred = 0
+        self.live_bytes = 0
+    
+    def configure(self, bytes_per_second: float, batches_per_second: float, burst: float) -> None:
+        """
+        Change the caps, keeping the statistics.
+        
+        Args:
+            bytes_per_second: Byte rate cap (0 disables)
+            batches_per_second: Batch rate cap (0 disables)
+            burst: Seconds of the capped rate that may be sent at once
+        """
+        settings = (bytes_per_second, batches_per_second, burst)
+        if settings == self._settings:
+            # Keep the bucket levels on a reload that changes nothing here
+            return
+        self._settings = settings
+        
+        self.bytes_bucket = None
+        self.batches_bucket = None
+        if bytes_per_second:
+            self.bytes_bucket = TokenBucket(bytes_per_second, bytes_per_second * burst, self._clock)
+        if batches_per_second:
+            # Always allow at least one whole batch
+            self.batches_bucket = TokenBucket(
+                batches_per_second, max(1.0, batches_per_second * burst), self._clock
+            )
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any cap is configured."""
+        return self.bytes_bucket is not None or self.batches_bucket is not None
+    
+    def reserve(self, size: int, live: bool = False) -> float:
+        """
+        Account for a batch about to be sent.
+        
+        Args:
+            size: Batch size in bytes
+            live: Whether the batch is live-tail traffic, exempt from waiting
+        
+        Returns:
+            Seconds to wait before sending the batch
+        """
+        delay = 0.0
+        if self.bytes_bucket is not None:
+            delay = self.bytes_bucket.reserve(size)
+        if self.batches_bucket is not None:
+            delay = max(delay, self.batches_bucket.reserve(1))
+        
+        if live:
+            self.live_bytes += size
+            return 0.0
+        
+        if delay:
+            self.throttle_time += delay
+            self.bytes_deferred += size
+            self.batches_deferred += 1
+        return delay
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get governor statistics.
+        
+        Returns:
+            Dictionary with the time spent throttled and what was deferred
+        """
+        return {
+            'governor_throttle_time': self.throttle_time,
+            'governor_bytes_deferred': self.bytes_deferred,
+            'governor_batches_deferred': self.batches_deferred,
+            'governor_live_bytes': self.live_bytes,
+        }
@@ -0,0 +1,284 @@
+"""
+Heavy-hitter tracking for Marzban Node Agent.
+
+This module answers "which users make the most connections on this node
+right now, and from how many IPs" in fixed memory: a Space-Saving summary
+keeps approximate connection counts for the busiest users, and each
+tracked user carries a HyperLogLog sketch of its distinct client IPs.
+"""
+
+import base64
+import hashlib
+import heapq
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Tracked users per reported user; more counters make the top-K more exact
+CAPACITY_FACTOR = 4
+
+# Bytes per tracked user besides the sketch registers: counter, error,
+# heap entry and dict slots
+SKETCH_OVERHEAD = 400
+
+
+class HyperLogLog:
+    """
+    HyperLogLog estimator of the number of distinct values.
+    
+    Uses 2 ** precision one-byte registers; the standard error is about
+    1.04 / sqrt(2 ** precision), e.g. 3.3% for precision 10.
+    """
+    
+    def __init__(self, precision: int = 10):
+        """
+        Initialize the sketch.
+        
+        Args:
+            precision: Number of index bits (4 to 16)
+        """
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+    
+    def add(self, value: str) -> None:
+        """Add a value to the sketch."""
+        hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        index = hashed >> self._shift
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = self._shift - (hashed & self._mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def count(self) -> int:
+        """
+        Estimate the number of distinct values added.
+        
+        Returns:
+            Estimated cardinality
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        
+        # Linear counting is more accurate while many registers are empty
+        zeros = self.registers.count(0)
+        if zeros and estimate <= 2.5 * m:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """
+    Space-Saving summary of the most frequent keys.
+    
+    Keeps at most `capacity` counters. A new key replaces the key with the
+    smallest count and inherits that count as its error, so a reported
+    count overestimates the true one by at most `error`, and every key
+    seen more than total / capacity times is tracked.
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Initialize the summary.
+        
+        Args:
+            capacity: Maximum number of tracked keys
+        """
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # One (count, key) entry per tracked key; counts in it may be stale
+        # (lower than the real count), which is fixed lazily on eviction
+        self._heap: List[Tuple[int, str]] = []
+    
+    def add(self, key: str) -> Optional[str]:
+        """
+        Count one occurrence of a key.
+        
+        Args:
+            key: Key to count
+        
+        Returns:
+            The key evicted to make room, if any
+        """
+        count = self.counts.get(key)
+        if count is not None:
+            self.counts[key] = count + 1
+            return None
+        
+        if len(self.counts) < self.capacity:
+            self.counts[key] = 1
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (1, key))
+            return None
+        
+        # Find the true minimum, refreshing stale heap entries on the way
+        while True:
+            floor, evicted = self._heap[0]
+            actual = self.counts[evicted]
+            if actual == floor:
+                break
+            heapq.heapreplace(self._heap, (actual, evicted))
+        
+        del self.counts[evicted]
+        del self.errors[evicted]
+        self.counts[key] = floor + 1
+        self.errors[key] = floor
+        heapq.heapreplace(self._heap, (floor + 1, key))
+        return evicted
+    
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        """
+        Get the most frequent keys.
+        
+        Args:
+            n: Number of keys to return
+        
+        Returns:
+            List of (key, count, error), highest count first
+        """
+        ranked = heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in ranked]
+    
+    def load(self, counts: Dict[str, int], errors: Dict[str, int]) -> None:
+        """
+        Replace the counters, keeping the highest ones if over capacity.
+        
+        Args:
+            counts: Count per key
+            errors: Error per key
+        """
+        ranked = heapq.nlargest(self.capacity, counts.items(), key=lambda item: item[1])
+        self.counts = dict(ranked)
+        self.errors = {key: errors.get(key, 0) for key in self.counts}
+        self._heap = [(count, key) for key, count in ranked]
+        heapq.heapify(self._heap)
+    
+    def clear(self) -> None:
+        """Forget all counters."""
+        self.counts.clear()
+        self.errors.clear()
+        self._heap.clear()
+
+
+class HeavyHitters:
+    """
+    Per-window top users by connection count with distinct IP estimates.
+    
+    Memory is bounded by top_k * CAPACITY_FACTOR counters and as many
+    HyperLogLog sketches, whatever the number of users. A user's sketch
+    is dropped when the user is evicted, so its distinct IP count only
+    covers the time since it was last (re)admitted.
+    """
+    
+    def __init__(self, top_k: int, precision: int = 10):
+        """
+        Initialize the tracker.
+        
+        Args:
+            top_k: Number of users to report
+            precision: HyperLogLog precision of the per-user sketches
+        """
+        self.top_k = top_k
+        self.precision = precision
+        self.counter = SpaceSaving(top_k * CAPACITY_FACTOR)
+        self.sketches: Dict[str, HyperLogLog] = {}
+        self.window_start = time.time()
+        self.lines = 0
+    
+    def add(self, user: str, ip: str) -> None:
+        """
+        Record one connection.
+        
+        Args:
+            user: User email
+            ip: Client IP address
+        """
+        self.lines += 1
+        evicted = self.counter.add(user)
+        if evicted is not None:
+            del self.sketches[evicted]
+        
+        sketch = self.sketches.get(user)
+        if sketch is None:
+            sketch = self.sketches[user] = HyperLogLog(self.precision)
+        sketch.add(ip)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current window's top users.
+        
+        Returns:
+            Dictionary with the window bounds, line count and top users
+        """
+        return {
+            'window_start': self.window_start,
+            'window_end': time.time(),
+            'lines': self.lines,
+            'users': [
+                {
+                    'email': user,
+                    'connections': count,
+                    'error': error,
+                    'distinct_ips': self.sketches[user].count()
+                }
+                for user, count, error in self.counter.top(self.top_k)
+            ]
+        }
+    
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get the current window's counters and sketches.
+        
+        Returns:
+            JSON-serializable state for set_state
+        """
+        return {
+            'window_start': self.window_start,
+            'lines': self.lines,
+            'precision': self.precision,
+            'counts': self.counter.counts,
+            'errors': self.counter.errors,
+            'sketches': {
+                user: base64.b64encode(sketch.registers).decode()
+                for user, sketch in self.sketches.items()
+            },
+        }
+    
+    def set_state(self, state: Dict[str, Any]) -> bool:
+        """
+        Continue a window saved with get_state.
+        
+        Args:
+            state: State from get_state
+        
+        Returns:
+            True if the state was restored; a state with another
+            precision is ignored
+        """
+        if state.get('precision') != self.precision:
+            return False
+        
+        self.counter.load(state['counts'], state['errors'])
+        self.sketches = {}
+        for user in self.counter.counts:
+            sketch = self.sketches[user] = HyperLogLog(self.precision)
+            if user in state['sketches']:
+                sketch.registers[:] = base64.b64decode(state['sketches'][user])
+        self.window_start = state['window_start']
+        self.lines = state['lines']
+        return True
+    
+    def memory_size(self) -> int:
+        """Approximate bytes held by the counters and sketches."""
+        return sum(len(sketch.registers) + SKETCH_OVERHEAD for sketch in self.sketches.values())
+    
+    def reset(self) -> None:
+        """Start a new window."""
+        self.counter.clear()
+        self.sketches.clear()
+        self.window_start = time.time()
+        self.lines = 0
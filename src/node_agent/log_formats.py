@@ -0,0 +1,568 @@
+"""
+Log format module for Marzban Node Agent.
+
+This module provides specialized parsers for the access log layouts the
+agent understands (Xray text, JSON lines and sing-box, plus the generic
+regex parser) and a parser that detects the format from sample lines,
+tracks how many lines the chosen parser fails to recognize, and detects
+the format again when that miss rate jumps.
+"""
+
+import json
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from .log_parser import LogFilter, MarzbanLogParser
+from .logging_utils import RateLimitedLogger
+
+
+FORMAT_AUTO = "auto"
+FORMAT_XRAY = "xray"
+FORMAT_XRAY_JSON = "xray-json"
+FORMAT_SINGBOX = "sing-box"
+FORMAT_REGEX = "regex"
+LOG_FORMATS = (FORMAT_AUTO, FORMAT_XRAY, FORMAT_XRAY_JSON, FORMAT_SINGBOX, FORMAT_REGEX)
+
+# Non-empty lines sampled before a format is chosen
+DETECT_SAMPLE_LINES = 50
+
+# Bytes read from the start of the file for detection
+DETECT_READ_BYTES = 64 * 1024
+
+# Lines per miss rate measurement
+MISS_WINDOW = 1000
+
+
+class ParsedLine(NamedTuple):
+    """Fields a format parser extracts from an access line."""
+    
+    email: str
+    client_ip: str
+    inbound: Optional[str]
+    stamp: Any
+
+
+# Returned for lines in the parser's layout that carry no connection to
+# forward (rejected connections, DNS lines, API traffic without an email);
+# None is returned for lines the parser does not recognize at all (a miss)
+SKIP: Tuple = ()
+
+ParseResult = Union[ParsedLine, Tuple, None]
+
+
+def split_address(address: str) -> Optional[str]:
+    """
+    Get the IP from a source address.
+    
+    Args:
+        address: Address such as "1.2.3.4:5678", "tcp:1.2.3.4:5678",
+            "[2001:db8::1]:443" or a bare IP
+    
+    Returns:
+        IP address, or None if the address does not look like one
+    """
+    if address[:4] in ("tcp:", "udp:"):
+        address = address[4:]
+    
+    if address.startswith("["):
+        ip = address[1:address.find("]")]
+    elif address.count(":") == 1:
+        ip = address.partition(":")[0]
+    else:
+        # A bare IPv4 or IPv6 address
+        ip = address
+    
+    if ip and (ip[0].isdigit() or ":" in ip):
+        return ip
+    return None
+
+
+class XrayTextParser:
+    """
+    Positional parser for Xray text access logs.
+    
+    Handles "2024/01/15 10:30:45[.123456] from 1.2.3.4:5678 accepted
+    tcp:host:443 [TAG >> OUTBOUND] email: user" and the older layout
+    without "from", splitting on spaces instead of searching the line.
+    """
+    
+    name = FORMAT_XRAY
+    
+    def __init__(self):
+        """Initialize the parser."""
+        self._last_stamp = ""
+        self._last_time: Optional[float] = None
+    
+    def parse(self, line: str) -> ParseResult:
+        """Extract the connection fields from a line."""
+        if len(line) < 20 or line[4] != "/" or line[7] != "/" or line[10] != " ":
+            return None
+        
+        parts = line.split(" ", 5)
+        if len(parts) < 6:
+            return SKIP
+        if parts[2] == "from":
+            address, status, rest = parts[3], parts[4], parts[5]
+        else:
+            address, status, rest = parts[2], parts[3], f"{parts[4]} {parts[5]}"
+        if status != "accepted":
+            return SKIP
+        
+        ip = split_address(address)
+        if ip is None:
+            return None
+        
+        index = rest.rfind("email: ")
+        if index < 0:
+            return SKIP
+        email = rest[index + 7:].split(" ", 1)[0]
+        if not email:
+            return SKIP
+        
+        inbound = None
+        start = rest.find(" [")
+        if 0 <= start < index:
+            route = rest[start + 2:rest.find("]", start)]
+            for separator in (" >> ", " -> "):
+                if separator in route:
+                    inbound = route.partition(separator)[0].strip()
+                    break
+        
+        return ParsedLine(email, ip, inbound, f"{parts[0]} {parts[1][:8]}")
+    
+    def timestamp(self, stamp: str) -> Optional[float]:
+        """Convert a "YYYY/MM/DD HH:MM:SS" stamp, reusing the last conversion."""
+        if stamp != self._last_stamp:
+            try:
+                self._last_time = datetime.strptime(stamp, "%Y/%m/%d %H:%M:%S").timestamp()
+            except ValueError:
+                self._last_time = None
+            self._last_stamp = stamp
+        return self._last_time
+
+
+class JsonLineParser:
+    """
+    Parser for access logs written as one JSON object per line.
+    
+    The key names vary between cores and log shippers, so the first key
+    found from each alias list is remembered and looked up directly on
+    later lines.
+    """
+    
+    name = FORMAT_XRAY_JSON
+    
+    EMAIL_KEYS = ("email", "user", "username")
+    IP_KEYS = ("from", "source", "src", "client_ip", "ip")
+    INBOUND_KEYS = ("inbound", "inboundTag", "inbound_tag", "tag")
+    TIME_KEYS = ("time", "timestamp", "ts")
+    STATUS_KEYS = ("status", "action")
+    
+    def __init__(self):
+        """Initialize the parser."""
+        self._keys: Dict[Tuple[str, ...], Optional[str]] = {}
+    
+    def _get(self, record: Dict[str, Any], aliases: Tuple[str, ...]) -> Any:
+        """Get a field by its remembered key, learning the key on a miss."""
+        key = self._keys.get(aliases)
+        if key is not None and key in record:
+            return record[key]
+        
+        for alias in aliases:
+            if alias in record:
+                self._keys[aliases] = alias
+                return record[alias]
+        return None
+    
+    def parse(self, line: str) -> ParseResult:
+        """Extract the connection fields from a line."""
+        if not line.startswith("{"):
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        
+        status = self._get(record, self.STATUS_KEYS)
+        if status is not None and status != "accepted":
+            return SKIP
+        
+        email = self._get(record, self.EMAIL_KEYS)
+        address = self._get(record, self.IP_KEYS)
+        if not email or not address:
+            return SKIP
+        
+        ip = split_address(str(address))
+        if ip is None:
+            return None
+        
+        inbound = self._get(record, self.INBOUND_KEYS)
+        return ParsedLine(str(email), ip, inbound, self._get(record, self.TIME_KEYS))
+    
+    def timestamp(self, stamp: Any) -> Optional[float]:
+        """Convert a Unix time or an ISO 8601 / Xray time string."""
+        if isinstance(stamp, (int, float)) and not isinstance(stamp, bool):
+            # Milliseconds since the epoch are common in JSON logs
+            return stamp / 1000 if stamp > 1e11 else float(stamp)
+        if not isinstance(stamp, str):
+            return None
+        try:
+            return datetime.fromisoformat(stamp.replace("Z", "+00:00").replace("/", "-")).timestamp()
+        except ValueError:
+            return None
+
+
+class SingBoxParser:
+    """
+    Parser for sing-box logs.
+    
+    Picks "INFO [1234 0ms] inbound/vless[TAG]: [user] inbound connection
+    from 1.2.3.4:5678" lines, with or without the timestamp and timezone
+    prefix sing-box writes depending on its log settings.
+    """
+    
+    name = FORMAT_SINGBOX
+    
+    HEADER_PATTERN = re.compile(
+        r'^(?:([+-]\d{4}) )?(?:(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\S* )?'
+        r'(?:TRACE|DEBUG|INFO|WARN|ERROR|FATAL|PANIC) '
+    )
+    MARKER = " inbound connection from "
+    
+    def __init__(self):
+        """Initialize the parser."""
+        self._last_stamp: Tuple = ()
+        self._last_time: Optional[float] = None
+    
+    def parse(self, line: str) -> ParseResult:
+        """Extract the connection fields from a line."""
+        header = self.HEADER_PATTERN.match(line)
+        if header is None:
+            return None
+        
+        index = line.find(self.MARKER)
+        if index < 0:
+            return SKIP
+        
+        prefix = line[:index]
+        if not prefix.endswith("]"):
+            # Connection of an inbound without users
+            return SKIP
+        email = prefix[prefix.rfind("[") + 1:-1]
+        
+        ip = split_address(line[index + len(self.MARKER):].split(" ", 1)[0])
+        if ip is None or not email:
+            return None
+        
+        inbound = None
+        start = prefix.find("inbound/")
+        if start >= 0:
+            start = prefix.find("[", start)
+            end = prefix.find("]:", start)
+            if 0 <= start < end:
+                inbound = prefix[start + 1:end]
+        
+        return ParsedLine(email, ip, inbound, header.groups())
+    
+    def timestamp(self, stamp: Tuple[Optional[str], Optional[str]]) -> Optional[float]:
+        """Convert the header's timezone and time, reusing the last conversion."""
+        if stamp != self._last_stamp:
+            zone, moment = stamp
+            try:
+                if moment is None:
+                    self._last_time = None
+                elif zone is None:
+                    self._last_time = datetime.strptime(moment, "%Y-%m-%d %H:%M:%S").timestamp()
+                else:
+                    self._last_time = datetime.strptime(f"{zone} {moment}", "%z %Y-%m-%d %H:%M:%S").timestamp()
+            except ValueError:
+                self._last_time = None
+            self._last_stamp = stamp
+        return self._last_time
+
+
+class RegexParser:
+    """
+    Generic parser searching the line with regular expressions.
+    
+    The fallback for layouts no specialized parser recognizes; it is what
+    MarzbanLogParser always did.
+    """
+    
+    name = FORMAT_REGEX
+    
+    def parse(self, line: str) -> ParseResult:
+        """Extract the connection fields from a line."""
+        if not MarzbanLogParser.is_accepted_connection(line):
+            return SKIP
+        
+        client_ip = MarzbanLogParser.extract_client_ip(line)
+        if not client_ip:
+            return None
+        email = MarzbanLogParser.extract_email(line)
+        if not email:
+            return SKIP
+        
+        match = LogFilter.INBOUND_PATTERN.search(line)
+        return ParsedLine(email, client_ip, match.group(1).strip() if match else None, line)
+    
+    def timestamp(self, stamp: str) -> Optional[float]:
+        """Extract the timestamp from the line."""
+        return MarzbanLogParser.extract_timestamp(stamp)
+
+
+# In order of preference when two parsers recognize the same sample
+PARSERS = {
+    FORMAT_XRAY: XrayTextParser,
+    FORMAT_SINGBOX: SingBoxParser,
+    FORMAT_XRAY_JSON: JsonLineParser,
+    FORMAT_REGEX: RegexParser,
+}
+
+
+class LogFormatParser:
+    """
+    Access log parser choosing its format from the log itself.
+    
+    With LOG_FORMAT=auto every parser is tried on the first sample lines
+    and the one recognizing most of them is kept. Afterwards the share of
+    lines the chosen parser does not recognize is measured over windows
+    of MISS_WINDOW lines; when it exceeds the threshold a warning is
+    logged and, in auto mode, the format is detected again.
+    """
+    
+    def __init__(self, log_format: str = FORMAT_AUTO, miss_threshold: float = 0.5):
+        """
+        Initialize the parser.
+        
+        Args:
+            log_format: One of LOG_FORMATS
+            miss_threshold: Miss rate that triggers a warning and re-detection
+        
+        Raises:
+            ValueError: If the format is unknown
+        """
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.log_format = log_format
+        self.miss_threshold = miss_threshold
+        self.logger = logging.getLogger(__name__)
+        self.rate_limited_logger = RateLimitedLogger(self.logger)
+        
+        self.parsers = {name: parser() for name, parser in PARSERS.items()}
+        self.parser: Any = None
+        self._scores: Dict[str, List[int]] = {}
+        self._sampled = 0
+        if log_format == FORMAT_AUTO:
+            self._start_detection()
+        else:
+            self.parser = self.parsers[log_format]
+        
+        self.lines = 0
+        self.misses = 0
+        self.redetections = 0
+        self.miss_rate = 0.0
+        self._window_lines = 0
+        self._window_misses = 0
+    
+    @property
+    def detecting(self) -> bool:
+        """Whether the format is still being detected."""
+        return self.parser is None
+    
+    @property
+    def format(self) -> Optional[str]:
+        """Name of the chosen format, None while detecting."""
+        return self.parser.name if self.parser is not None else None
+    
+    def _start_detection(self) -> None:
+        """Start sampling lines to choose a format."""
+        self.parser = None
+        self._scores = {name: [0, 0] for name in self.parsers}
+        self._sampled = 0
+    
+    def _sample(self, line: str) -> Tuple[Any, ParseResult]:
+        """
+        Try every parser on a sample line.
+        
+        Returns:
+            Tuple of the first parser extracting a connection from the
+            line and its result, or (None, None)
+        """
+        found: Tuple[Any, ParseResult] = (None, None)
+        for name, parser in self.parsers.items():
+            parsed = parser.parse(line)
+            score = self._scores[name]
+            if parsed:
+                score[0] += 1
+                if found[0] is None:
+                    found = (parser, parsed)
+            elif parsed is None:
+                score[1] += 1
+        
+        self._sampled += 1
+        if self._sampled >= DETECT_SAMPLE_LINES:
+            self._choose()
+        return found
+    
+    def _choose(self) -> None:
+        """Keep the parser recognizing most sample lines."""
+        names = list(self.parsers)
+        best = max(names, key=lambda name: (self._scores[name][0], -self._scores[name][1], -names.index(name)))
+        self.parser = self.parsers[best]
+        self.logger.info(
+            f"Detected log format {best} ({self._scores[best][0]} of {self._sampled} sample lines parsed)"
+        )
+    
+    def detect(self, lines: Iterable[str]) -> Optional[str]:
+        """
+        Detect the format from sample lines.
+        
+        Args:
+            lines: Sample lines, e.g. the start of the log file
+        
+        Returns:
+            Chosen format, or None if more lines are needed
+        """
+        if not self.detecting:
+            return self.format
+        for line in lines:
+            line = line.strip()
+            if line:
+                self._sample(line)
+                if not self.detecting:
+                    break
+        # A short file is enough as long as some line was recognized
+        if self.detecting and any(hits for hits, _ in self._scores.values()):
+            self._choose()
+        return self.format
+    
+    def resume(self, log_format: str) -> bool:
+        """
+        Use a format detected by a previous run instead of detecting again.
+        
+        A wrong format is still noticed through the miss rate.
+        
+        Args:
+            log_format: Previously detected format
+        
+        Returns:
+            True if the format is used
+        """
+        if not self.detecting or log_format not in self.parsers:
+            return False
+        self.parser = self.parsers[log_format]
+        return True
+    
+    def detect_file(self, path: str) -> Optional[str]:
+        """
+        Detect the format from the start of a file.
+        
+        Args:
+            path: Log file path
+        
+        Returns:
+            Chosen format, or None if the file has no recognizable lines yet
+        
+        Raises:
+            OSError: If the file cannot be read
+        """
+        with open(path, "rb") as f:
+            head = f.read(DETECT_READ_BYTES)
+        # The last line may be cut off
+        lines = head.decode("utf-8", "replace").split("\n")[:-1]
+        return self.detect(lines)
+    
+    def _record(self, missed: bool) -> None:
+        """Count a line towards the miss rate and react to a jump."""
+        self.lines += 1
+        self._window_lines += 1
+        if missed:
+            self.misses += 1
+            self._window_misses += 1
+        if self._window_lines < MISS_WINDOW:
+            return
+        
+        self.miss_rate = self._window_misses / self._window_lines
+        self._window_lines = self._window_misses = 0
+        if self.miss_rate <= self.miss_threshold:
+            return
+        
+        if self.log_format == FORMAT_AUTO:
+            self.rate_limited_logger.warning(
+                "format", "%.0f%% of lines not recognized as %s, detecting the log format again",
+                self.miss_rate * 100, self.format
+            )
+            self.redetections += 1
+            self._start_detection()
+        else:
+            self.rate_limited_logger.warning(
+                "format", "%.0f%% of lines not recognized as %s, check LOG_FORMAT",
+                self.miss_rate * 100, self.format
+            )
+    
+    def parse(
+        self,
+        line: str,
+        node_id: str,
+        node_name: str,
+        log_filter: Optional[LogFilter] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Parse a single log line and create structured log object.
+        
+        Args:
+            line: Raw log line from access.log
+            node_id: Unique identifier for the node
+            node_name: Human-readable name for the node
+            log_filter: Optional filter for dropping unwanted connections
+        
+        Returns:
+            Structured log object or None if line doesn't contain useful info
+        """
+        line = line.strip()
+        if not line:
+            return None
+        
+        if self.parser is None:
+            parser, parsed = self._sample(line)
+        else:
+            parser = self.parser
+            parsed = parser.parse(line)
+            self._record(parsed is None)
+        if not parsed:
+            return None
+        
+        if log_filter and not (log_filter.accept_inbound(parsed.inbound)
+                               and log_filter.accept_fields(parsed.email, parsed.client_ip)):
+            return None
+        
+        now = time.time()
+        return {
+            'timestamp': parser.timestamp(parsed.stamp) or now,
+            'node_id': node_id,
+            'node_name': node_name,
+            'email': parsed.email,
+            'client_ip': parsed.client_ip,
+            'raw_line': line,
+            'processed_at': now
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get parser statistics.
+        
+        Returns:
+            Dictionary with the chosen format and miss counts
+        """
+        return {
+            'log_format': self.format,
+            'parser_lines': self.lines,
+            'parser_misses': self.misses,
+            'parser_miss_rate': self.miss_rate,
+            'parser_redetections': self.redetections,
+        }
@@ -9,11 +9,61 @@ import asyncio
 import json
 import logging
 import os
-from typing import List, Dict, Any, Optional
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Set, Tuple
 import aiofiles
-import redis.asyncio as redis
+from .checkpoint import CheckpointFile, StateFile
 from .config import NodeConfig, ConfigService
-from .log_parser import create_log_entry
+from .deadline import FlushDeadline
+from .email_dictionary import EmailDictionary
+from .enrichment import IPEnricher
+from .endpoints import EndpointSelector, create_redis_client, is_cluster_url, redact_url
+from .governor import DeliveryGovernor
+from .heavy_hitters import HeavyHitters
+from .log_formats import LogFormatParser
+from .log_parser import LogFilter
+from .memory import (
+    MEMORY_DROP_RAW_LINES, MEMORY_LEVELS, MEMORY_SHRINK_CACHES, MEMORY_SPILL, MEMORY_THRESHOLDS,
+    MemoryBudget, estimate_entries_size, read_cgroup_limit
+)
+from .logging_utils import RateLimitedLogger, format_bytes
+from .resilience import CIRCUIT_OPEN, CircuitBreaker, jittered_backoff
+from .serializers import create_serializer
+from .sinks import SINK_REDIS, create_sink
+
+if TYPE_CHECKING:
+    import redis.asyncio as redis
+
+
+# Backpressure modes, in order of severity
+BACKPRESSURE_NORMAL = "normal"
+BACKPRESSURE_DEGRADED = "degraded"
+BACKPRESSURE_CRITICAL = "critical"
+BACKPRESSURE_MODES = (BACKPRESSURE_NORMAL, BACKPRESSURE_DEGRADED, BACKPRESSURE_CRITICAL)
+
+# Bytes read from the access log per executor round trip
+TAIL_READ_SIZE = 64 * 1024
+
+# Seconds between memory budget checks
+MEMORY_CHECK_INTERVAL = 1.0
+
+# Push a batch unless its id was already seen, and save the position with it.
+# KEYS: batch marker, queue, position, email dictionary.
+# ARGV: marker TTL, position, count N of new email ids, N id/email pairs, entries...
+PUSH_BATCH_SCRIPT = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    local first = 4 + 2 * tonumber(ARGV[3])
+    for i = 4, first - 1, 2 do
+        redis.call('HSETNX', KEYS[4], ARGV[i], ARGV[i + 1])
+    end
+    for i = first, #ARGV, 1000 do
+        redis.call('LPUSH', KEYS[2], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+    end
+    redis.call('SET', KEYS[3], ARGV[2])
+    return {1, redis.call('LLEN', KEYS[2])}
+end
+return {0, redis.call('LLEN', KEYS[2])}
+"""
 
 
 class LogForwarder:
@@ -28,18 +78,113 @@ class LogForwarder:
         """
         self.config = config
         self.logger = logging.getLogger(__name__)
+        self.rate_limited_logger = RateLimitedLogger(self.logger)
         
         # Redis connection
-        self.redis_client: Optional[redis.Redis] = None
+        self.redis_client: Optional['redis.Redis'] = None
+        if config.relay_url:
+            endpoint_urls = [config.relay_url]
+        else:
+            endpoint_urls = [config.central_redis_url] + config.central_redis_fallback_urls
+        self.endpoints = EndpointSelector(endpoint_urls, cooldown=config.failover_check_interval)
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=config.circuit_breaker_threshold,
+            reset_timeout=config.circuit_breaker_reset
+        )
         
-        # Buffering and batching
+        # Pre-parse filtering of unwanted connections (None when no rules are set)
+        self.log_filter = LogFilter.from_config(config)
+        self.parser = LogFormatParser(config.log_format, config.log_format_miss_threshold)
+        # ASN/country of client IPs (None when no database is configured)
+        self.enricher = IPEnricher.from_config(config)
+        
+        # Buffering and batching; the serializer falls back to json when
+        # the configured library is not installed
         self.log_buffer: List[Dict[str, Any]] = []
-        self.last_flush_time = asyncio.get_event_loop().time()
+        self.serializer = create_serializer(config.serializer)
+        # Armed by the first entry entering an empty buffer
+        self.flush_deadline = FlushDeadline(config.flush_interval)
         
-        # File position tracking
+        # File position tracking: current_position is where the reader is,
+        # acked_position is the end of the last line known to be delivered
         self.current_position = 0
-        self.position_key = ConfigService.get_redis_position_key(config.node_id)
-        self.queue_key = ConfigService.get_redis_queue_key()
+        self.acked_position = 0
+        self.checkpoint_position: Optional[int] = None
+        self._position_restored = False
+        self._last_checkpoint_time = float("-inf")
+        self._last_mirror_time = float("-inf")
+        self.checkpoint_file: Optional[CheckpointFile] = None
+        if config.checkpoint_file:
+            self.checkpoint_file = CheckpointFile(config.checkpoint_file, config.node_id)
+        # Buffer and in-memory state handed over across restarts
+        self.state_file: Optional[StateFile] = None
+        if config.state_file:
+            self.state_file = StateFile(config.state_file, config.node_id)
+        # Set once the saved state has been loaded; a restart in place then
+        # keeps its own state instead
+        self._state_loaded = False
+        # Keys share a hash tag when any endpoint is a Redis Cluster
+        hash_tag = any(is_cluster_url(url) for url in endpoint_urls)
+        self._hash_tag = hash_tag
+        self.position_key = ConfigService.get_redis_position_key(config.node_id, hash_tag)
+        self.queue_key = ConfigService.get_redis_queue_key(hash_tag)
+        self.sink = create_sink(config, lambda: self.redis_client, self.queue_key)
+        
+        # Batch identity for idempotent delivery: (node_id, epoch, seq)
+        self.batch_epoch = int(time.time() * 1000)
+        self.batch_seq = 0
+        self.duplicate_batches = 0
+        self._pending_batch: Optional[Tuple[int, int, int]] = None
+        self._flush_lock = asyncio.Lock()
+        self._push_script = None
+        self._push_script_client = None
+        
+        # Central queue backpressure
+        self.backpressure_mode = BACKPRESSURE_NORMAL
+        self.central_queue_depth: Optional[int] = None
+        self.entries_deduplicated = 0
+        self._last_depth_sample = float("-inf")
+        self._buffered_keys: Set[Tuple[str, str]] = set()
+        
+        # Top users of the current window, and the last completed window
+        self.heavy_hitters: Optional[HeavyHitters] = None
+        if config.heavy_hitters_top_k:
+            self.heavy_hitters = HeavyHitters(config.heavy_hitters_top_k, config.heavy_hitters_precision)
+        self.heavy_hitters_report: Optional[Dict[str, Any]] = None
+        self.heavy_hitters_key = ConfigService.get_redis_heavy_hitters_key(config.node_id, hash_tag)
+        
+        # Emails sent as integer ids registered in a per-node hash
+        self.email_dictionary: Optional[EmailDictionary] = None
+        if config.email_dictionary:
+            self.email_dictionary = EmailDictionary()
+        self.email_dictionary_key = ConfigService.get_redis_email_dictionary_key(config.node_id, hash_tag)
+        
+        # Delivery rate caps; batches read while the tail is caught up are live
+        self.governor = DeliveryGovernor(
+            config.governor_bytes_per_second, config.governor_batches_per_second, config.governor_burst
+        )
+        self._tail_caught_up = True
+        # (epoch, seq) of the last batch reserved with the governor
+        self._governed_batch: Optional[Tuple[int, int]] = None
+        
+        # Memory accounting against MEMORY_BUDGET or the container limit
+        self.memory: Optional[MemoryBudget] = None
+        self._drop_raw_lines = False
+        self._spilling = False
+        self._create_memory_budget(config.memory_budget or read_cgroup_limit())
+        
+        # Throughput counters, reported in stats and the periodic summary
+        self.lines_read = 0
+        self.batches_sent = 0
+        self.entries_sent = 0
+        self.bytes_sent = 0
+        self._summary_snapshot = (0, 0, 0, 0)
+        
+        # Startup: the initial connection runs alongside reading
+        self._connect_task: Optional[asyncio.Task] = None
+        self._start_time = time.monotonic()
+        self.time_to_first_line: Optional[float] = None
+        self.time_to_first_ack: Optional[float] = None
         
         # Control flags
         self._running = False
@@ -54,18 +199,41 @@ class LogForwarder:
         self.logger.info(f"Starting LogForwarder for node {self.config.node_id}")
         self._running = True
         
+        self._start_time = time.monotonic()
+        
         try:
-            # Connect to Redis
-            await self._connect_redis()
+            # Connect to Redis in the background; lines are read and buffered
+            # meanwhile and flushed once connected. Other sinks run without
+            # the central server
+            if self.sink.uses_redis:
+                self._connect_task = asyncio.create_task(self._connect_redis())
+            elif not self.checkpoint_file:
+                self.logger.warning("No CHECKPOINT_FILE set, the file position will not be saved")
             
-            # Restore file position
-            await self._restore_position()
+            # While connecting, restore the state saved on shutdown or the
+            # position from the local checkpoint, and pick the log format from
+            # the start of the file
+            await self._restore_state()
+            startup = [self._restore_local_position()]
+            if self.parser.detecting:
+                startup.append(self._detect_format())
+            await asyncio.gather(*startup)
             
             # Start background tasks
             self._tasks = [
-                asyncio.create_task(self._tail_logs()),
+                asyncio.create_task(self._resume_tail()),
                 asyncio.create_task(self._flush_scheduler())
             ]
+            if self._connect_task is not None:
+                self._tasks.append(self._connect_task)
+            if self.sink.uses_redis and len(self.endpoints.urls) > 1:
+                self._tasks.append(asyncio.create_task(self._endpoint_monitor()))
+            if self.config.stats_log_interval:
+                self._tasks.append(asyncio.create_task(self._summary_reporter()))
+            if self.heavy_hitters is not None:
+                self._tasks.append(asyncio.create_task(self._heavy_hitters_reporter()))
+            if self.memory is not None:
+                self._tasks.append(asyncio.create_task(self._memory_monitor()))
             
             # Wait for all tasks
             await asyncio.gather(*self._tasks)
@@ -91,43 +259,363 @@ class LogForwarder:
         if self._tasks:
             await asyncio.gather(*self._tasks, return_exceptions=True)
         
-        # Flush remaining logs
-        if self.log_buffer:
-            await self._flush_batch()
+        # Flush remaining logs and save the acknowledged position, giving up
+        # after SHUTDOWN_TIMEOUT so an unreachable server cannot hold up the stop
+        try:
+            await asyncio.wait_for(self._final_flush(), self.config.shutdown_timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(
+                f"Final flush did not finish within {self.config.shutdown_timeout}s, "
+                f"{len(self.log_buffer)} logs left undelivered"
+            )
+        
+        # Hand what is still buffered over to the next start
+        if self.state_file:
+            await self._save_state()
+        elif self.log_buffer:
+            self.logger.warning(
+                f"{len(self.log_buffer)} buffered logs not delivered; they are read again from "
+                "the log after a restart (set STATE_FILE to keep them instead)"
+            )
         
-        # Save current position
-        await self._save_position()
+        await self.sink.close()
+        if self.enricher is not None:
+            self.enricher.close()
         
         # Close Redis connection
         if self.redis_client:
             await self.redis_client.close()
+            self.redis_client = None
         
         self.logger.info("LogForwarder stopped")
     
+    async def _final_flush(self) -> None:
+        """Flush the buffer and write a last checkpoint."""
+        if self.log_buffer:
+            await self._flush_batch()
+        await self._maybe_checkpoint(force=True)
+    
+    def _get_state(self) -> Dict[str, Any]:
+        """
+        Collect the in-memory state to hand over to the next start.
+        
+        Returns:
+            JSON-serializable state for _restore_state
+        """
+        state = {
+            'position': self.current_position,
+            'acked_position': self.acked_position,
+            'buffer': self.log_buffer,
+            'pending_batch': self._pending_batch,
+            'buffered_keys': list(self._buffered_keys),
+            'backpressure_mode': self.backpressure_mode,
+            'log_format': self.parser.format,
+        }
+        if self.heavy_hitters is not None:
+            state['heavy_hitters'] = self.heavy_hitters.get_state()
+        if self.email_dictionary is not None:
+            state['email_dictionary'] = self.email_dictionary.get_state()
+        return state
+    
+    async def _save_state(self) -> None:
+        """Write the state file on shutdown."""
+        try:
+            await asyncio.to_thread(self.state_file.save, self._get_state())
+            self.logger.info(
+                f"Saved state with {len(self.log_buffer)} buffered logs to {self.config.state_file}"
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to write state file: {e}")
+    
+    async def _restore_state(self) -> None:
+        """
+        Restore the state saved on the last shutdown, if any.
+        
+        The file is consumed on reading so the state is restored once. The
+        restored position takes precedence over the checkpoints, which are at
+        most as recent. On a restart in place the state in memory is the one
+        stop() saved, so the file is only removed, and a later start cannot
+        restore it a second time.
+        
+        Batch ids are not restored: this start keeps its own epoch, and the
+        pending batch is sent again under a new id, since the markers of the
+        saved epoch may already cover ids this process has not used.
+        """
+        if not self.state_file:
+            return
+        if self._state_loaded:
+            await asyncio.to_thread(self.state_file.discard)
+            return
+        self._state_loaded = True
+        
+        state = await asyncio.to_thread(self.state_file.take)
+        if state is None:
+            return
+        
+        try:
+            position = int(state['position'])
+            acked_position = int(state['acked_position'])
+            buffer = list(state['buffer'])
+            pending_batch = state['pending_batch']
+            if pending_batch is not None:
+                _, size, pending_position = map(int, pending_batch)
+                pending_batch = (size, pending_position)
+            buffered_keys = {tuple(key) for key in state['buffered_keys']}
+            backpressure_mode = state['backpressure_mode']
+            if backpressure_mode not in BACKPRESSURE_MODES:
+                raise ValueError(f"unknown backpressure mode {backpressure_mode!r}")
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.error(f"Ignoring invalid state file: {e}")
+            return
+        
+        self._set_restored_position(acked_position)
+        self.current_position = position
+        self.log_buffer = buffer + self.log_buffer
+        if self.log_buffer:
+            self.flush_deadline.arm()
+        if pending_batch is not None:
+            self.batch_seq += 1
+            self._pending_batch = (self.batch_seq, *pending_batch)
+        self._buffered_keys = buffered_keys
+        self.backpressure_mode = backpressure_mode
+        if state.get('log_format'):
+            self.parser.resume(state['log_format'])
+        
+        try:
+            if self.heavy_hitters is not None and 'heavy_hitters' in state:
+                if not self.heavy_hitters.set_state(state['heavy_hitters']):
+                    self.logger.info("Heavy hitter state saved with another precision, starting afresh")
+            if self.email_dictionary is not None and 'email_dictionary' in state:
+                self.email_dictionary.set_state(state['email_dictionary'])
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Ignoring invalid aggregation state: {e}")
+        
+        self.logger.info(
+            f"Restored state from {self.config.state_file}: position {position}, "
+            f"{len(buffer)} buffered logs"
+        )
+    
+    def _create_memory_budget(self, limit: Optional[int]) -> None:
+        """
+        Start accounting memory against a budget.
+        
+        Args:
+            limit: Budget in bytes; None leaves accounting off
+        """
+        if not limit:
+            return
+        
+        self.memory = MemoryBudget(limit)
+        self.memory.register("buffer", lambda: estimate_entries_size(self.log_buffer))
+        # Dedup keys share their strings with the buffered entries
+        self.memory.register("dedup", lambda: len(self._buffered_keys) * 150)
+        self.memory.register("enrich_cache", lambda: self.enricher.memory_size() if self.enricher else 0)
+        if self.email_dictionary is not None:
+            self.memory.register("email_dictionary", self.email_dictionary.memory_size)
+        if self.heavy_hitters is not None:
+            self.memory.register("heavy_hitters", lambda: self.heavy_hitters.memory_size())
+        
+        if self.memory.baseline >= limit * MEMORY_THRESHOLDS[1]:
+            self.logger.warning(
+                f"Memory budget {format_bytes(limit)} leaves little room: the agent already "
+                f"uses {format_bytes(self.memory.baseline)}"
+            )
+    
+    async def _memory_monitor(self) -> None:
+        """
+        Re-evaluate the memory budget every MEMORY_CHECK_INTERVAL seconds.
+        
+        The monitor exits once a reload turns accounting off or replaces
+        the budget, whose own monitor takes over.
+        """
+        memory = self.memory
+        while self._running:
+            await asyncio.sleep(MEMORY_CHECK_INTERVAL)
+            if memory is None or self.memory is not memory:
+                return
+            self._check_memory()
+    
+    def _check_memory(self) -> None:
+        """
+        Apply the degradation steps of the current memory level.
+        
+        Steps are taken in order as memory runs short: raw lines are
+        dropped (from buffered entries too), the enrichment cache is
+        cleared, and finally the tail stops reading so the backlog stays
+        in the access log until the buffer drains.
+        
+        The email dictionary and heavy hitters are counted but not shrunk:
+        dropping email ids would make the node assign ids already
+        registered for other emails, and the heavy hitters are bounded by
+        HEAVY_HITTERS_TOP_K and reset every report window.
+        """
+        previous = MEMORY_LEVELS.index(self.memory.level)
+        level = self.memory.update()
+        current = MEMORY_LEVELS.index(level)
+        if current == previous:
+            return
+        
+        share = self.memory.used / self.memory.limit
+        if current > previous:
+            self.logger.warning(f"Memory at {share:.0%} of the budget, degrading to {level}")
+        else:
+            self.logger.info(f"Memory at {share:.0%} of the budget, back to {level}")
+        
+        def entered(step: str) -> bool:
+            return previous < MEMORY_LEVELS.index(step) <= current
+        
+        self._drop_raw_lines = self.memory.at_least(MEMORY_DROP_RAW_LINES)
+        self._spilling = self.memory.at_least(MEMORY_SPILL)
+        if entered(MEMORY_DROP_RAW_LINES):
+            for entry in self.log_buffer:
+                entry['raw_line'] = ""
+        if entered(MEMORY_SHRINK_CACHES) and self.enricher is not None:
+            self.enricher.clear_cache()
+    
+    def _create_redis_client(self, url: str) -> 'redis.Redis':
+        """
+        Create the client for a central Redis endpoint (or upstream relay).
+        
+        Args:
+            url: Endpoint URL
+            
+        Returns:
+            Client instance; no connection is made until the first command
+        """
+        if self.config.relay_url:
+            from .relay import RelayClient
+            return RelayClient.from_url(
+                url, timeout=self.config.redis_socket_timeout, secret=self.config.relay_secret
+            )
+        
+        return create_redis_client(
+            url,
+            connect_timeout=self.config.redis_connect_timeout,
+            socket_timeout=self.config.redis_socket_timeout,
+            max_connections=self.config.redis_max_connections
+        )
+    
+    async def _switch_endpoint(self, url: str, client: 'redis.Redis') -> None:
+        """
+        Replace the current client with one for another endpoint.
+        
+        Args:
+            url: Endpoint URL
+            client: Connected client for the endpoint
+        """
+        previous = self.redis_client
+        self.redis_client = client
+        self.endpoints.switch_to(url)
+        if self.email_dictionary is not None:
+            # The new endpoint may not have every mapping
+            self.email_dictionary.loaded = False
+        
+        if previous is not None and previous is not client:
+            try:
+                await previous.close()
+            except Exception:
+                pass
+    
+    async def _probe_endpoint(self, url: str) -> Optional['redis.Redis']:
+        """
+        Check an endpoint other than the current one.
+        
+        Args:
+            url: Endpoint URL
+            
+        Returns:
+            Connected client, or None if the endpoint is unreachable
+        """
+        client = self._create_redis_client(url)
+        try:
+            await client.ping()
+            self.endpoints.mark_healthy(url)
+            return client
+        except Exception as e:
+            self.endpoints.mark_failed(url)
+            self.logger.warning(f"Redis endpoint {redact_url(url)} is unreachable: {e}")
+            try:
+                await client.close()
+            except Exception:
+                pass
+            return None
+    
     async def _connect_redis(self) -> None:
-        """Connect to central Redis server with retry logic."""
+        """Connect to central Redis server (or upstream relay) with retry logic."""
+        last_error: Optional[Exception] = None
+        
         for attempt in range(self.config.max_retries):
-            try:
-                self.redis_client = redis.from_url(
-                    self.config.central_redis_url,
-                    encoding="utf-8",
-                    decode_responses=True,
-                    socket_keepalive=True,
-                    socket_keepalive_options={},
-                    health_check_interval=30
-                )
-                
-                # Test connection
-                await self.redis_client.ping()
-                self.logger.info("Connected to central Redis server")
-                return
-                
-            except Exception as e:
-                self.logger.error(f"Redis connection attempt {attempt + 1} failed: {e}")
-                if attempt < self.config.max_retries - 1:
-                    await asyncio.sleep(self.config.retry_delay * (2 ** attempt))
-                else:
-                    raise
+            for url in self.endpoints.candidates():
+                try:
+                    if self.redis_client is None or url != self.endpoints.current:
+                        await self._switch_endpoint(url, self._create_redis_client(url))
+                    
+                    # Test connection
+                    await self.redis_client.ping()
+                    self.endpoints.mark_healthy(url)
+                    if self.config.relay_url:
+                        self.logger.info(f"Connected to relay {url}")
+                    else:
+                        self.logger.info(f"Connected to central Redis server {redact_url(url)}")
+                    return
+                    
+                except Exception as e:
+                    last_error = e
+                    self.endpoints.mark_failed(url)
+                    self.logger.error(f"Redis connection attempt {attempt + 1} failed: {e}")
+            
+            if attempt < self.config.max_retries - 1:
+                await asyncio.sleep(jittered_backoff(attempt, self.config.retry_delay))
+        
+        if last_error is not None:
+            raise last_error
+    
+    async def _failover(self) -> bool:
+        """
+        Switch to the next reachable endpoint after the current one failed.
+        
+        Returns:
+            True if the forwarder switched to another endpoint
+        """
+        current = self.endpoints.current
+        if current is not None:
+            self.endpoints.mark_failed(current)
+        
+        for url in self.endpoints.candidates(exclude=current):
+            client = await self._probe_endpoint(url)
+            if client is not None:
+                await self._switch_endpoint(url, client)
+                self.circuit_breaker.record_success()
+                self.logger.warning(f"Failed over to Redis endpoint {redact_url(url)}")
+                return True
+        
+        return False
+    
+    async def _endpoint_monitor(self) -> None:
+        """Periodically fail back to a more preferred endpoint once it is healthy again."""
+        while self._running:
+            await asyncio.sleep(self.config.failover_check_interval)
+            
+            current = self.endpoints.current
+            if current is None or current == self.endpoints.preferred:
+                continue
+            
+            for url in self.endpoints.urls[:self.endpoints.urls.index(current)]:
+                client = await self._probe_endpoint(url)
+                if client is not None:
+                    await self._switch_endpoint(url, client)
+                    self.logger.info(f"Failed back to Redis endpoint {redact_url(url)}")
+                    break
+    
+    async def _resume_tail(self) -> None:
+        """Tail the log, first restoring the position from Redis if there is no local one."""
+        if not self._position_restored:
+            # Without a local checkpoint the saved position is in Redis
+            if self._connect_task is not None:
+                await self._connect_task
+            await self._restore_remote_position()
+        
+        await self._tail_logs()
     
     async def _tail_logs(self) -> None:
         """Monitor access.log file in real-time."""
@@ -142,28 +630,50 @@ class LogForwarder:
                     continue
                 
                 # Open file and seek to saved position
-                async with aiofiles.open(self.config.access_log_path, 'r') as f:
+                async with aiofiles.open(self.config.access_log_path, 'rb') as f:
                     await f.seek(self.current_position)
+                    partial = b""
                     
                     while self._running:
-                        line = await f.readline()
+                        if self._spilling and self.log_buffer:
+                            # Over the memory budget: leave the backlog on disk
+                            # in the log until the buffer drains
+                            await asyncio.sleep(0.1)
+                            continue
+                        
+                        # Read in chunks: one executor round trip per chunk, not per line
+                        chunk = await f.read(TAIL_READ_SIZE)
+                        # A short read means the tail has reached the end of the file
+                        self._tail_caught_up = len(chunk) < TAIL_READ_SIZE
                         
-                        if not line:
+                        if not chunk:
                             # No new data, wait a bit
                             await asyncio.sleep(0.1)
                             continue
                         
-                        # Update position
-                        self.current_position = await f.tell()
+                        # A trailing partial line waits until the writer finishes it
+                        lines = (partial + chunk).split(b"\n")
+                        partial = lines.pop()
+                        if lines and self.time_to_first_line is None:
+                            self.time_to_first_line = time.monotonic() - self._start_time
                         
-                        # Process the log line
-                        await self._process_log_line(line.strip())
+                        for line in lines:
+                            # Update position
+                            self.current_position += len(line) + 1
+                            self.lines_read += 1
+                            
+                            # Process the log line
+                            await self._process_log_line(line.decode("utf-8", "replace").strip())
+                        
+                        # Filtered lines still move the position to be acknowledged
+                        if self.current_position != self.acked_position:
+                            self.flush_deadline.arm()
                         
             except FileNotFoundError:
                 self.logger.warning(f"Log file {self.config.access_log_path} disappeared, waiting...")
                 await asyncio.sleep(5)
             except Exception as e:
-                self.logger.error(f"Error reading log file: {e}")
+                self.rate_limited_logger.error("tail", "Error reading log file: %s", e)
                 await asyncio.sleep(5)
     
     async def _process_log_line(self, line: str) -> None:
@@ -177,86 +687,598 @@ class LogForwarder:
             return
         
         # Parse log line
-        log_entry = create_log_entry(line, self.config.node_id, self.config.node_name)
+        log_entry = self.parser.parse(line, self.config.node_id, self.config.node_name, self.log_filter)
         
         if log_entry:
+            if self.enricher is not None:
+                self.enricher.enrich(log_entry)
+            if self.heavy_hitters is not None:
+                self.heavy_hitters.add(log_entry['email'], log_entry['client_ip'])
+            
+            if self.backpressure_mode != BACKPRESSURE_NORMAL or self._drop_raw_lines:
+                # Central consumer is behind or memory is short: keep the
+                # schema but drop the bulk
+                log_entry['raw_line'] = ""
+                
+                if self.backpressure_mode == BACKPRESSURE_CRITICAL:
+                    key = (log_entry['email'], log_entry['client_ip'])
+                    if key in self._buffered_keys:
+                        self.entries_deduplicated += 1
+                        return
+                    self._buffered_keys.add(key)
+            
+            if not self.log_buffer:
+                self.flush_deadline.arm()
             self.log_buffer.append(log_entry)
-            self.logger.debug(f"Buffered log entry: {log_entry['email']} from {log_entry['client_ip']}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Buffered log entry: %s from %s", log_entry['email'], log_entry['client_ip'])
             
             # Check if we should flush
-            if len(self.log_buffer) >= self.config.batch_size:
+            if len(self.log_buffer) >= self._effective_batch_size():
                 await self._flush_batch()
     
+    async def _detect_format(self) -> None:
+        """Detect the log format from the start of the access log."""
+        try:
+            await asyncio.to_thread(self.parser.detect_file, self.config.access_log_path)
+        except OSError as e:
+            self.logger.debug("Log format detection deferred: %s", e)
+        if self.parser.detecting:
+            self.logger.info("Log format will be detected from the first new lines")
+    
     async def _flush_batch(self) -> None:
         """Flush batched logs to Redis."""
+        async with self._flush_lock:
+            await self._flush_batch_locked()
+    
+    async def _flush_batch_locked(self) -> None:
+        """Flush batched logs to Redis; the caller holds the flush lock."""
         if not self.log_buffer:
             return
         
-        batch = self.log_buffer.copy()
-        self.log_buffer.clear()
+        if not self._connection_ready():
+            # Keep buffering until the first connection is made
+            return
         
-        for attempt in range(self.config.max_retries):
-            try:
-                # Serialize logs
-                serialized_logs = [json.dumps(log_entry) for log_entry in batch]
-                
-                # Send to Redis queue
-                if serialized_logs:
-                    await self.redis_client.lpush(self.queue_key, *serialized_logs)
-                    self.logger.info(f"Sent {len(serialized_logs)} log entries to Redis")
-                
-                # Save position after successful send
-                await self._save_position()
-                self.last_flush_time = asyncio.get_event_loop().time()
-                return
+        if self._pending_batch is not None:
+            # Retry a failed batch under its original id, so a push that did
+            # reach Redis before the failure is not delivered twice
+            seq, size, position = self._pending_batch
+            batch = self.log_buffer[:size]
+            del self.log_buffer[:size]
+        else:
+            self.batch_seq += 1
+            seq = self.batch_seq
+            batch = self.log_buffer.copy()
+            self.log_buffer.clear()
+            # Every line read so far is either in this batch or filtered out
+            position = self.current_position
+        self._buffered_keys.clear()
+        if not self.log_buffer:
+            self.flush_deadline.cancel()
+        
+        delivered = False
+        try:
+            for attempt in range(self.config.max_retries):
+                if not self.circuit_breaker.allow_request():
+                    self.logger.debug("Circuit open, keeping logs buffered")
+                    break
                 
-            except Exception as e:
-                self.logger.error(f"Failed to send logs (attempt {attempt + 1}): {e}")
-                if attempt < self.config.max_retries - 1:
-                    await asyncio.sleep(self.config.retry_delay * (2 ** attempt))
-                else:
-                    # Put logs back in buffer for retry
-                    self.log_buffer = batch + self.log_buffer
-                    self.logger.error(f"Failed to send {len(batch)} logs after {self.config.max_retries} attempts")
+                try:
+                    # Serialize logs
+                    register = None
+                    if self.email_dictionary is not None:
+                        serialized_logs = await self._serialize_encoded(batch)
+                        if self.email_dictionary.pending:
+                            register = (self.email_dictionary_key, dict(self.email_dictionary.pending))
+                    else:
+                        serialized_logs = list(map(self.serializer.dumps, batch))
+                    
+                    # Reserve once per batch: retries, here or in a later flush
+                    # of the pending batch, resend bytes already accounted for
+                    if self.governor.enabled and self._governed_batch != (self.batch_epoch, seq):
+                        self._governed_batch = (self.batch_epoch, seq)
+                        await self._govern(serialized_logs)
+                    
+                    # Deliver to the sink, sampling the queue depth in the same round trip
+                    if serialized_logs and self._use_idempotent_push():
+                        pushed, depth = await self._push_idempotent(seq, serialized_logs, position, register)
+                        if self._should_sample_queue_depth():
+                            self._update_backpressure(depth)
+                        if pushed:
+                            self._record_sent(serialized_logs)
+                        else:
+                            self.duplicate_batches += 1
+                            self.logger.warning("Batch %d:%d was already delivered, skipped", self.batch_epoch, seq)
+                    elif serialized_logs:
+                        depth = await self.sink.push(serialized_logs, self._should_sample_queue_depth(), register)
+                        if depth is not None:
+                            self._update_backpressure(depth)
+                        self._record_sent(serialized_logs)
+                    
+                    delivered = True
+                    self.circuit_breaker.record_success()
+                    self._pending_batch = None
+                    if register:
+                        self.email_dictionary.registered(register[1])
+                    self.acked_position = position
+                    if self.time_to_first_ack is None:
+                        self.time_to_first_ack = time.monotonic() - self._start_time
+                        self.logger.info("First batch delivered %.2fs after start", self.time_to_first_ack)
+                    
+                    # Checkpoint after successful send; without a local file the
+                    # idempotent push has already saved the position atomically
+                    if self._use_idempotent_push() and not self.checkpoint_file:
+                        self.checkpoint_position = position
+                    else:
+                        await self._maybe_checkpoint()
+                    return
+                    
+                except Exception as e:
+                    self.circuit_breaker.record_failure()
+                    self.rate_limited_logger.error("send", "Failed to send logs (attempt %d): %s", attempt + 1, e)
+                    
+                    # Try the other endpoints once the current one is written off
+                    if (self.circuit_breaker.state == CIRCUIT_OPEN and self.sink.uses_redis
+                            and len(self.endpoints.urls) > 1):
+                        if await self._failover():
+                            continue
+                    
+                    if attempt < self.config.max_retries - 1:
+                        await asyncio.sleep(jittered_backoff(attempt, self.config.retry_delay))
+        except asyncio.CancelledError:
+            # Cancelled by a bounded shutdown: keep the batch unless it went out
+            if not delivered:
+                self.log_buffer[:0] = batch
+                self._pending_batch = (seq, len(batch), position)
+                self.flush_deadline.arm()
+                # Neither outcome of a half-open trial will be recorded
+                self.circuit_breaker.cancel_trial()
+            raise
+        
+        # Put logs back in buffer for retry, in place rather than into a new list
+        self.log_buffer[:0] = batch
+        self._pending_batch = (seq, len(batch), position)
+        self.flush_deadline.arm()
+        self.rate_limited_logger.error("send_batch", "Failed to send %d logs, keeping them buffered", len(batch))
+    
+    async def _govern(self, serialized_logs: List[str]) -> None:
+        """
+        Wait until the delivery rate caps allow sending a batch.
+        
+        Backfill waits for tokens; live-tail batches are sent at once but
+        still draw from the buckets, so backfill only gets what live traffic
+        leaves. The flush lock is held while waiting, which also stops the
+        tail from reading further ahead.
+        
+        Args:
+            serialized_logs: Serialized batch about to be sent
+        """
+        live = self._tail_caught_up and len(serialized_logs) <= self._effective_batch_size()
+        delay = self.governor.reserve(sum(map(len, serialized_logs)), live)
+        if delay:
+            self.logger.debug("Delivery throttled for %.2fs", delay)
+            await asyncio.sleep(delay)
+    
+    async def _serialize_encoded(self, batch: List[Dict[str, Any]]) -> List[str]:
+        """
+        Serialize a batch with emails replaced by dictionary ids.
+        
+        The mappings already registered are loaded first if needed. Buffered
+        entries keep their email, so a retried batch is encoded again.
+        
+        Args:
+            batch: Log entries to serialize
+        
+        Returns:
+            Serialized entries with email_id instead of email
+        """
+        dictionary = self.email_dictionary
+        if not dictionary.loaded:
+            conflicts = dictionary.load(await self.redis_client.hgetall(self.email_dictionary_key))
+            if conflicts:
+                self.logger.warning(
+                    "%d email ids were registered for other emails, is NODE_ID %s used twice?",
+                    conflicts, self.config.node_id
+                )
+            self.logger.debug("Loaded %d email ids", len(dictionary))
+        
+        return dictionary.encode_entries(batch, self.serializer.dumps)
+    
+    def _record_sent(self, serialized_logs: List[str]) -> None:
+        """Count a delivered batch for stats and the periodic summary."""
+        self.batches_sent += 1
+        self.entries_sent += len(serialized_logs)
+        self.bytes_sent += sum(map(len, serialized_logs))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Sent %d log entries to %s sink", len(serialized_logs), self.sink.name)
+    
+    def _use_idempotent_push(self) -> bool:
+        """Check whether batches are pushed through the dedup script."""
+        # Config rejects IDEMPOTENT_DELIVERY with RELAY_URL: relays have no
+        # scripting and do not deduplicate agent batches. A relay itself
+        # (RELAY_LISTEN) pushes upstream through the script
+        return (self.config.idempotent_delivery and self.config.sink == SINK_REDIS
+                and not self.config.relay_url)
+    
+    async def _push_idempotent(
+        self,
+        seq: int,
+        serialized_logs: List[str],
+        position: int,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Tuple[int, int]:
+        """
+        Push a batch atomically with its dedup marker and the file position.
+        
+        Args:
+            seq: Batch sequence number within the current epoch
+            serialized_logs: Serialized log entries
+            position: File position just past the batch's last line
+            register: Email dictionary key and new id -> email mappings
+            
+        Returns:
+            Tuple of (1 if pushed, 0 if a duplicate) and the queue length
+        """
+        if self._push_script_client is not self.redis_client:
+            self._push_script = self.redis_client.register_script(PUSH_BATCH_SCRIPT)
+            self._push_script_client = self.redis_client
+        
+        batch_key = ConfigService.get_redis_batch_key(
+            self.config.node_id, self.batch_epoch, seq, self._hash_tag
+        )
+        mappings = register[1] if register else {}
+        pairs = [item for mapping in mappings.items() for item in mapping]
+        pushed, depth = await self._push_script(
+            keys=[batch_key, self.queue_key, self.position_key, self.email_dictionary_key],
+            args=[self.config.dedup_ttl, position, len(mappings), *pairs, *serialized_logs]
+        )
+        return int(pushed), int(depth)
+    
+    def _effective_batch_size(self) -> int:
+        """Get the batch size for the current backpressure mode."""
+        if self.backpressure_mode == BACKPRESSURE_NORMAL:
+            return self.config.batch_size
+        return self.config.batch_size * self.config.backpressure_batch_multiplier
+    
+    def _should_sample_queue_depth(self) -> bool:
+        """Check whether the central queue depth should be sampled on this flush."""
+        if not (self.config.backpressure_degraded_depth or self.config.backpressure_critical_depth):
+            return False
+        
+        # Only Redis sinks have a central queue
+        if not self.sink.uses_redis:
+            return False
+        
+        # Agents behind a relay leave sampling to the relay
+        if self.config.relay_url:
+            return False
+        
+        now = asyncio.get_event_loop().time()
+        if now - self._last_depth_sample < self.config.backpressure_check_interval:
+            return False
+        
+        self._last_depth_sample = now
+        return True
+    
+    def _update_backpressure(self, depth: int) -> None:
+        """
+        Switch the backpressure mode based on the central queue depth.
+        
+        Args:
+            depth: Current length of the central queue
+        """
+        self.central_queue_depth = depth
+        current = self.backpressure_mode
+        
+        # Enter a mode at its threshold, but only leave it once the queue
+        # has drained to half the threshold, so the mode does not flap
+        entered = self._backpressure_level(depth, 1)
+        held = self._backpressure_level(depth, 2)
+        level = max(entered, min(BACKPRESSURE_MODES.index(current), held))
+        mode = BACKPRESSURE_MODES[level]
+        
+        if mode == current:
+            return
+        
+        self.backpressure_mode = mode
+        if BACKPRESSURE_MODES.index(mode) > BACKPRESSURE_MODES.index(current):
+            self.logger.warning(f"Central queue depth {depth}, switching to {mode} mode")
+        else:
+            self.logger.info(f"Central queue depth {depth}, switching to {mode} mode")
+    
+    def _backpressure_level(self, depth: int, divisor: int) -> int:
+        """Get the mode index whose (scaled) threshold the depth reaches."""
+        critical = self.config.backpressure_critical_depth
+        degraded = self.config.backpressure_degraded_depth
+        if critical and depth >= critical // divisor:
+            return BACKPRESSURE_MODES.index(BACKPRESSURE_CRITICAL)
+        if degraded and depth >= degraded // divisor:
+            return BACKPRESSURE_MODES.index(BACKPRESSURE_DEGRADED)
+        return BACKPRESSURE_MODES.index(BACKPRESSURE_NORMAL)
     
     async def _flush_scheduler(self) -> None:
-        """Periodically flush logs based on time interval."""
+        """
+        Flush the buffer when the deadline set by its oldest entry passes.
+        
+        An entry waits at most flush_interval after entering an empty
+        buffer. With nothing buffered and no position left to record, the
+        scheduler sleeps until the next entry arrives.
+        """
         while self._running:
-            await asyncio.sleep(self.config.flush_interval)
-            
-            current_time = asyncio.get_event_loop().time()
-            time_since_flush = current_time - self.last_flush_time
+            await self.flush_deadline.wait()
             
-            if self.log_buffer and time_since_flush >= self.config.flush_interval:
+            if self.log_buffer:
                 await self._flush_batch()
+            
+            # With nothing buffered or in flight, every line read is handled
+            if not self.log_buffer and not self._flush_lock.locked():
+                self.acked_position = self.current_position
+            await self._maybe_checkpoint()
+            
+            # Come back for what is still buffered or not yet checkpointed
+            if self.log_buffer or self._position_unrecorded():
+                self.flush_deadline.arm()
+    
+    def _position_unrecorded(self) -> bool:
+        """Whether a position read is not yet acknowledged, or not yet checkpointed somewhere."""
+        if self.acked_position != self.current_position:
+            return True
+        has_destination = self.checkpoint_file is not None or self.redis_client is not None
+        return has_destination and self.checkpoint_position != self.acked_position
+    
+    async def _summary_reporter(self) -> None:
+        """Periodically log a one-line throughput summary."""
+        while self._running and self.config.stats_log_interval:
+            await asyncio.sleep(self.config.stats_log_interval)
+            if self.config.stats_log_interval:
+                self.logger.info(self._format_summary())
+    
+    def _format_summary(self) -> str:
+        """
+        Build the periodic summary line and start a new reporting period.
+        
+        Returns:
+            Summary of throughput since the previous summary
+        """
+        counters = (self.lines_read, self.batches_sent, self.entries_sent, self.bytes_sent)
+        lines, batches, entries, sent = (
+            now - before for now, before in zip(counters, self._summary_snapshot)
+        )
+        self._summary_snapshot = counters
+        
+        try:
+            lag = max(0, os.path.getsize(self.config.access_log_path) - self.current_position)
+        except OSError:
+            lag = 0
+        
+        summary = (
+            f"Summary: {lines / self.config.stats_log_interval:.1f} lines/s, "
+            f"{batches} batches, {entries} entries, {format_bytes(sent)} sent, "
+            f"lag {format_bytes(lag)}, buffer {len(self.log_buffer)}, "
+            f"mode {self.backpressure_mode}, circuit {self.circuit_breaker.state}"
+        )
+        if self.log_filter:
+            summary += (
+                f", filtered {self.log_filter.lines_dropped} total "
+                f"({self.log_filter.filter_time * 1000:.1f} ms)"
+            )
+        if self.enricher is not None:
+            hit_rate = self.enricher.get_stats()['enrich_cache_hit_rate']
+            if hit_rate is not None:
+                summary += f", enrich cache hits {hit_rate:.1%}"
+        return summary
+    
+    async def _heavy_hitters_reporter(self) -> None:
+        """Close a heavy-hitters window every HEAVY_HITTERS_INTERVAL and publish it."""
+        while self._running:
+            await asyncio.sleep(self.config.heavy_hitters_interval)
+            self.heavy_hitters_report = self.heavy_hitters.snapshot()
+            self.heavy_hitters.reset()
+            await self._publish_heavy_hitters(self.heavy_hitters_report)
+    
+    async def _publish_heavy_hitters(self, report: Dict[str, Any]) -> bool:
+        """
+        Replace the node's heavy hitters hash in Redis with a window report.
+        
+        The hash has one field per top user holding {"connections", "error",
+        "distinct_ips"} as JSON, plus a "_window" field with the window
+        bounds and line count. It expires after three missed windows.
+        
+        Args:
+            report: Snapshot of a completed window
+            
+        Returns:
+            True if the report was published
+        """
+        if (not self.sink.uses_redis or self.config.relay_url or self.redis_client is None
+                or self.circuit_breaker.state == CIRCUIT_OPEN):
+            return False
+        
+        mapping = {
+            '_window': json.dumps({
+                'start': report['window_start'],
+                'end': report['window_end'],
+                'lines': report['lines']
+            })
+        }
+        for user in report['users']:
+            mapping[user['email']] = json.dumps({
+                'connections': user['connections'],
+                'error': user['error'],
+                'distinct_ips': user['distinct_ips']
+            })
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(self.heavy_hitters_key)
+            pipe.hset(self.heavy_hitters_key, mapping=mapping)
+            pipe.expire(self.heavy_hitters_key, int(self.config.heavy_hitters_interval * 3) + 1)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            self.rate_limited_logger.warning("heavy_hitters", "Failed to publish heavy hitters: %s", e)
+            return False
+    
+    def apply_config(self, config: NodeConfig) -> None:
+        """
+        Apply a reloaded configuration to the running forwarder.
+        
+        Only settings in RELOADABLE_SETTINGS may differ from the current
+        configuration. The buffer, cursor and connection are kept.
+        
+        Args:
+            config: Validated new configuration
+            
+        Raises:
+            OSError: If the new IP filter file or enrichment database cannot be read
+            ValueError: If the new IP filter file or enrichment database is malformed
+        """
+        # Build everything that can fail before changing any state
+        log_filter = LogFilter.from_config(config)
+        enricher = self.enricher
+        if (config.enrich_databases, config.enrich_cache_size) != (
+                self.config.enrich_databases, self.config.enrich_cache_size):
+            enricher = IPEnricher.from_config(config)
+        
+        previous = self.config
+        previous_enricher = self.enricher
+        self.config = config
+        self.log_filter = log_filter
+        self.enricher = enricher
+        if previous_enricher is not None and previous_enricher is not enricher:
+            previous_enricher.close()
+        self.circuit_breaker.failure_threshold = config.circuit_breaker_threshold
+        self.circuit_breaker.reset_timeout = config.circuit_breaker_reset
+        self.endpoints.cooldown = config.failover_check_interval
+        self.flush_deadline.delay = config.flush_interval
+        self.governor.configure(
+            config.governor_bytes_per_second, config.governor_batches_per_second, config.governor_burst
+        )
+        if config.memory_budget != previous.memory_budget:
+            limit = config.memory_budget or read_cgroup_limit()
+            if not limit:
+                # No budget left to account against: undo the degradation
+                # and let the monitor exit
+                self.memory = None
+                self._drop_raw_lines = False
+                self._spilling = False
+            elif self.memory is not None:
+                self.memory.limit = limit
+            else:
+                self._create_memory_budget(limit)
+                if self._running:
+                    self._tasks.append(asyncio.create_task(self._memory_monitor()))
+        
+        # The summary task exits when disabled, so restart it when re-enabled
+        if self._running and config.stats_log_interval and not previous.stats_log_interval:
+            self._tasks.append(asyncio.create_task(self._summary_reporter()))
+    
+    def _connection_ready(self) -> bool:
+        """Whether the connection made at startup, if any, has succeeded."""
+        task = self._connect_task
+        return task is None or (task.done() and not task.cancelled() and task.exception() is None)
     
     async def _restore_position(self) -> None:
-        """Restore file position from Redis."""
+        """Restore file position from the local checkpoint file or Redis."""
+        await self._restore_local_position()
+        if not self._position_restored:
+            await self._restore_remote_position()
+    
+    async def _restore_local_position(self) -> None:
+        """Restore file position from the local checkpoint file, if there is one."""
+        if self._position_restored or not self.checkpoint_file:
+            return
+        
+        position = await asyncio.to_thread(self.checkpoint_file.load)
+        if position is not None:
+            self._set_restored_position(position)
+            self.logger.info(f"Restored file position from checkpoint file: {position}")
+    
+    async def _restore_remote_position(self) -> None:
+        """Restore file position from Redis, or start from the end of the file."""
         try:
+            position_str = None
             if self.redis_client:
                 position_str = await self.redis_client.get(self.position_key)
-                if position_str:
-                    self.current_position = int(position_str)
-                    self.logger.info(f"Restored file position: {self.current_position}")
-                else:
-                    self.logger.info("No saved position found, starting from end of file")
-                    # Start from end of file if no position saved
-                    if os.path.exists(self.config.access_log_path):
-                        with open(self.config.access_log_path, 'r') as f:
-                            f.seek(0, 2)  # Seek to end
-                            self.current_position = f.tell()
+            if position_str:
+                self._set_restored_position(int(position_str))
+                self.logger.info(f"Restored file position: {self.current_position}")
+            else:
+                self.logger.info("No saved position found, starting from end of file")
+                # Start from end of file if no position saved
+                position = 0
+                if os.path.exists(self.config.access_log_path):
+                    with open(self.config.access_log_path, 'r') as f:
+                        f.seek(0, 2)  # Seek to end
+                        position = f.tell()
+                self._set_restored_position(position)
         except Exception as e:
             self.logger.error(f"Failed to restore position: {e}")
             self.current_position = 0
     
-    async def _save_position(self) -> None:
-        """Save current file position to Redis."""
+    def _set_restored_position(self, position: int) -> None:
+        """Start reading, and count as acknowledged, from a restored position."""
+        self.current_position = position
+        self.acked_position = position
+        self.checkpoint_position = position
+        self._position_restored = True
+    
+    async def _maybe_checkpoint(self, force: bool = False) -> None:
+        """
+        Write a checkpoint of the acknowledged position if one is due.
+        
+        Checkpoints are written at most every CHECKPOINT_INTERVAL seconds,
+        or sooner once CHECKPOINT_BYTES more have been acknowledged. With a
+        local checkpoint file, Redis is only a periodic mirror of it.
+        
+        Args:
+            force: Write regardless of the interval (used on shutdown)
+        """
+        position = self.acked_position
+        now = asyncio.get_event_loop().time()
+        if not force:
+            if position == self.checkpoint_position:
+                return
+            if (self.checkpoint_position is not None
+                    and abs(position - self.checkpoint_position) < self.config.checkpoint_bytes
+                    and now - self._last_checkpoint_time < self.config.checkpoint_interval):
+                return
+        
+        self._last_checkpoint_time = now
+        
+        if self.checkpoint_file:
+            try:
+                await asyncio.to_thread(self.checkpoint_file.save, position)
+                self.checkpoint_position = position
+            except Exception as e:
+                self.logger.error(f"Failed to write checkpoint file: {e}")
+            
+            if not force and now - self._last_mirror_time < self.config.checkpoint_mirror_interval:
+                return
+            self._last_mirror_time = now
+        
+        if await self._save_position():
+            self.checkpoint_position = position
+    
+    async def _save_position(self) -> bool:
+        """
+        Save the acknowledged file position to Redis.
+        
+        Returns:
+            True if the position was saved
+        """
+        if self.circuit_breaker.state == CIRCUIT_OPEN:
+            return False
+        
         try:
             if self.redis_client:
-                await self.redis_client.set(self.position_key, str(self.current_position))
-                self.logger.debug(f"Saved position: {self.current_position}")
+                await self.redis_client.set(self.position_key, str(self.acked_position))
+                self.logger.debug("Saved position: %d", self.acked_position)
+                return True
         except Exception as e:
-            self.logger.error(f"Failed to save position: {e}")
+            self.rate_limited_logger.error("save_position", "Failed to save position: %s", e)
+        return False
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -265,11 +1287,49 @@ class LogForwarder:
         Returns:
             Dictionary with current stats
         """
-        return {
+        stats = {
             'running': self._running,
             'buffer_size': len(self.log_buffer),
             'current_position': self.current_position,
+            'lines_read': self.lines_read,
+            'batches_sent': self.batches_sent,
+            'entries_sent': self.entries_sent,
+            'bytes_sent': self.bytes_sent,
+            'acked_position': self.acked_position,
+            'checkpoint_position': self.checkpoint_position,
+            'flush_deadline': self.flush_deadline.deadline,
+            'flush_timer_wakeups': self.flush_deadline.wakeups,
+            'sink': self.sink.name,
+            'serializer': self.serializer.name,
             'redis_connected': self.redis_client is not None,
+            'redis_endpoint': redact_url(self.endpoints.current) if self.endpoints.current else None,
+            'redis_failovers': self.endpoints.failovers,
+            'batch_epoch': self.batch_epoch,
+            'batch_seq': self.batch_seq,
+            'duplicate_batches': self.duplicate_batches,
+            'circuit_state': self.circuit_breaker.state,
+            'circuit_opened': self.circuit_breaker.times_opened,
+            'backpressure_mode': self.backpressure_mode,
+            'central_queue_depth': self.central_queue_depth,
+            'entries_deduplicated': self.entries_deduplicated,
+            'time_to_first_line': self.time_to_first_line,
+            'time_to_first_ack': self.time_to_first_ack,
             'node_id': self.config.node_id,
             'node_name': self.config.node_name
         }
+        stats.update(self.parser.get_stats())
+        if self.governor.enabled:
+            stats.update(self.governor.get_stats())
+        if self.email_dictionary is not None:
+            stats['email_dictionary_size'] = len(self.email_dictionary)
+            stats['email_dictionary_pending'] = len(self.email_dictionary.pending)
+            stats['email_dictionary_conflicts'] = self.email_dictionary.conflicts
+        if self.log_filter:
+            stats.update(self.log_filter.get_stats())
+        if self.enricher is not None:
+            stats.update(self.enricher.get_stats())
+        if self.memory is not None:
+            stats.update(self.memory.get_stats())
+        if self.heavy_hitters is not None:
+            stats['heavy_hitters'] = self.heavy_hitters_report
+        return stats
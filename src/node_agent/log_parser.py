@@ -5,12 +5,306 @@ This module provides functionality to parse Marzban access log entries
 and extract relevant information for forwarding to the central server.
 """
 
+import ipaddress
 import re
 import time
-from typing import Optional, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional
 from datetime import datetime
 
 
+FILTER_ALLOW = "allow"
+FILTER_DENY = "deny"
+
+
+class IPPrefixTrie:
+    """
+    Binary radix trie for longest-prefix-match lookups of IP addresses.
+    
+    IPv4 and IPv6 prefixes are kept in separate tries. Each prefix stores
+    a value, and a lookup returns the value of the most specific prefix
+    containing the address.
+    """
+    
+    def __init__(self):
+        """Initialize an empty trie."""
+        # Node layout: [child for bit 0, child for bit 1, value]
+        self._roots: Dict[int, List[Any]] = {4: [None, None, None], 6: [None, None, None]}
+        self.size = 0
+    
+    def insert(self, cidr: str, value: Any) -> None:
+        """
+        Insert a prefix.
+        
+        Args:
+            cidr: Network in CIDR notation (a bare address is a host prefix)
+            value: Value returned for addresses within the prefix
+        
+        Raises:
+            ValueError: If the network is malformed
+        """
+        network = ipaddress.ip_network(cidr.strip(), strict=False)
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        
+        node = self._roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        
+        if node[2] is None:
+            self.size += 1
+        node[2] = value
+    
+    def lookup(self, ip: str) -> Optional[Any]:
+        """
+        Find the value of the longest prefix containing an address.
+        
+        Args:
+            ip: IPv4 or IPv6 address
+        
+        Returns:
+            Value of the most specific matching prefix, or None
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        bits = int(address)
+        width = address.max_prefixlen
+        
+        node = self._roots[address.version]
+        found = node[2]
+        for i in range(width):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                found = node[2]
+        return found
+    
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "IPPrefixTrie":
+        """
+        Build a trie from allow/deny rules.
+        
+        Each line is "[allow|deny] <cidr>"; a bare CIDR is a deny rule.
+        Blank lines and # comments are ignored.
+        
+        Args:
+            lines: Rule lines
+        
+        Returns:
+            Trie mapping prefixes to FILTER_ALLOW or FILTER_DENY
+        
+        Raises:
+            ValueError: If a rule is malformed
+        """
+        trie = cls()
+        for number, line in enumerate(lines, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            
+            parts = line.split()
+            if len(parts) == 1:
+                action, cidr = FILTER_DENY, parts[0]
+            elif len(parts) == 2 and parts[0].lower() in (FILTER_ALLOW, FILTER_DENY):
+                action, cidr = parts[0].lower(), parts[1]
+            else:
+                raise ValueError(f"Invalid IP filter rule on line {number}: {line}")
+            
+            try:
+                trie.insert(cidr, action)
+            except ValueError:
+                raise ValueError(f"Invalid network on line {number}: {cidr}")
+        return trie
+    
+    @classmethod
+    def from_file(cls, path: str) -> "IPPrefixTrie":
+        """
+        Load allow/deny rules from a CIDR file.
+        
+        Args:
+            path: Path to the rule file
+        
+        Returns:
+            Trie mapping prefixes to FILTER_ALLOW or FILTER_DENY
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_lines(f)
+
+
+class LogFilter:
+    """
+    Filter stage dropping unwanted connections before they are forwarded.
+    
+    The inbound tag rules run on the raw line before any parsing. Email
+    and IP rules run on the extracted fields, before the timestamp is
+    parsed and the log entry is built.
+    """
+    
+    # Inbound tag in the routing part: [TAG >> OUTBOUND] or [TAG -> OUTBOUND]
+    INBOUND_PATTERN = re.compile(r'\[([^\]]+?)\s+(?:>>|->)\s')
+    
+    def __init__(
+        self,
+        include_inbounds: Iterable[str] = (),
+        exclude_inbounds: Iterable[str] = (),
+        include_email: str = "",
+        exclude_email: str = "",
+        ip_rules: Optional[IPPrefixTrie] = None
+    ):
+        """
+        Initialize the filter.
+        
+        Args:
+            include_inbounds: Only forward these inbound tags (empty allows all)
+            exclude_inbounds: Never forward these inbound tags
+            include_email: Only forward emails matching this regex
+            exclude_email: Never forward emails matching this regex
+            ip_rules: Longest-prefix-match allow/deny rules for client IPs
+        """
+        self.include_inbounds = frozenset(include_inbounds)
+        self.exclude_inbounds = frozenset(exclude_inbounds)
+        self.include_email = re.compile(include_email) if include_email else None
+        self.exclude_email = re.compile(exclude_email) if exclude_email else None
+        self.ip_rules = ip_rules if ip_rules is not None and ip_rules.size else None
+        self._check_inbound = bool(self.include_inbounds or self.exclude_inbounds)
+        
+        self.lines_checked = 0
+        self.dropped_inbound = 0
+        self.dropped_email = 0
+        self.dropped_ip = 0
+        self.filter_time = 0.0
+    
+    @classmethod
+    def from_config(cls, config: Any) -> Optional["LogFilter"]:
+        """
+        Create a filter from node configuration.
+        
+        Args:
+            config: Node configuration
+        
+        Returns:
+            Filter, or None when no filter rules are configured
+        """
+        ip_rules = IPPrefixTrie.from_file(config.filter_ip_file) if config.filter_ip_file else None
+        log_filter = cls(
+            include_inbounds=config.filter_include_inbounds,
+            exclude_inbounds=config.filter_exclude_inbounds,
+            include_email=config.filter_include_email,
+            exclude_email=config.filter_exclude_email,
+            ip_rules=ip_rules
+        )
+        return log_filter if log_filter.enabled else None
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any filter rule is configured."""
+        return bool(self._check_inbound or self.include_email or self.exclude_email or self.ip_rules)
+    
+    @property
+    def lines_dropped(self) -> int:
+        """Total number of dropped lines."""
+        return self.dropped_inbound + self.dropped_email + self.dropped_ip
+    
+    def accept_line(self, line: str) -> bool:
+        """
+        Apply the inbound tag rules to a raw line.
+        
+        Args:
+            line: Raw log line from access.log
+        
+        Returns:
+            False if the line should be dropped
+        """
+        self.lines_checked += 1
+        if not self._check_inbound:
+            return True
+        
+        # Timed as a whole: the tag search is most of the filtering cost
+        started = time.perf_counter()
+        try:
+            match = self.INBOUND_PATTERN.search(line)
+            return self._match_inbound(match.group(1).strip() if match else None)
+        finally:
+            self.filter_time += time.perf_counter() - started
+    
+    def accept_inbound(self, tag: Optional[str]) -> bool:
+        """
+        Apply the inbound tag rules to a tag extracted by a format parser.
+        
+        Args:
+            tag: Inbound tag, or None if the line has none
+        
+        Returns:
+            False if the line should be dropped
+        """
+        self.lines_checked += 1
+        if not self._check_inbound:
+            return True
+        
+        started = time.perf_counter()
+        try:
+            return self._match_inbound(tag)
+        finally:
+            self.filter_time += time.perf_counter() - started
+    
+    def _match_inbound(self, tag: Optional[str]) -> bool:
+        """Check a tag against the inbound rules, counting drops."""
+        accepted = (
+            (not self.include_inbounds or tag in self.include_inbounds)
+            and tag not in self.exclude_inbounds
+        )
+        if not accepted:
+            self.dropped_inbound += 1
+        return accepted
+    
+    def accept_fields(self, email: str, client_ip: str) -> bool:
+        """
+        Apply the email and IP rules to extracted fields.
+        
+        Args:
+            email: Extracted user email
+            client_ip: Extracted client IP
+        
+        Returns:
+            False if the connection should be dropped
+        """
+        started = time.perf_counter()
+        try:
+            if ((self.include_email and not self.include_email.search(email))
+                    or (self.exclude_email and self.exclude_email.search(email))):
+                self.dropped_email += 1
+                return False
+            
+            if self.ip_rules and self.ip_rules.lookup(client_ip) == FILTER_DENY:
+                self.dropped_ip += 1
+                return False
+            return True
+        finally:
+            self.filter_time += time.perf_counter() - started
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get filter statistics.
+        
+        Returns:
+            Dictionary with drop counts and the time spent filtering
+        """
+        return {
+            'filter_lines_checked': self.lines_checked,
+            'filter_dropped': self.lines_dropped,
+            'filter_dropped_inbound': self.dropped_inbound,
+            'filter_dropped_email': self.dropped_email,
+            'filter_dropped_ip': self.dropped_ip,
+            'filter_time': self.filter_time,
+            'filter_ip_prefixes': self.ip_rules.size if self.ip_rules else 0,
+        }
+
+
 class MarzbanLogParser:
     """Parser for Marzban access log entries."""
     
@@ -86,7 +380,8 @@ class MarzbanLogParser:
     def parse_log_line(
         line: str, 
         node_id: str, 
-        node_name: str
+        node_name: str,
+        log_filter: Optional[LogFilter] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Parse a single log line and create structured log object.
@@ -95,6 +390,7 @@ class MarzbanLogParser:
             line: Raw log line from access.log
             node_id: Unique identifier for the node
             node_name: Human-readable name for the node
+            log_filter: Optional filter for dropping unwanted connections
             
         Returns:
             Structured log object or None if line doesn't contain useful info
@@ -104,15 +400,22 @@ class MarzbanLogParser:
         if not line or not MarzbanLogParser.is_accepted_connection(line):
             return None
         
+        if log_filter and not log_filter.accept_line(line):
+            return None
+        
         # Extract information from log line
         email = MarzbanLogParser.extract_email(line)
         client_ip = MarzbanLogParser.extract_client_ip(line)
-        log_timestamp = MarzbanLogParser.extract_timestamp(line)
         
         # Skip if we couldn't extract essential information
         if not email or not client_ip:
             return None
         
+        if log_filter and not log_filter.accept_fields(email, client_ip):
+            return None
+        
+        log_timestamp = MarzbanLogParser.extract_timestamp(line)
+        
         # Create structured log object
         return {
             'timestamp': log_timestamp or time.time(),
@@ -149,7 +452,8 @@ class MarzbanLogParser:
 def create_log_entry(
     line: str, 
     node_id: str, 
-    node_name: str
+    node_name: str,
+    log_filter: Optional[LogFilter] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Convenience function to create a log entry from a raw line.
@@ -158,8 +462,9 @@ def create_log_entry(
         line: Raw log line from access.log
         node_id: Unique identifier for the node
         node_name: Human-readable name for the node
+        log_filter: Optional filter for dropping unwanted connections
         
     Returns:
         Structured log object or None if line doesn't contain useful info
     """
-    return MarzbanLogParser.parse_log_line(line, node_id, node_name)
+    return MarzbanLogParser.parse_log_line(line, node_id, node_name, log_filter)
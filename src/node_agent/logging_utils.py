@@ -0,0 +1,89 @@
+"""
+Logging utilities for Marzban Node Agent.
+
+This module provides helpers that keep the agent's own logging cheap on
+the hot path: a rate-limited logger for repeated errors and formatting
+of the periodic throughput summary.
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+class RateLimitedLogger:
+    """
+    Logger wrapper that emits each kind of message at most once per interval.
+    
+    Messages are grouped by a caller-supplied key. Messages suppressed
+    within the interval are counted and reported with the next one.
+    """
+    
+    def __init__(
+        self,
+        logger: logging.Logger,
+        interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the rate-limited logger.
+        
+        Args:
+            logger: Logger to emit to
+            interval: Minimum seconds between messages with the same key
+            clock: Monotonic clock, injectable for tests
+        """
+        self.logger = logger
+        self.interval = interval
+        self._clock = clock
+        self._state: Dict[str, Tuple[float, int]] = {}
+    
+    def log(self, level: int, key: str, msg: str, *args: Any) -> None:
+        """
+        Log a message unless one with the same key was logged recently.
+        
+        Args:
+            level: Logging level
+            key: Key grouping repeated messages
+            msg: Message format string (%-style, formatted lazily)
+            *args: Message arguments
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        
+        now = self._clock()
+        last, suppressed = self._state.get(key, (float("-inf"), 0))
+        if now - last < self.interval:
+            self._state[key] = (last, suppressed + 1)
+            return
+        
+        self._state[key] = (now, 0)
+        if suppressed:
+            msg += " (%d similar messages suppressed)"
+            args += (suppressed,)
+        self.logger.log(level, msg, *args)
+    
+    def warning(self, key: str, msg: str, *args: Any) -> None:
+        """Log a rate-limited warning."""
+        self.log(logging.WARNING, key, msg, *args)
+    
+    def error(self, key: str, msg: str, *args: Any) -> None:
+        """Log a rate-limited error."""
+        self.log(logging.ERROR, key, msg, *args)
+
+
+def format_bytes(count: float) -> str:
+    """
+    Format a byte count for humans.
+    
+    Args:
+        count: Number of bytes
+        
+    Returns:
+        Count with a binary unit, e.g. "1.5 KiB"
+    """
+    for unit in ("B", "KiB", "MiB"):
+        if abs(count) < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GiB"
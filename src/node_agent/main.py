@@ -9,9 +9,43 @@ import asyncio
 import logging
 import signal
 import sys
-from typing import Optional
-from .config import ConfigService, NodeConfig
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from .config import RELOADABLE_SETTINGS, ConfigService, NodeConfig
+from .endpoints import redact_url
 from .log_forwarder import LogForwarder
+from .profiling import LoopLagMonitor, Profiler
+from .relay import LogRelay
+from .serializers import create_serializer
+
+if TYPE_CHECKING:
+    from .admin import AdminServer
+
+
+def setup_event_loop(name: str) -> str:
+    """
+    Install the event loop policy for the requested loop.
+    
+    Args:
+        name: "asyncio" or "uvloop"
+    
+    Returns:
+        Name of the loop that will be used; falls back to "asyncio" when
+        uvloop is not installed
+    """
+    if sys.platform == "win32":
+        # Set event loop policy for Windows compatibility
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+        return "asyncio"
+    
+    if name == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            return "asyncio"
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return "uvloop"
+    
+    return "asyncio"
 
 
 class NodeAgent:
@@ -28,6 +62,10 @@ class NodeAgent:
         self.log_forwarder: Optional[LogForwarder] = None
         self.logger = self._setup_logging()
         self._shutdown_event = asyncio.Event()
+        self.profiler = Profiler(config.profile_dir, config.node_id)
+        self.loop_monitor = LoopLagMonitor(config.loop_lag_interval, config.loop_lag_threshold)
+        self.admin_server: Optional['AdminServer'] = None
+        self._diagnostic_tasks: List[asyncio.Task] = []
     
     def _setup_logging(self) -> logging.Logger:
         """
@@ -64,6 +102,111 @@ class NodeAgent:
         
         signal.signal(signal.SIGTERM, signal_handler)
         signal.signal(signal.SIGINT, signal_handler)
+        
+        # Profiling toggles: SIGUSR1 starts/stops cProfile, SIGUSR2 snapshots memory
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.toggle_cpu())
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.profiler.snapshot_memory())
+        
+        # Configuration reload, run from the loop rather than inside the handler
+        if hasattr(signal, "SIGHUP"):
+            loop = asyncio.get_running_loop()
+            signal.signal(signal.SIGHUP, lambda signum, frame: loop.call_soon_threadsafe(self.reload_config))
+    
+    def reload_config(self) -> bool:
+        """
+        Re-read the configuration and apply hot-tunable settings in place.
+        
+        The reload is rejected as a whole if the new configuration is
+        invalid or changes a setting that requires a restart.
+        
+        Returns:
+            True if the configuration was reloaded
+        """
+        self.logger.info("Reloading configuration...")
+        try:
+            config = ConfigService.load_from_env(override=True)
+        except ValueError as e:
+            self.logger.error(f"Configuration reload rejected, invalid configuration: {e}")
+            return False
+        
+        changed = ConfigService.changed_settings(self.config, config)
+        if not changed:
+            self.logger.info("Configuration unchanged")
+            return True
+        
+        fixed = [name for name in changed if name not in RELOADABLE_SETTINGS]
+        if fixed:
+            self.logger.error(
+                f"Configuration reload rejected: {', '.join(name.upper() for name in fixed)} "
+                f"cannot change at runtime, restart the agent to apply"
+            )
+            return False
+        
+        try:
+            if self.log_forwarder:
+                self.log_forwarder.apply_config(config)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Configuration reload rejected: {e}")
+            return False
+        
+        logging.getLogger().setLevel(getattr(logging, config.log_level))
+        self.profiler.output_dir = config.profile_dir
+        self.loop_monitor.warn_threshold = config.loop_lag_threshold
+        
+        for name in changed:
+            self.logger.info(f"{name.upper()}: {getattr(self.config, name)} -> {getattr(config, name)}")
+        self.config = config
+        self.logger.info("Configuration reloaded")
+        return True
+    
+    async def _start_diagnostics(self) -> None:
+        """Start the loop lag sampler, slow-callback reporting and the admin endpoint."""
+        if self.config.slow_callback_duration:
+            # asyncio debug mode logs every callback slower than the threshold
+            loop = asyncio.get_running_loop()
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.config.slow_callback_duration
+            logging.getLogger('asyncio').setLevel(logging.WARNING)
+        
+        if self.config.loop_lag_interval:
+            self._diagnostic_tasks.append(asyncio.create_task(self.loop_monitor.run()))
+        
+        if self.config.admin_listen:
+            from .admin import AdminServer
+            
+            self.admin_server = AdminServer(self.config.admin_listen, self.profiler, self.get_stats)
+            try:
+                await self.admin_server.start()
+            except OSError as e:
+                self.logger.error(f"Failed to start admin endpoint: {e}")
+                self.admin_server = None
+    
+    async def _stop_diagnostics(self) -> None:
+        """Stop diagnostics and write out a CPU profile still in progress."""
+        for task in self._diagnostic_tasks:
+            task.cancel()
+        await asyncio.gather(*self._diagnostic_tasks, return_exceptions=True)
+        self._diagnostic_tasks = []
+        
+        if self.admin_server:
+            await self.admin_server.stop()
+            self.admin_server = None
+        
+        if self.profiler.cpu_running:
+            self.profiler.stop_cpu()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get agent statistics.
+        
+        Returns:
+            Forwarder statistics with event loop lag statistics
+        """
+        stats = self.log_forwarder.get_stats() if self.log_forwarder else {}
+        stats.update(self.loop_monitor.get_stats())
+        stats['cpu_profiling'] = self.profiler.cpu_running
+        return stats
     
     async def start(self) -> None:
         """Start the Node Agent."""
@@ -71,12 +214,29 @@ class NodeAgent:
         self.logger.info(f"Node ID: {self.config.node_id}")
         self.logger.info(f"Node Name: {self.config.node_name}")
         self.logger.info(f"Access Log Path: {self.config.access_log_path}")
-        self.logger.info(f"Central Redis: {self.config.central_redis_url}")
+        self.logger.info(f"Central Redis: {redact_url(self.config.central_redis_url)}")
+        for url in self.config.central_redis_fallback_urls:
+            self.logger.info(f"Fallback Redis: {redact_url(url)}")
         self.logger.info(f"Batch Size: {self.config.batch_size}")
         self.logger.info(f"Flush Interval: {self.config.flush_interval}s")
+        loop_module = type(asyncio.get_running_loop()).__module__.split(".")[0]
+        self.logger.info(f"Event Loop: {loop_module}")
+        if self.config.event_loop == "uvloop" and loop_module != "uvloop":
+            self.logger.warning("EVENT_LOOP=uvloop but uvloop is not installed, using the default asyncio loop")
+        serializer = create_serializer(self.config.serializer).name
+        self.logger.info(f"Serializer: {serializer}")
+        if serializer != self.config.serializer:
+            self.logger.warning(
+                f"SERIALIZER={self.config.serializer} but {self.config.serializer} is not installed, using json"
+            )
+        if self.config.relay_listen:
+            self.logger.info(f"Relay mode, listening on {self.config.relay_listen}")
+        if self.config.relay_url:
+            self.logger.info(f"Upstream relay: {self.config.relay_url}")
         
         # Setup signal handlers
         self._setup_signal_handlers()
+        await self._start_diagnostics()
         
         retry_count = 0
         max_restarts = 5
@@ -84,8 +244,13 @@ class NodeAgent:
         
         while retry_count < max_restarts and not self._shutdown_event.is_set():
             try:
-                # Create log forwarder
-                self.log_forwarder = LogForwarder(self.config)
+                # Create log forwarder (or relay when listening for agents) once;
+                # restarts reuse it so the buffer and cursor survive a crash
+                if self.log_forwarder is None:
+                    if self.config.relay_listen:
+                        self.log_forwarder = LogRelay(self.config)
+                    else:
+                        self.log_forwarder = LogForwarder(self.config)
                 
                 # Start forwarder
                 forwarder_task = asyncio.create_task(self.log_forwarder.start())
@@ -143,6 +308,7 @@ class NodeAgent:
                     except Exception as e:
                         self.logger.error(f"Error stopping log forwarder: {e}")
         
+        await self._stop_diagnostics()
         self.logger.info("Node Agent shutdown complete")
     
     async def stop(self) -> None:
@@ -152,11 +318,17 @@ class NodeAgent:
             await self.log_forwarder.stop()
 
 
-async def main() -> None:
-    """Main entry point for the application."""
+async def main(config: Optional[NodeConfig] = None) -> None:
+    """
+    Main entry point for the application.
+    
+    Args:
+        config: Node configuration (loaded from the environment if omitted)
+    """
     try:
         # Load configuration
-        config = ConfigService.load_from_env()
+        if config is None:
+            config = ConfigService.load_from_env()
         
         # Create and start agent
         agent = NodeAgent(config)
@@ -170,9 +342,17 @@ async def main() -> None:
         sys.exit(1)
 
 
-if __name__ == "__main__":
-    # Set event loop policy for Windows compatibility
-    if sys.platform == "win32":
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+def run() -> None:
+    """Load configuration, install the event loop and run the agent."""
+    try:
+        config = ConfigService.load_from_env()
+    except Exception as e:
+        print(f"Fatal error: {e}", file=sys.stderr)
+        sys.exit(1)
     
-    asyncio.run(main())
+    setup_event_loop(config.event_loop)
+    asyncio.run(main(config))
+
+
+if __name__ == "__main__":
+    run()
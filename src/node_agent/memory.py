@@ -0,0 +1,201 @@
+"""
+Memory budget module for Marzban Node Agent.
+
+This module provides a memory accountant that adds up the approximate
+bytes held by the forwarder's components (the buffer, caches, the
+deduplication set) and picks a degradation level before the container's
+memory limit is reached: first raw lines are dropped, then caches are
+cleared, and finally reading stops so the backlog stays on disk in the
+access log instead of in memory.
+"""
+
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Degradation levels, in order of severity; each includes the ones before it
+MEMORY_NORMAL = "normal"
+MEMORY_DROP_RAW_LINES = "drop_raw_lines"
+MEMORY_SHRINK_CACHES = "shrink_caches"
+MEMORY_SPILL = "spill"
+MEMORY_LEVELS = (MEMORY_NORMAL, MEMORY_DROP_RAW_LINES, MEMORY_SHRINK_CACHES, MEMORY_SPILL)
+
+# Share of the budget at which each level starts, and the margin below it
+# at which the level is left again, so decisions do not flap
+MEMORY_THRESHOLDS = (0.0, 0.7, 0.8, 0.9)
+MEMORY_HYSTERESIS = 0.1
+
+# Decisions kept for the stats
+MEMORY_DECISIONS_KEPT = 10
+
+# Limits at or above this mean "no limit" (cgroup v1 reports a huge number)
+UNLIMITED = 1 << 60
+
+CGROUP_LIMIT_FILES = (
+    "/sys/fs/cgroup/memory.max",                    # cgroup v2
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",  # cgroup v1
+)
+
+
+def read_cgroup_limit(paths: Iterable[str] = CGROUP_LIMIT_FILES) -> Optional[int]:
+    """
+    Read the memory limit of the container.
+    
+    Args:
+        paths: cgroup files to try, in order
+    
+    Returns:
+        Limit in bytes, or None when there is no limit or no cgroup
+    """
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value == "max":
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            continue
+        return limit if 0 < limit < UNLIMITED else None
+    return None
+
+
+def read_rss() -> int:
+    """
+    Get the resident set size of this process.
+    
+    Returns:
+        RSS in bytes, or 0 where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def estimate_entries_size(entries: List[Dict[str, Any]], samples: int = 32) -> int:
+    """
+    Estimate the bytes held by a list of log entries.
+    
+    A few evenly spaced entries are measured (the dict and its values; keys
+    are shared between entries) and the average is scaled to the list.
+    
+    Args:
+        entries: Log entries
+        samples: Maximum number of entries measured
+    
+    Returns:
+        Approximate size in bytes, including the list itself
+    """
+    count = len(entries)
+    if not count:
+        return sys.getsizeof(entries)
+    
+    step = max(1, count // samples)
+    measured = entries[::step][:samples]
+    total = 0
+    for entry in measured:
+        total += sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+    return sys.getsizeof(entries) + total * count // len(measured)
+
+
+class MemoryBudget:
+    """
+    Accountant of the memory held by registered components.
+    
+    The process size at startup is the baseline; component estimates are
+    added to it and compared with the budget. Estimates are used rather
+    than the RSS because the allocator rarely returns freed memory to the
+    system, so the RSS would not show a degradation taking effect.
+    """
+    
+    def __init__(self, limit: int, baseline: Optional[int] = None, clock: Callable[[], float] = time.time):
+        """
+        Initialize the accountant.
+        
+        Args:
+            limit: Memory budget in bytes
+            baseline: Bytes used outside the components (defaults to the current RSS)
+            clock: Wall clock for decision timestamps, injectable for tests
+        """
+        self.limit = limit
+        self.baseline = read_rss() if baseline is None else baseline
+        self.level = MEMORY_NORMAL
+        self.used = self.baseline
+        self.components: Dict[str, int] = {}
+        self.decisions: List[Dict[str, Any]] = []
+        self.escalations = 0
+        self._sizers: Dict[str, Callable[[], int]] = {}
+        self._clock = clock
+    
+    def register(self, name: str, sizer: Callable[[], int]) -> None:
+        """
+        Track a component.
+        
+        Args:
+            name: Component name, used in stats
+            sizer: Returns the approximate bytes the component holds
+        """
+        self._sizers[name] = sizer
+    
+    def update(self) -> str:
+        """
+        Measure the components and pick the degradation level.
+        
+        Returns:
+            The new level
+        """
+        self.components = {name: sizer() for name, sizer in self._sizers.items()}
+        self.used = self.baseline + sum(self.components.values())
+        share = self.used / self.limit
+        
+        # Levels up to the current one are kept until the share drops
+        # MEMORY_HYSTERESIS below their threshold
+        current = MEMORY_LEVELS.index(self.level)
+        target = max(
+            i for i, threshold in enumerate(MEMORY_THRESHOLDS)
+            if share >= threshold - (MEMORY_HYSTERESIS if i <= current else 0)
+        )
+        
+        if target != current:
+            if target > current:
+                self.escalations += 1
+            self.level = MEMORY_LEVELS[target]
+            self.decisions.append({'time': self._clock(), 'level': self.level, 'used': self.used})
+            del self.decisions[:-MEMORY_DECISIONS_KEPT]
+        return self.level
+    
+    def at_least(self, level: str) -> bool:
+        """
+        Whether the current level includes a degradation step.
+        
+        Args:
+            level: Level to compare with
+        """
+        return MEMORY_LEVELS.index(self.level) >= MEMORY_LEVELS.index(level)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get memory accounting statistics.
+        
+        Returns:
+            Dictionary with the budget, estimated use per component and the
+            recent decisions
+        """
+        stats = {
+            'memory_budget': self.limit,
+            'memory_used': self.used,
+            'memory_baseline': self.baseline,
+            'memory_rss': read_rss(),
+            'memory_level': self.level,
+            'memory_escalations': self.escalations,
+            'memory_decisions': list(self.decisions),
+        }
+        for name, size in self.components.items():
+            stats[f'memory_{name}_bytes'] = size
+        return stats
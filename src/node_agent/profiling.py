@@ -0,0 +1,199 @@
+"""
+Profiling module for Marzban Node Agent.
+
+This module provides on-demand profiling of a running agent: a cProfile
+session that can be toggled, tracemalloc snapshots of the top allocators
+and an event loop lag sampler.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+# The profilers are imported on first use, most agents are never profiled
+if TYPE_CHECKING:
+    import cProfile
+
+
+class Profiler:
+    """On-demand CPU and memory profiler writing reports to a directory."""
+    
+    def __init__(self, output_dir: str, node_id: str, top: int = 30):
+        """
+        Initialize the profiler.
+        
+        Args:
+            output_dir: Directory for profiling reports
+            node_id: Unique identifier for the node, used in file names
+            top: Number of entries in text reports
+        """
+        self.output_dir = output_dir
+        self.node_id = node_id
+        self.top = top
+        self.logger = logging.getLogger(__name__)
+        self._cpu_profile: Optional['cProfile.Profile'] = None
+        self._cpu_started_at = 0.0
+    
+    @property
+    def cpu_running(self) -> bool:
+        """Whether a CPU profiling session is active."""
+        return self._cpu_profile is not None
+    
+    def _report_path(self, kind: str, suffix: str) -> str:
+        """Build a timestamped report path."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{kind}-{self.node_id}-{stamp}.{suffix}")
+    
+    def start_cpu(self) -> None:
+        """Start a CPU profiling session."""
+        if self._cpu_profile is not None:
+            return
+        import cProfile
+        
+        self._cpu_profile = cProfile.Profile()
+        self._cpu_started_at = time.monotonic()
+        self._cpu_profile.enable()
+        self.logger.info("CPU profiling started")
+    
+    def stop_cpu(self) -> Optional[str]:
+        """
+        Stop the CPU profiling session and write its reports.
+        
+        Writes a .pstats file (for snakeviz, pstats etc.) and a text
+        report of the top functions by cumulative time.
+        
+        Returns:
+            Path of the .pstats file, or None if no session was active
+        """
+        profile = self._cpu_profile
+        if profile is None:
+            return None
+        profile.disable()
+        self._cpu_profile = None
+        
+        path = self._report_path("cpu", "pstats")
+        profile.dump_stats(path)
+        
+        import pstats
+        
+        text = io.StringIO()
+        stats = pstats.Stats(profile, stream=text)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        with open(path[:-len(".pstats")] + ".txt", "w") as f:
+            f.write(f"Profiled for {time.monotonic() - self._cpu_started_at:.1f}s\n")
+            f.write(text.getvalue())
+        
+        self.logger.info(f"CPU profile written to {path}")
+        return path
+    
+    def toggle_cpu(self) -> Optional[str]:
+        """
+        Start a CPU profiling session, or stop the running one.
+        
+        Returns:
+            Path of the written report when a session was stopped
+        """
+        if self.cpu_running:
+            return self.stop_cpu()
+        self.start_cpu()
+        return None
+    
+    def snapshot_memory(self) -> Optional[str]:
+        """
+        Write the top allocators from a tracemalloc snapshot.
+        
+        Allocations are only attributed while tracing, so the first call
+        starts tracemalloc and later calls write snapshots.
+        
+        Returns:
+            Path of the written report, or None if tracing was just started
+        """
+        import tracemalloc
+        
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self.logger.info("Memory tracing started, request another snapshot to capture allocators")
+            return None
+        
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        
+        path = self._report_path("memory", "txt")
+        with open(path, "w") as f:
+            f.write(f"Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                f.write(f"{stat}\n")
+        
+        self.logger.info(f"Memory snapshot written to {path}")
+        return path
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag sampler.
+    
+    Sleeps for a fixed interval and measures how late it wakes up; the
+    overshoot is time the loop spent running other callbacks.
+    """
+    
+    def __init__(self, interval: float = 1.0, warn_threshold: float = 0.1):
+        """
+        Initialize the monitor.
+        
+        Args:
+            interval: Seconds between samples
+            warn_threshold: Lag in seconds above which a warning is logged
+        """
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.logger = logging.getLogger(__name__)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        self.slow_samples = 0
+    
+    async def run(self) -> None:
+        """Sample the loop lag until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - started - self.interval)
+    
+    def record(self, lag: float) -> None:
+        """
+        Record a lag sample.
+        
+        Args:
+            lag: Seconds the loop woke up late
+        """
+        lag = max(0.0, lag)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.total_lag += lag
+        self.samples += 1
+        if lag > self.warn_threshold:
+            self.slow_samples += 1
+            self.logger.warning("Event loop lag %.3fs (threshold %.3fs)", lag, self.warn_threshold)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get loop lag statistics.
+        
+        Returns:
+            Dictionary with lag statistics in seconds
+        """
+        return {
+            'loop_lag_last': self.last_lag,
+            'loop_lag_max': self.max_lag,
+            'loop_lag_avg': self.total_lag / self.samples if self.samples else 0.0,
+            'loop_lag_slow_samples': self.slow_samples,
+        }
@@ -0,0 +1,528 @@
+"""
+Relay module for Marzban Node Agent.
+
+This module implements the relay/aggregator tier. Agents send their
+batches to a relay over TCP or a Unix socket using length-prefixed
+frames, and the relay merges them into larger batches that are
+forwarded upstream to the central Redis server (or to another relay).
+"""
+
+import asyncio
+import hmac
+import os
+import struct
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from .config import ConfigService, NodeConfig
+from .log_forwarder import LogForwarder
+from .serializers import decode_entry
+
+
+# Frame layout: 4-byte big-endian length of the rest, opcode, flags, payload
+FRAME_HEADER = struct.Struct("!IBB")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+OP_PING = 1
+OP_LPUSH = 2
+OP_GET = 3
+OP_SET = 4
+OP_AUTH = 5
+OP_OK = 0x80
+OP_ERROR = 0x81
+
+FLAG_ZLIB = 0x01
+FLAG_NIL = 0x02
+
+
+class RelayProtocolError(Exception):
+    """Raised when a relay peer sends a malformed frame."""
+
+
+def parse_relay_address(url: str) -> Tuple[str, Any]:
+    """
+    Parse a relay address.
+    
+    Args:
+        url: Address in tcp://host:port or unix:///path form
+    
+    Returns:
+        Tuple of transport ("tcp" or "unix") and address
+    
+    Raises:
+        ValueError: If the address is malformed
+    """
+    if url.startswith("unix://"):
+        path = url[len("unix://"):]
+        if not path:
+            raise ValueError(f"Invalid relay address: {url}")
+        return "unix", path
+    
+    if url.startswith("tcp://"):
+        host, sep, port = url[len("tcp://"):].rpartition(":")
+        if not sep or not host or not port.isdigit():
+            raise ValueError(f"Invalid relay address: {url}")
+        return "tcp", (host.strip("[]"), int(port))
+    
+    raise ValueError(f"Invalid relay address: {url}")
+
+
+def check_position_key(key: str) -> None:
+    """
+    Check that a key read or written through a relay is a node position key.
+    
+    Args:
+        key: Redis key sent by an agent
+    
+    Raises:
+        RelayProtocolError: If the key is anything else
+    """
+    node_id = key.removeprefix("{node_logs_queue}:").removeprefix("node_agent:").removesuffix(":position")
+    if not node_id or key not in (
+            ConfigService.get_redis_position_key(node_id),
+            ConfigService.get_redis_position_key(node_id, hash_tag=True)):
+        raise RelayProtocolError(f"Key not allowed through the relay: {key}")
+
+
+def encode_frame(opcode: int, parts: List[bytes], compress_min_bytes: int = 0) -> bytes:
+    """
+    Encode a relay frame.
+    
+    Args:
+        opcode: Frame opcode
+        parts: Payload fields, joined with newlines
+        compress_min_bytes: Compress payloads at least this large (0 disables)
+    
+    Returns:
+        Encoded frame
+    """
+    payload = b"\n".join(parts)
+    flags = 0
+    if compress_min_bytes and len(payload) >= compress_min_bytes:
+        payload = zlib.compress(payload, 1)
+        flags |= FLAG_ZLIB
+    return FRAME_HEADER.pack(len(payload) + 2, opcode, flags) + payload
+
+
+def encode_reply(value: Optional[str] = None, error: bool = False) -> bytes:
+    """
+    Encode a reply frame.
+    
+    Args:
+        value: Reply value, None for a nil reply
+        error: Whether the reply is an error message
+    
+    Returns:
+        Encoded frame
+    """
+    opcode = OP_ERROR if error else OP_OK
+    if value is None:
+        return FRAME_HEADER.pack(2, opcode, FLAG_NIL)
+    payload = value.encode("utf-8")
+    return FRAME_HEADER.pack(len(payload) + 2, opcode, 0) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """
+    Read a single frame from a stream.
+    
+    Args:
+        reader: Stream to read from
+    
+    Returns:
+        Tuple of opcode, flags and (decompressed) payload
+    
+    Raises:
+        asyncio.IncompleteReadError: If the peer closed the connection
+        RelayProtocolError: If the frame is malformed
+    """
+    header = await reader.readexactly(FRAME_HEADER.size)
+    length, opcode, flags = FRAME_HEADER.unpack(header)
+    if length < 2 or length > MAX_FRAME_SIZE:
+        raise RelayProtocolError(f"Invalid frame length: {length}")
+    
+    payload = await reader.readexactly(length - 2)
+    if flags & FLAG_ZLIB:
+        # Bound the output too, so a small frame cannot expand without limit
+        decompressor = zlib.decompressobj()
+        try:
+            payload = decompressor.decompress(payload, MAX_FRAME_SIZE)
+        except zlib.error as e:
+            raise RelayProtocolError(f"Invalid compressed payload: {e}")
+        if decompressor.unconsumed_tail:
+            raise RelayProtocolError(f"Decompressed payload exceeds {MAX_FRAME_SIZE} bytes")
+    return opcode, flags, payload
+
+
+class RelayClient:
+    """
+    Client for sending batches to a relay.
+    
+    Implements the subset of the Redis client API used by LogForwarder,
+    so a forwarder can push to a relay without any other changes.
+    """
+    
+    def __init__(
+        self,
+        url: str,
+        compress_min_bytes: int = 1024,
+        timeout: float = 10.0,
+        secret: str = ""
+    ):
+        """
+        Initialize the relay client.
+        
+        Args:
+            url: Relay address in tcp://host:port or unix:///path form
+            compress_min_bytes: Compress payloads at least this large
+            timeout: Timeout for a single request in seconds
+            secret: Shared secret sent when connecting (RELAY_SECRET)
+        """
+        self.transport, self.address = parse_relay_address(url)
+        self.compress_min_bytes = compress_min_bytes
+        self.timeout = timeout
+        self.secret = secret
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+    
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RelayClient":
+        """Create a relay client from an address."""
+        return cls(url, **kwargs)
+    
+    async def _open(self) -> None:
+        """Open the connection to the relay."""
+        if self.transport == "unix":
+            self._reader, self._writer = await asyncio.open_unix_connection(self.address)
+        else:
+            host, port = self.address
+            self._reader, self._writer = await asyncio.open_connection(host, port)
+        
+        if self.secret:
+            await self._send(encode_frame(OP_AUTH, [self.secret.encode("utf-8")]))
+    
+    async def _drop(self) -> None:
+        """Drop the current connection so the next request reconnects."""
+        writer = self._writer
+        self._reader = None
+        self._writer = None
+        if writer:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    async def _exchange(self, frame: bytes) -> Optional[str]:
+        """Send a frame and wait for the reply, connecting first if needed."""
+        if self._writer is None:
+            await self._open()
+        return await self._send(frame)
+    
+    async def _send(self, frame: bytes) -> Optional[str]:
+        """Send a frame on the open connection and wait for the reply."""
+        self._writer.write(frame)
+        await self._writer.drain()
+        
+        opcode, flags, payload = await read_frame(self._reader)
+        value = None if flags & FLAG_NIL else payload.decode("utf-8")
+        if opcode == OP_ERROR:
+            raise RelayProtocolError(f"Relay error: {value}")
+        if opcode != OP_OK:
+            raise RelayProtocolError(f"Unexpected reply opcode: {opcode}")
+        return value
+    
+    async def _request(self, opcode: int, parts: List[bytes]) -> Optional[str]:
+        """Send a request, reconnecting on the next call after any failure."""
+        frame = encode_frame(opcode, parts, self.compress_min_bytes)
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._exchange(frame), self.timeout)
+            except BaseException:
+                await self._drop()
+                raise
+    
+    async def ping(self) -> bool:
+        """Check that the relay is reachable."""
+        await self._request(OP_PING, [])
+        return True
+    
+    async def lpush(self, key: str, *values: str) -> int:
+        """Send serialized log entries to the relay."""
+        parts = [key.encode("utf-8")]
+        parts.extend(value.encode("utf-8") for value in values)
+        await self._request(OP_LPUSH, parts)
+        return len(values)
+    
+    async def get(self, key: str) -> Optional[str]:
+        """Read a key through the relay."""
+        return await self._request(OP_GET, [key.encode("utf-8")])
+    
+    async def set(self, key: str, value: str) -> bool:
+        """Write a key through the relay."""
+        await self._request(OP_SET, [key.encode("utf-8"), str(value).encode("utf-8")])
+        return True
+    
+    async def close(self) -> None:
+        """Close the connection to the relay."""
+        async with self._lock:
+            await self._drop()
+
+
+class LogRelay(LogForwarder):
+    """
+    Relay/aggregator that accepts batches from agents and forwards them upstream.
+    
+    Entries received from agents are merged into the forwarder buffer and
+    delivered with the usual batching, retry and flush logic. Position
+    reads from agents are passed through to the upstream; position writes
+    are held back until every entry received before them is delivered, so
+    an agent's cursor never moves past entries only the relay holds.
+    
+    The relay's own current_position counts the entries received, and
+    acked_position the entries delivered upstream. Over the memory budget
+    batches are refused rather than buffered, so agents keep them and
+    pause their own tails.
+    """
+    
+    def __init__(self, config: NodeConfig):
+        """
+        Initialize the relay.
+        
+        Args:
+            config: Node configuration with relay_listen set
+        """
+        super().__init__(config)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = 0
+        self.frames_received = 0
+        self.entries_received = 0
+        self.auth_failures = 0
+        self.batches_refused = 0
+        # Agent position writes: (entries received before it, key, value)
+        self._queued_positions: List[Tuple[int, str, str]] = []
+    
+    async def start(self) -> None:
+        """Start the relay server and the upstream flush scheduler."""
+        if self._running:
+            self.logger.warning("LogRelay is already running")
+            return
+        
+        self.logger.info(f"Starting LogRelay on {self.config.relay_listen}")
+        if not self.config.relay_secret and self.config.relay_listen.startswith("tcp://"):
+            self.logger.warning("RELAY_SECRET is not set: any host reaching the relay port can send batches")
+        self._running = True
+        
+        self._start_time = time.monotonic()
+        
+        try:
+            # Accept batches while connecting upstream; they are buffered
+            # and flushed once connected
+            if self.sink.uses_redis:
+                self._connect_task = asyncio.create_task(self._connect_redis())
+            # Batches acknowledged to agents but not delivered before the
+            # last shutdown
+            await self._restore_state()
+            self._server = await self._start_server()
+            
+            self._tasks = [
+                asyncio.create_task(self._flush_scheduler())
+            ]
+            if self._connect_task is not None:
+                self._tasks.append(self._connect_task)
+            if self.sink.uses_redis and len(self.endpoints.urls) > 1:
+                self._tasks.append(asyncio.create_task(self._endpoint_monitor()))
+            if self.config.stats_log_interval:
+                self._tasks.append(asyncio.create_task(self._summary_reporter()))
+            if self.memory is not None:
+                self._tasks.append(asyncio.create_task(self._memory_monitor()))
+            await asyncio.gather(*self._tasks)
+        
+        except Exception as e:
+            self.logger.error(f"Error in LogRelay: {e}")
+            await self.stop()
+            raise
+    
+    async def stop(self) -> None:
+        """Stop accepting connections and flush what is buffered."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        
+        await super().stop()
+    
+    async def _start_server(self) -> asyncio.AbstractServer:
+        """Start listening for agent connections."""
+        transport, address = parse_relay_address(self.config.relay_listen)
+        if transport == "unix":
+            if os.path.exists(address):
+                os.unlink(address)
+            return await asyncio.start_unix_server(self._handle_connection, path=address)
+        
+        host, port = address
+        return await asyncio.start_server(self._handle_connection, host, port)
+    
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve frames from a single agent connection."""
+        self._connections += 1
+        authenticated = not self.config.relay_secret
+        try:
+            while self._running:
+                try:
+                    opcode, flags, payload = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                
+                self.frames_received += 1
+                if opcode == OP_AUTH or not authenticated:
+                    # With RELAY_SECRET set, the first frame must carry it
+                    if opcode != OP_AUTH or not hmac.compare_digest(
+                            payload, self.config.relay_secret.encode("utf-8")):
+                        self.auth_failures += 1
+                        writer.write(encode_reply("authentication failed", error=True))
+                        await writer.drain()
+                        raise RelayProtocolError("authentication failed")
+                    authenticated = True
+                    writer.write(encode_reply("OK"))
+                    await writer.drain()
+                    continue
+                
+                try:
+                    reply = await self._handle_frame(opcode, payload)
+                except Exception as e:
+                    self.rate_limited_logger.error("relay_frame", "Failed to handle relay frame: %s", e)
+                    reply = encode_reply(str(e), error=True)
+                
+                writer.write(reply)
+                await writer.drain()
+        
+        except RelayProtocolError as e:
+            self.logger.warning(f"Closing relay connection: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+    
+    async def _handle_frame(self, opcode: int, payload: bytes) -> bytes:
+        """
+        Handle a single request frame.
+        
+        Args:
+            opcode: Request opcode
+            payload: Decompressed request payload
+        
+        Returns:
+            Encoded reply frame
+        """
+        if opcode == OP_PING:
+            return encode_reply("PONG")
+        
+        if opcode == OP_LPUSH:
+            if self._spilling and self.log_buffer:
+                # Over the memory budget: the agent keeps the batch and retries
+                self.batches_refused += 1
+                return encode_reply("relay over memory budget", error=True)
+            
+            # The queue key is ignored: merged batches go to the relay's own queue
+            _, *values = payload.split(b"\n")
+            entries: List[Dict[str, Any]] = [decode_entry(value) for value in values]
+            if self._drop_raw_lines:
+                for entry in entries:
+                    entry['raw_line'] = ""
+            if entries and not self.log_buffer:
+                self.flush_deadline.arm()
+            self.log_buffer.extend(entries)
+            self.entries_received += len(entries)
+            self.current_position += len(entries)
+            
+            if len(self.log_buffer) >= self._effective_batch_size():
+                await self._flush_batch()
+            return encode_reply(str(len(entries)))
+        
+        # Without an upstream (non-Redis sink) positions are not kept
+        if opcode == OP_GET:
+            key = payload.decode("utf-8")
+            check_position_key(key)
+            if self.redis_client is None:
+                return encode_reply(None)
+            return encode_reply(await self.redis_client.get(key))
+        
+        if opcode == OP_SET:
+            key, _, value = payload.decode("utf-8").partition("\n")
+            check_position_key(key)
+            if self.sink.uses_redis:
+                self._queued_positions.append((self.current_position, key, value))
+                await self._write_positions()
+                if self._queued_positions:
+                    self.flush_deadline.arm()
+            return encode_reply("OK")
+        
+        raise RelayProtocolError(f"Unknown opcode: {opcode}")
+    
+    async def _restore_position(self) -> None:
+        """Relays do not tail a file, so there is no position to restore."""
+    
+    async def _save_position(self) -> bool:
+        """Relays do not tail a file, so there is no position to save."""
+        return False
+    
+    async def _maybe_checkpoint(self, force: bool = False) -> None:
+        """Write the agent positions whose entries have been delivered."""
+        await self._write_positions()
+    
+    def _position_unrecorded(self) -> bool:
+        """Whether entries are undelivered or agent positions unwritten."""
+        return self.acked_position != self.current_position or bool(self._queued_positions)
+    
+    async def _write_positions(self) -> None:
+        """
+        Write queued agent positions upstream, once the entries received
+        before each of them have been delivered.
+        
+        Only the latest due value per key is written; writes that fail stay
+        queued for the next flush.
+        """
+        if self.redis_client is None:
+            return
+        
+        count = 0
+        while count < len(self._queued_positions) and self._queued_positions[count][0] <= self.acked_position:
+            count += 1
+        if not count:
+            return
+        
+        due = self._queued_positions[:count]
+        del self._queued_positions[:count]
+        latest = {key: value for _, key, value in due}
+        try:
+            for key, value in latest.items():
+                await self.redis_client.set(key, value)
+        except Exception as e:
+            self._queued_positions[:0] = due
+            self.rate_limited_logger.error("relay_position", "Failed to write agent positions: %s", e)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get current relay statistics.
+        
+        Returns:
+            Dictionary with current stats
+        """
+        stats = super().get_stats()
+        stats.update({
+            'relay_listen': self.config.relay_listen,
+            'relay_connections': self._connections,
+            'frames_received': self.frames_received,
+            'entries_received': self.entries_received,
+            'auth_failures': self.auth_failures,
+            'batches_refused': self.batches_refused,
+            'queued_positions': len(self._queued_positions)
+        })
+        return stats
@@ -0,0 +1,434 @@
+"""
+Replay module for Marzban Node Agent.
+
+This module bulk-loads historical access logs (including gzip-compressed
+rotations) into the central queue, for seeding a new node or rebuilding
+the central limiter state. It does not touch the live agent's position.
+
+Usage:
+    python -m node_agent.replay [PATH ...] [--since TIME] [--until TIME] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+from .config import ConfigService, NodeConfig
+from .endpoints import create_redis_client, is_cluster_url, redact_url
+from .enrichment import IPEnricher
+from .email_dictionary import EmailDictionary
+from .log_formats import LogFormatParser
+from .log_parser import LogFilter
+from .logging_utils import format_bytes
+from .resilience import jittered_backoff
+from .serializers import Serialized, create_serializer
+from .sinks import SINK_REDIS, create_sink
+
+
+# Values per LPUSH command; a batch is sent as several commands in one pipeline
+LPUSH_CHUNK = 1000
+
+# Xray text lines start with a sortable "YYYY/MM/DD HH:MM:SS" timestamp
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+TIMESTAMP_LENGTH = 19
+
+ROTATION_SUFFIX = re.compile(r'\.(\d+)(?:\.gz)?$')
+
+
+def parse_time(value: str) -> str:
+    """
+    Normalize a time range bound to the log timestamp format.
+    
+    Args:
+        value: Time as "2024-01-15", "2024-01-15T10:30:00" or "2024/01/15 10:30:00"
+    
+    Returns:
+        Time in "YYYY/MM/DD HH:MM:SS" form, comparable with log line prefixes
+    
+    Raises:
+        ValueError: If the time is malformed
+    """
+    return datetime.fromisoformat(value.strip().replace("/", "-")).strftime(TIMESTAMP_FORMAT)
+
+
+def timestamp_prefix(line: str) -> Optional[str]:
+    """
+    Get the leading timestamp of an Xray text line, without parsing it.
+    
+    Args:
+        line: Raw log line
+    
+    Returns:
+        The "YYYY/MM/DD HH:MM:SS" prefix, or None for lines in other layouts
+        (JSON, sing-box), whose time is only known once parsed
+    """
+    if len(line) < TIMESTAMP_LENGTH or line[4] != "/" or line[7] != "/" or line[10] != " ":
+        return None
+    return line[:TIMESTAMP_LENGTH]
+
+
+def find_log_files(patterns: List[str]) -> List[str]:
+    """
+    Expand paths and glob patterns into log files, oldest first.
+    
+    Rotations are ordered by their numeric suffix (access.log.3.gz before
+    access.log.2 before access.log), other files by modification time.
+    
+    Args:
+        patterns: File paths or glob patterns
+    
+    Returns:
+        Ordered list of existing files
+    """
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    
+    def age(path: str):
+        match = ROTATION_SUFFIX.search(path)
+        rotation = int(match.group(1)) if match else 0
+        return (-rotation, os.path.getmtime(path), path)
+    
+    return sorted(paths, key=age)
+
+
+def open_log_file(path: str) -> TextIO:
+    """Open a plain or gzip-compressed log file for reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+class Replayer:
+    """Bulk loader pushing historical access logs in large batches."""
+    
+    def __init__(
+        self,
+        config: NodeConfig,
+        batch_size: int = 5000,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        dry_run: bool = False,
+        progress_interval: float = 5.0
+    ):
+        """
+        Initialize the replayer.
+        
+        Args:
+            config: Node configuration
+            batch_size: Log entries per pipelined batch
+            since: Skip lines before this time ("YYYY/MM/DD HH:MM:SS")
+            until: Skip lines at or after this time ("YYYY/MM/DD HH:MM:SS")
+            dry_run: Only count what would be sent
+            progress_interval: Seconds between progress reports (0 disables)
+        """
+        self.config = config
+        self.batch_size = batch_size
+        self.since = since
+        self.until = until
+        # The same bounds as Unix times, for the timestamps parsers extract
+        self._since_time = datetime.strptime(since, TIMESTAMP_FORMAT).timestamp() if since else None
+        self._until_time = datetime.strptime(until, TIMESTAMP_FORMAT).timestamp() if until else None
+        self.dry_run = dry_run
+        self.progress_interval = progress_interval
+        self.logger = logging.getLogger(__name__)
+        self.log_filter = LogFilter.from_config(config)
+        self.parser = LogFormatParser(config.log_format, config.log_format_miss_threshold)
+        self.enricher = IPEnricher.from_config(config)
+        
+        self.redis_client: Any = None
+        hash_tag = is_cluster_url(config.central_redis_url)
+        self.queue_key = ConfigService.get_redis_queue_key(hash_tag)
+        self.sink = create_sink(config, lambda: self.redis_client, self.queue_key)
+        # Entries are encoded as the forwarder encodes them, so consumers
+        # decode replayed and live entries alike
+        self.serializer = create_serializer(config.serializer)
+        self.email_dictionary: Optional[EmailDictionary] = None
+        if config.email_dictionary:
+            self.email_dictionary = EmailDictionary()
+        self.email_dictionary_key = ConfigService.get_redis_email_dictionary_key(config.node_id, hash_tag)
+        
+        self.files_read = 0
+        self.lines_read = 0
+        self.lines_out_of_range = 0
+        self.entries_sent = 0
+        self.bytes_sent = 0
+        self.batches_sent = 0
+        self._started_at = 0.0
+        self._last_progress = 0.0
+    
+    async def run(self, paths: List[str]) -> Dict[str, Any]:
+        """
+        Replay log files in order.
+        
+        Args:
+            paths: Log files, oldest first
+        
+        Returns:
+            Replay statistics
+        """
+        self._started_at = self._last_progress = time.monotonic()
+        
+        if not self.dry_run and self.sink.uses_redis:
+            self.redis_client = create_redis_client(
+                self.config.central_redis_url,
+                connect_timeout=self.config.redis_connect_timeout,
+                socket_timeout=self.config.redis_socket_timeout,
+                max_connections=self.config.redis_max_connections
+            )
+            await self.redis_client.ping()
+            self.logger.info(f"Connected to central Redis server {redact_url(self.config.central_redis_url)}")
+        
+        try:
+            for path in paths:
+                self.logger.info(f"Replaying {path}")
+                await self._replay_file(path)
+                self.files_read += 1
+        finally:
+            await self.sink.close()
+            if self.enricher is not None:
+                self.enricher.close()
+            if self.redis_client is not None:
+                await self.redis_client.close()
+                self.redis_client = None
+        
+        return self.get_stats()
+    
+    async def _replay_file(self, path: str) -> None:
+        """Stream a single file through the parser in batches."""
+        batch: List[Dict[str, Any]] = []
+        with open_log_file(path) as f:
+            for line in f:
+                self.lines_read += 1
+                
+                # Compare an Xray timestamp prefix before paying for parsing
+                stamp = timestamp_prefix(line) if self.since or self.until else None
+                if stamp is not None and not self._in_range(stamp, self.since, self.until):
+                    self.lines_out_of_range += 1
+                    continue
+                
+                entry = self.parser.parse(line, self.config.node_id, self.config.node_name, self.log_filter)
+                if entry is None:
+                    continue
+                # Other layouts are compared on the time the parser extracted
+                if stamp is None and not self._in_range(entry['timestamp'], self._since_time, self._until_time):
+                    self.lines_out_of_range += 1
+                    continue
+                if self.enricher is not None:
+                    self.enricher.enrich(entry)
+                
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    await self._send(batch)
+                    batch = []
+        
+        if batch:
+            await self._send(batch)
+    
+    @staticmethod
+    def _in_range(value: Any, since: Any, until: Any) -> bool:
+        """Whether a time is within [since, until); None bounds are open."""
+        return (since is None or value >= since) and (until is None or value < until)
+    
+    async def _send(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Serialize and send a batch, retrying with backoff.
+        
+        Raises:
+            Exception: The last error once all retries are used up
+        """
+        if self.dry_run:
+            serialized = self._serialize(batch)
+        else:
+            attempts = max(1, self.config.max_retries)
+            for attempt in range(attempts):
+                try:
+                    register = None
+                    if self.email_dictionary is not None:
+                        await self._load_email_dictionary()
+                    serialized = self._serialize(batch)
+                    if self.email_dictionary is not None and self.email_dictionary.pending:
+                        register = (self.email_dictionary_key, dict(self.email_dictionary.pending))
+                    
+                    if self.config.sink == SINK_REDIS:
+                        await self._push_pipelined(serialized, register)
+                    else:
+                        await self.sink.push(serialized, register=register)
+                    if register:
+                        self.email_dictionary.registered(register[1])
+                    break
+                except Exception as e:
+                    if attempt == attempts - 1:
+                        raise
+                    self.logger.warning(f"Failed to send batch (attempt {attempt + 1}): {e}")
+                    await asyncio.sleep(jittered_backoff(attempt, self.config.retry_delay))
+        
+        self.batches_sent += 1
+        self.entries_sent += len(serialized)
+        self.bytes_sent += sum(map(len, serialized))
+        
+        now = time.monotonic()
+        if self.progress_interval and now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.logger.info(self.format_progress())
+    
+    def _serialize(self, batch: List[Dict[str, Any]]) -> List[Serialized]:
+        """Serialize a batch, with emails replaced by ids when EMAIL_DICTIONARY is on."""
+        if self.email_dictionary is not None:
+            return self.email_dictionary.encode_entries(batch, self.serializer.dumps)
+        return list(map(self.serializer.dumps, batch))
+    
+    async def _load_email_dictionary(self) -> None:
+        """Load the email ids the node already registered, once per run."""
+        dictionary = self.email_dictionary
+        if dictionary.loaded:
+            return
+        conflicts = dictionary.load(await self.redis_client.hgetall(self.email_dictionary_key))
+        if conflicts:
+            self.logger.warning(
+                "%d email ids were registered for other emails, is the agent of NODE_ID %s running?",
+                conflicts, self.config.node_id
+            )
+        self.logger.debug("Loaded %d email ids", len(dictionary))
+    
+    async def _push_pipelined(
+        self,
+        batch: List[Serialized],
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> None:
+        """Push a batch as several LPUSH commands in a single round trip, after its new email ids."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        if register:
+            key, mapping = register
+            for field, value in mapping.items():
+                pipe.hsetnx(key, field, value)
+        for start in range(0, len(batch), LPUSH_CHUNK):
+            pipe.lpush(self.queue_key, *batch[start:start + LPUSH_CHUNK])
+        await pipe.execute()
+    
+    def format_progress(self) -> str:
+        """
+        Build a throughput report.
+        
+        Returns:
+            One-line summary of the replay so far
+        """
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        verb = "would send" if self.dry_run else "sent"
+        return (
+            f"{self.files_read} files, {self.lines_read} lines "
+            f"({self.lines_read / elapsed:.0f} lines/s), {verb} {self.entries_sent} entries "
+            f"in {self.batches_sent} batches, {format_bytes(self.bytes_sent)} "
+            f"({format_bytes(int(self.bytes_sent / elapsed))}/s)"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get replay statistics.
+        
+        Returns:
+            Dictionary with counters and the elapsed time
+        """
+        stats = {
+            'files_read': self.files_read,
+            'lines_read': self.lines_read,
+            'lines_out_of_range': self.lines_out_of_range,
+            'entries_sent': self.entries_sent,
+            'batches_sent': self.batches_sent,
+            'bytes_sent': self.bytes_sent,
+            'elapsed': time.monotonic() - self._started_at,
+            'dry_run': self.dry_run,
+            'serializer': self.serializer.name,
+        }
+        stats.update(self.parser.get_stats())
+        if self.log_filter:
+            stats.update(self.log_filter.get_stats())
+        if self.enricher is not None:
+            stats.update(self.enricher.get_stats())
+        return stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m node_agent.replay",
+        description="Bulk-load historical access logs into the central queue."
+    )
+    parser.add_argument(
+        "paths", nargs="*",
+        help="log files or glob patterns (default: ACCESS_LOG_PATH and its rotations)"
+    )
+    parser.add_argument("--since", type=parse_time, help="skip lines before this time")
+    parser.add_argument("--until", type=parse_time, help="skip lines at or after this time")
+    parser.add_argument("--batch-size", type=int, default=5000, help="entries per pipelined batch")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be sent")
+    parser.add_argument("--env-file", help="path to a .env file")
+    parser.add_argument(
+        "--progress-interval", type=float, default=5.0,
+        help="seconds between progress reports (0 disables)"
+    )
+    args = parser.parse_args(argv)
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive")
+    return args
+
+
+async def replay(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the replay command.
+    
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    
+    Returns:
+        Process exit code
+    """
+    args = parse_args(argv)
+    config = ConfigService.load_from_env(args.env_file)
+    
+    logging.basicConfig(
+        level=getattr(logging, config.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+    logging.getLogger('redis').setLevel(logging.WARNING)
+    logger = logging.getLogger(__name__)
+    
+    paths = find_log_files(args.paths or [f"{config.access_log_path}*"])
+    if not paths:
+        logger.error("No log files found")
+        return 1
+    
+    replayer = Replayer(
+        config,
+        batch_size=args.batch_size,
+        since=args.since,
+        until=args.until,
+        dry_run=args.dry_run,
+        progress_interval=args.progress_interval
+    )
+    try:
+        await replayer.run(paths)
+    except Exception as e:
+        logger.error(f"Replay failed: {e}")
+        logger.info(replayer.format_progress())
+        return 1
+    
+    logger.info(f"Replay complete: {replayer.format_progress()}")
+    return 0
+
+
+def main() -> None:
+    """Entry point for python -m node_agent.replay."""
+    sys.exit(asyncio.run(replay()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Resilience helpers for Marzban Node Agent.
+
+This module provides jittered backoff and a circuit breaker used by the
+forwarder to ride out central Redis outages without tearing down state.
+"""
+
+import random
+import time
+from typing import Callable
+
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+def jittered_backoff(attempt: int, base: float, cap: float = 60.0) -> float:
+    """
+    Get a "full jitter" exponential backoff delay.
+    
+    Args:
+        attempt: Zero-based attempt number
+        base: Base delay in seconds
+        cap: Maximum delay in seconds
+    
+    Returns:
+        Random delay between 0 and min(cap, base * 2 ** attempt)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for calls to the central Redis server.
+    
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are short-circuited for `reset_timeout` seconds. Then a single
+    trial call is let through (half-open); its outcome closes or re-opens
+    the circuit.
+    """
+    
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the circuit breaker.
+        
+        Args:
+            failure_threshold: Consecutive failures before opening (0 disables)
+            reset_timeout: Seconds to stay open before a trial call
+            clock: Monotonic clock, injectable for tests
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self.times_opened = 0
+    
+    @property
+    def state(self) -> str:
+        """Current circuit state."""
+        return self._state
+    
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may be attempted.
+        
+        Returns:
+            False while the circuit is open, True otherwise
+        """
+        if self._state == CIRCUIT_OPEN:
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            # Let a single trial call through
+            self._state = CIRCUIT_HALF_OPEN
+            return True
+        
+        # While half-open, the trial call is already in flight
+        return self._state == CIRCUIT_CLOSED
+    
+    def cancel_trial(self) -> None:
+        """
+        Give up a trial call that was cancelled before it finished.
+        
+        The circuit opens again without restarting the timeout, so the next
+        call becomes the trial instead of the circuit staying half-open.
+        """
+        if self._state == CIRCUIT_HALF_OPEN:
+            self._state = CIRCUIT_OPEN
+    
+    def record_success(self) -> None:
+        """Record a successful call and close the circuit."""
+        self._failures = 0
+        self._state = CIRCUIT_CLOSED
+    
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit past the threshold."""
+        self._failures += 1
+        if not self.failure_threshold:
+            return
+        
+        if self._state == CIRCUIT_HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != CIRCUIT_OPEN:
+                self.times_opened += 1
+            self._state = CIRCUIT_OPEN
+            self._opened_at = self._clock()
@@ -0,0 +1,234 @@
+"""
+Serializer module for Marzban Node Agent.
+
+This module provides the encodings a forwarder serializes log entries
+with before delivery: stdlib JSON (the default), orjson and msgpack, plus
+the decoding counterpart the central side uses, which accepts a mix of
+all of them.
+"""
+
+import functools
+import json
+from typing import Any, Dict, List, Union
+
+
+SERIALIZER_JSON = "json"
+SERIALIZER_ORJSON = "orjson"
+SERIALIZER_MSGPACK = "msgpack"
+SERIALIZERS = (SERIALIZER_JSON, SERIALIZER_ORJSON, SERIALIZER_MSGPACK)
+
+# Serialized entries as delivered: text for JSON, bytes for msgpack
+Serialized = Union[str, bytes]
+
+
+class Serializer:
+    """
+    Encoding of log entries.
+    
+    JSON serializers produce text, so their output can go to every sink;
+    binary serializers need a sink that stores bytes as they are.
+    """
+    
+    name = ""
+    binary = False
+    
+    def dumps(self, entry: Dict[str, Any]) -> Serialized:
+        """
+        Serialize one log entry.
+        
+        Args:
+            entry: Log entry
+        
+        Returns:
+            Serialized entry
+        """
+        raise NotImplementedError
+    
+    def loads(self, data: Serialized) -> Dict[str, Any]:
+        """
+        Deserialize one log entry.
+        
+        Args:
+            data: Serialized entry
+        
+        Returns:
+            Log entry
+        """
+        raise NotImplementedError
+
+
+class JsonSerializer(Serializer):
+    """Stdlib json, always available."""
+    
+    name = SERIALIZER_JSON
+    
+    def __init__(self):
+        """Initialize the serializer."""
+        self.dumps = json.dumps
+        self.loads = json.loads
+
+
+class OrjsonSerializer(Serializer):
+    """
+    orjson, several times faster than stdlib json.
+    
+    The output is compact JSON (no spaces after separators), decoded to
+    text so the text sinks and the relay protocol take it unchanged.
+    """
+    
+    name = SERIALIZER_ORJSON
+    
+    def __init__(self):
+        """
+        Initialize the serializer.
+        
+        Raises:
+            ImportError: If orjson is not installed
+        """
+        import orjson
+        
+        self._dumps = orjson.dumps
+        self.loads = orjson.loads
+    
+    def dumps(self, entry: Dict[str, Any]) -> str:
+        """Serialize one log entry to compact JSON."""
+        return self._dumps(entry).decode()
+
+
+class MsgpackSerializer(Serializer):
+    """msgpack, a compact binary encoding for the Redis sinks."""
+    
+    name = SERIALIZER_MSGPACK
+    binary = True
+    
+    def __init__(self):
+        """
+        Initialize the serializer.
+        
+        Raises:
+            ImportError: If msgpack is not installed
+        """
+        import msgpack
+        
+        self.dumps = msgpack.Packer(use_bin_type=True).pack
+        self._unpackb = msgpack.unpackb
+    
+    def loads(self, data: Serialized) -> Dict[str, Any]:
+        """Deserialize one msgpack log entry."""
+        try:
+            return self._unpackb(data, raw=False)
+        except Exception as e:
+            # Unpacking errors do not all derive from ValueError
+            raise ValueError(f"Invalid msgpack entry: {e}") from e
+
+
+_SERIALIZER_CLASSES = {
+    SERIALIZER_JSON: JsonSerializer,
+    SERIALIZER_ORJSON: OrjsonSerializer,
+    SERIALIZER_MSGPACK: MsgpackSerializer,
+}
+
+
+def create_serializer(name: str) -> Serializer:
+    """
+    Create a serializer, falling back to stdlib json when the requested
+    library is not installed.
+    
+    Args:
+        name: Serializer name
+    
+    Returns:
+        Serializer instance; check its name to see whether it fell back
+    
+    Raises:
+        ValueError: If the serializer name is unknown
+    """
+    if name not in _SERIALIZER_CLASSES:
+        raise ValueError(f"Unknown serializer: {name}")
+    try:
+        return _SERIALIZER_CLASSES[name]()
+    except ImportError:
+        return JsonSerializer()
+
+
+def available_serializers() -> List[str]:
+    """
+    Get the serializers whose libraries are installed.
+    
+    Returns:
+        Names of the usable serializers
+    """
+    available = []
+    for name in SERIALIZERS:
+        if create_serializer(name).name == name:
+            available.append(name)
+    return available
+
+
+@functools.lru_cache(maxsize=None)
+def _decoder(name: str) -> Serializer:
+    """Serializer used for decoding, created on first use."""
+    return create_serializer(name)
+
+
+def _is_json(data: Serialized) -> bool:
+    """Whether a serialized entry is a JSON object (msgpack maps never start with '{')."""
+    return data[:1] in ("{", b"{")
+
+
+def decode_entry(data: Serialized) -> Dict[str, Any]:
+    """
+    Decode one serialized log entry in any supported encoding.
+    
+    Args:
+        data: Serialized entry, text or bytes
+    
+    Returns:
+        Log entry
+    
+    Raises:
+        ValueError: If the entry cannot be decoded
+    """
+    if _is_json(data):
+        # Whatever nodes send, JSON is parsed with the fastest parser installed
+        return _decoder(SERIALIZER_ORJSON).loads(data)
+    
+    if isinstance(data, str):
+        raise ValueError("Entry is neither JSON nor binary")
+    serializer = _decoder(SERIALIZER_MSGPACK)
+    if serializer.name != SERIALIZER_MSGPACK:
+        raise ValueError("Binary entry received but msgpack is not installed")
+    return serializer.loads(data)
+
+
+def decode_batch(items: List[Serialized]) -> List[Dict[str, Any]]:
+    """
+    Decode a batch of serialized log entries.
+    
+    An all-JSON batch is decoded as one JSON array, which is much faster
+    than one call per entry; entries are only decoded one by one when the
+    batch mixes encodings or contains a malformed entry, and malformed
+    entries are skipped.
+    
+    Args:
+        items: Serialized log entries, text or bytes
+    
+    Returns:
+        Decoded entries
+    """
+    if items and all(map(_is_json, items)):
+        loads = _decoder(SERIALIZER_ORJSON).loads
+        try:
+            if isinstance(items[0], bytes):
+                return loads(b"[" + b",".join(items) + b"]")
+            return loads("[" + ",".join(items) + "]")
+        except (TypeError, ValueError):
+            pass
+    
+    entries = []
+    for item in items:
+        try:
+            entries.append(decode_entry(item))
+        except ValueError:
+            continue
+    return entries
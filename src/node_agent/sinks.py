@@ -0,0 +1,283 @@
+"""
+Sink module for Marzban Node Agent.
+
+This module provides the destinations a forwarder delivers serialized
+log batches to: a Redis list (the default), a Redis stream, a rotating
+NDJSON file, stdout and a null sink for benchmarking.
+"""
+
+import asyncio
+import os
+import sys
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+
+SINK_REDIS = "redis"
+SINK_REDIS_STREAM = "redis-stream"
+SINK_FILE = "file"
+SINK_STDOUT = "stdout"
+SINK_NULL = "null"
+SINKS = (SINK_REDIS, SINK_REDIS_STREAM, SINK_FILE, SINK_STDOUT, SINK_NULL)
+REDIS_SINKS = (SINK_REDIS, SINK_REDIS_STREAM)
+
+
+def _register(pipe: Any, register: Optional[Tuple[str, Dict[int, str]]]) -> None:
+    """Queue HSETNX commands for new hash fields on a pipeline."""
+    if register:
+        key, mapping = register
+        for field, value in mapping.items():
+            pipe.hsetnx(key, field, value)
+
+
+class Sink:
+    """
+    Destination for serialized log batches.
+    
+    A push either delivers the whole batch or raises, so the forwarder's
+    retry, circuit breaker and checkpoint logic is the same for every sink.
+    """
+    
+    name = ""
+    uses_redis = False
+    
+    async def push(
+        self,
+        entries: List[str],
+        sample_depth: bool = False,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Optional[int]:
+        """
+        Deliver a batch of serialized log entries.
+        
+        Args:
+            entries: Serialized log entries, oldest first
+            sample_depth: Also return the destination queue length
+            register: Hash key and fields to set with HSETNX before the
+                entries, in the same round trip (Redis sinks only)
+        
+        Returns:
+            Queue length if sampled and supported by the sink, else None
+        """
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        """Release resources held by the sink."""
+
+
+class RedisListSink(Sink):
+    """Sink pushing entries onto a Redis list with LPUSH."""
+    
+    name = SINK_REDIS
+    uses_redis = True
+    
+    def __init__(self, get_client: Callable[[], Any], key: str):
+        """
+        Initialize the sink.
+        
+        Args:
+            get_client: Returns the current Redis client (it changes on failover)
+            key: List key
+        """
+        self.get_client = get_client
+        self.key = key
+    
+    async def push(
+        self,
+        entries: List[str],
+        sample_depth: bool = False,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Optional[int]:
+        """Push entries, sampling the list length in the same round trip."""
+        client = self.get_client()
+        if not sample_depth and not register:
+            await client.lpush(self.key, *entries)
+            return None
+        
+        pipe = client.pipeline(transaction=False)
+        _register(pipe, register)
+        pipe.lpush(self.key, *entries)
+        if sample_depth:
+            pipe.llen(self.key)
+        results = await pipe.execute()
+        return results[-1] if sample_depth else None
+
+
+class RedisStreamSink(Sink):
+    """Sink appending entries to a Redis stream with XADD."""
+    
+    name = SINK_REDIS_STREAM
+    uses_redis = True
+    
+    def __init__(self, get_client: Callable[[], Any], key: str, maxlen: int = 0):
+        """
+        Initialize the sink.
+        
+        Args:
+            get_client: Returns the current Redis client (it changes on failover)
+            key: Stream key
+            maxlen: Approximate stream length cap (0 for no cap)
+        """
+        self.get_client = get_client
+        self.key = key
+        self.maxlen = maxlen or None
+    
+    async def push(
+        self,
+        entries: List[str],
+        sample_depth: bool = False,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Optional[int]:
+        """Append entries as {"data": entry} messages in one pipeline."""
+        pipe = self.get_client().pipeline(transaction=False)
+        _register(pipe, register)
+        for entry in entries:
+            pipe.xadd(self.key, {'data': entry}, maxlen=self.maxlen, approximate=True)
+        if sample_depth:
+            pipe.xlen(self.key)
+        results = await pipe.execute()
+        return results[-1] if sample_depth else None
+
+
+class FileSink(Sink):
+    """
+    Sink appending entries to a rotating NDJSON file.
+    
+    When the file would grow past `max_bytes` it is renamed to path.1,
+    older files shift to path.2 and so on, keeping `backups` of them.
+    """
+    
+    name = SINK_FILE
+    
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, backups: int = 5):
+        """
+        Initialize the sink.
+        
+        Args:
+            path: Path of the NDJSON file
+            max_bytes: Size at which the file is rotated
+            backups: Number of rotated files to keep
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file: Optional[TextIO] = None
+        self._size = 0
+    
+    async def push(
+        self,
+        entries: List[str],
+        sample_depth: bool = False,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Optional[int]:
+        """Append entries, one JSON document per line."""
+        await asyncio.to_thread(self._write, "\n".join(entries) + "\n")
+        return None
+    
+    def _write(self, data: str) -> None:
+        """Write data, rotating the file first if it would grow too large."""
+        if self._file is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._size = self._file.tell()
+        
+        size = len(data.encode("utf-8"))
+        if self._size and self._size + size > self.max_bytes:
+            self._rotate()
+        
+        self._file.write(data)
+        self._file.flush()
+        self._size += size
+    
+    def _rotate(self) -> None:
+        """Shift rotated files and start a new one."""
+        self._file.close()
+        self._file = None
+        
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.unlink(self.path)
+        
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+    
+    async def close(self) -> None:
+        """Close the current file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StdoutSink(Sink):
+    """Sink writing entries to stdout as NDJSON."""
+    
+    name = SINK_STDOUT
+    
+    def __init__(self, stream: Optional[TextIO] = None):
+        """
+        Initialize the sink.
+        
+        Args:
+            stream: Stream to write to (defaults to sys.stdout)
+        """
+        self.stream = stream
+    
+    async def push(
+        self,
+        entries: List[str],
+        sample_depth: bool = False,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Optional[int]:
+        """Write entries, one JSON document per line."""
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(entries) + "\n")
+        stream.flush()
+        return None
+
+
+class NullSink(Sink):
+    """Sink discarding everything, for measuring the pipeline without I/O."""
+    
+    name = SINK_NULL
+    
+    async def push(
+        self,
+        entries: List[str],
+        sample_depth: bool = False,
+        register: Optional[Tuple[str, Dict[int, str]]] = None
+    ) -> Optional[int]:
+        """Discard entries."""
+        return None
+
+
+def create_sink(config: Any, get_client: Callable[[], Any], queue_key: str) -> Sink:
+    """
+    Create the sink selected in the node configuration.
+    
+    Args:
+        config: Node configuration
+        get_client: Returns the current Redis client, for Redis sinks
+        queue_key: Key of the central queue
+    
+    Returns:
+        Sink instance
+    
+    Raises:
+        ValueError: If the sink type is unknown
+    """
+    if config.sink == SINK_REDIS:
+        return RedisListSink(get_client, queue_key)
+    if config.sink == SINK_REDIS_STREAM:
+        return RedisStreamSink(get_client, config.sink_stream_key, config.sink_stream_maxlen)
+    if config.sink == SINK_FILE:
+        return FileSink(config.sink_path, config.sink_max_bytes, config.sink_backups)
+    if config.sink == SINK_STDOUT:
+        return StdoutSink()
+    if config.sink == SINK_NULL:
+        return NullSink()
+    raise ValueError(f"Unknown sink: {config.sink}")
@@ -0,0 +1,98 @@
+"""
+Tests for checkpoint functionality.
+
+This module contains unit tests for the CheckpointFile and StateFile classes.
+"""
+
+import json
+import os
+import stat
+import tempfile
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.checkpoint import CheckpointFile, StateFile
+
+
+class TestCheckpointFile:
+    """Test cases for CheckpointFile class."""
+    
+    @pytest.fixture
+    def path(self):
+        """Create a path for a checkpoint file in a temporary directory."""
+        directory = tempfile.mkdtemp()
+        yield os.path.join(directory, "checkpoint.json")
+        for name in os.listdir(directory):
+            os.unlink(os.path.join(directory, name))
+        os.rmdir(directory)
+    
+    def test_save_and_load(self, path):
+        """Test that a saved position is loaded back."""
+        checkpoint = CheckpointFile(path, "node-1")
+        
+        assert checkpoint.load() is None
+        
+        checkpoint.save(1234)
+        checkpoint.save(5678)
+        
+        assert CheckpointFile(path, "node-1").load() == 5678
+        # No temporary files are left behind
+        assert os.listdir(os.path.dirname(path)) == ["checkpoint.json"]
+    
+    def test_ignores_other_node(self, path):
+        """Test that a checkpoint written by another node is ignored."""
+        CheckpointFile(path, "node-1").save(1234)
+        
+        assert CheckpointFile(path, "node-2").load() is None
+    
+    def test_ignores_corrupt_file(self, path):
+        """Test that unreadable or invalid checkpoints are ignored."""
+        with open(path, 'w') as f:
+            f.write("{not json")
+        assert CheckpointFile(path, "node-1").load() is None
+        
+        with open(path, 'w') as f:
+            json.dump({'node_id': 'node-1', 'position': -5}, f)
+        assert CheckpointFile(path, "node-1").load() is None
+    
+    def test_directory_synced(self, path, monkeypatch):
+        """Test that the directory is fsynced after the rename and after a removal."""
+        synced = []
+        fsync = os.fsync
+        
+        def record(fd):
+            synced.append(stat.S_ISDIR(os.fstat(fd).st_mode))
+            fsync(fd)
+        
+        monkeypatch.setattr(os, "fsync", record)
+        CheckpointFile(path, "node-1").save(1234)
+        assert synced == [False, True]
+        
+        state_path = path + ".state"
+        StateFile(state_path, "node-1").save({})
+        StateFile(state_path, "node-1").take()
+        assert synced[2:] == [False, True, True]
+    
+    def test_state_file_taken_once(self, path):
+        """Test that a saved state is returned once and the file removed."""
+        StateFile(path, "node-1").save({'buffer': [{'email': "a"}], 'position': 10})
+        
+        assert StateFile(path, "node-2").take() is None
+        assert os.path.exists(path)
+        
+        state = StateFile(path, "node-1").take()
+        assert state == {'buffer': [{'email': "a"}], 'position': 10}
+        assert not os.path.exists(path)
+        assert StateFile(path, "node-1").take() is None
+        
+        with open(path, 'w') as f:
+            f.write("{not json")
+        assert StateFile(path, "node-1").take() is None
+        assert not os.path.exists(path)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -83,6 +83,48 @@ class TestNodeConfig:
                 log_level="INVALID"
             )
     
+    def test_invalid_backpressure_thresholds(self):
+        """Test validation of backpressure thresholds."""
+        with pytest.raises(ValueError, match="BACKPRESSURE_CRITICAL_DEPTH must not be below"):
+            NodeConfig(
+                node_id="test-001",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/var/lib/marzban-node/access.log",
+                backpressure_degraded_depth=1000,
+                backpressure_critical_depth=500
+            )
+    
+    def test_invalid_relay_address(self):
+        """Test validation of relay addresses."""
+        with pytest.raises(ValueError, match="RELAY_LISTEN must start with"):
+            NodeConfig(
+                node_id="test-001",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/var/lib/marzban-node/access.log",
+                relay_listen="0.0.0.0:7380"
+            )
+        
+        with pytest.raises(ValueError, match="RELAY_URL must start with"):
+            NodeConfig(
+                node_id="test-001",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/var/lib/marzban-node/access.log",
+                relay_url="redis://relay:7380"
+            )
+        
+        with pytest.raises(ValueError, match="IDEMPOTENT_DELIVERY cannot be used with RELAY_URL"):
+            NodeConfig(
+                node_id="test-001",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/var/lib/marzban-node/access.log",
+                relay_url="tcp://relay:7380",
+                idempotent_delivery=True
+            )
+    
     def test_log_level_normalization(self):
         """Test log level case normalization."""
         config = NodeConfig(
@@ -213,6 +255,88 @@ LOG_LEVEL=DEBUG
         
         assert position_key == "node_agent:test-node-123:position"
         assert queue_key == "node_logs_queue"
+        
+        # Cluster mode keeps both keys in the same hash slot
+        assert ConfigService.get_redis_queue_key(hash_tag=True) == "{node_logs_queue}"
+        assert (ConfigService.get_redis_position_key("test-node-123", hash_tag=True)
+                == "{node_logs_queue}:node_agent:test-node-123:position")
+    
+    def test_boolean_env_vars(self):
+        """Test parsing of boolean environment variables."""
+        env_vars = {
+            'NODE_ID': 'bool-test',
+            'NODE_NAME': 'Bool Test Node',
+            'CENTRAL_REDIS_URL': 'redis://localhost:6379/0',
+            'IDEMPOTENT_DELIVERY': ' Yes '
+        }
+        
+        for key, value in env_vars.items():
+            os.environ[key] = value
+        
+        try:
+            assert ConfigService.load_from_env().idempotent_delivery is True
+            
+            os.environ['IDEMPOTENT_DELIVERY'] = 'off'
+            assert ConfigService.load_from_env().idempotent_delivery is False
+            
+            os.environ['IDEMPOTENT_DELIVERY'] = ''
+            assert ConfigService.load_from_env().idempotent_delivery is False
+        
+        finally:
+            for key in env_vars:
+                os.environ.pop(key, None)
+    
+    def test_fallback_urls(self):
+        """Test parsing of the fallback endpoint list."""
+        env_vars = {
+            'NODE_ID': 'fallback-test',
+            'NODE_NAME': 'Fallback Test Node',
+            'CENTRAL_REDIS_URL': 'redis+sentinel://s1:26379,s2:26379/mymaster/0',
+            'CENTRAL_REDIS_FALLBACK_URLS': ' redis://backup1:6379/0, ,redis://backup2:6379/0 '
+        }
+        
+        for key, value in env_vars.items():
+            os.environ[key] = value
+        
+        try:
+            config = ConfigService.load_from_env()
+            
+            assert config.central_redis_fallback_urls == [
+                'redis://backup1:6379/0',
+                'redis://backup2:6379/0'
+            ]
+        
+        finally:
+            for key in env_vars:
+                os.environ.pop(key, None)
+    
+    def test_filter_settings(self):
+        """Test parsing and validation of filter settings."""
+        env_vars = {
+            'NODE_ID': 'filter-test',
+            'NODE_NAME': 'Filter Test Node',
+            'CENTRAL_REDIS_URL': 'redis://localhost:6379/0',
+            'FILTER_EXCLUDE_INBOUNDS': 'API, VLESS TCP HEALTH ,',
+            'FILTER_EXCLUDE_EMAIL': '^monitor-'
+        }
+        
+        for key, value in env_vars.items():
+            os.environ[key] = value
+        
+        try:
+            config = ConfigService.load_from_env()
+            
+            assert config.filter_include_inbounds == []
+            assert config.filter_exclude_inbounds == ['API', 'VLESS TCP HEALTH']
+            assert config.filter_exclude_email == '^monitor-'
+            
+            os.environ['FILTER_INCLUDE_EMAIL'] = '(unclosed'
+            with pytest.raises(ValueError, match="FILTER_INCLUDE_EMAIL"):
+                ConfigService.load_from_env()
+        
+        finally:
+            for key in list(env_vars) + ['FILTER_INCLUDE_EMAIL']:
+                os.environ.pop(key, None)
     
     def test_whitespace_handling(self):
         """Test proper handling of whitespace in environment variables."""
@@ -0,0 +1,206 @@
+"""
+Tests for central consumer functionality.
+
+This module contains unit tests for batch decoding, the sliding-window
+distinct IP index and the consumer loop.
+"""
+
+import json
+import pytest
+import os
+from unittest.mock import AsyncMock
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.consumer import Consumer, ListSource, SlidingWindowIPs, StreamSource, decode_batch, parse_args
+
+
+def entry(email: str, ip: str, timestamp: float) -> str:
+    """Serialize a log entry as the forwarder does."""
+    return json.dumps({'email': email, 'client_ip': ip, 'timestamp': timestamp, 'node_id': "node-1"})
+
+
+class TestDecodeBatch:
+    """Test cases for decode_batch function."""
+    
+    def test_whole_batch(self):
+        """Test decoding a well-formed batch in one go."""
+        assert decode_batch([entry("a", "10.0.0.1", 1.0), entry("b", "10.0.0.2", 2.0)])[1]['email'] == "b"
+    
+    def test_skips_malformed_entries(self):
+        """Test that one malformed entry does not lose the batch."""
+        entries = decode_batch([entry("a", "10.0.0.1", 1.0), "{broken", entry("b", "10.0.0.2", 2.0)])
+        
+        assert [e['email'] for e in entries] == ["a", "b"]
+
+
+class TestSlidingWindowIPs:
+    """Test cases for SlidingWindowIPs class."""
+    
+    def test_counts_distinct_ips(self):
+        """Test that repeated IPs count once per user."""
+        index = SlidingWindowIPs(window=60, bucket_seconds=10)
+        
+        assert index.add("user", "10.0.0.1", 1000) == 1
+        assert index.add("user", "10.0.0.1", 1001) == 1
+        assert index.add("user", "10.0.0.2", 1015) == 2
+        assert index.add("other", "10.0.0.1", 1015) == 1
+        assert index.users == 2
+    
+    def test_ips_expire_with_their_buckets(self):
+        """Test that an IP leaves the window with the last bucket containing it."""
+        index = SlidingWindowIPs(window=60, bucket_seconds=10)
+        index.add("user", "10.0.0.1", 1000)
+        index.add("user", "10.0.0.2", 1000)
+        index.add("user", "10.0.0.1", 1030)
+        
+        # The first bucket expires; 10.0.0.1 is still in a live bucket
+        index.add("user", "10.0.0.3", 1065)
+        assert sorted(index.ips("user")) == ["10.0.0.1", "10.0.0.3"]
+        
+        # Everything but the newest bucket expires, and idle users are dropped
+        index.add("other", "10.0.0.9", 1500)
+        assert index.distinct_ips("user") == 0
+        assert index.users == 1
+        assert len(index._buckets) == 1
+    
+    def test_late_events_ignored(self):
+        """Test that events older than the window are not counted."""
+        index = SlidingWindowIPs(window=60, bucket_seconds=10)
+        index.add("user", "10.0.0.1", 1000)
+        
+        assert index.add("user", "10.0.0.2", 900) == 1
+        assert index.late_events == 1
+        
+        # Out-of-order events within the window still count
+        assert index.add("user", "10.0.0.3", 960) == 2
+
+
+class TestListSource:
+    """Test cases for ListSource class."""
+    
+    @pytest.mark.asyncio
+    async def test_bulk_pop_then_block(self):
+        """Test that batches are popped in bulk and blocking only happens when empty."""
+        client = AsyncMock()
+        client.rpop.side_effect = [["a", "b"], None]
+        client.brpop.return_value = ("queue", "c")
+        source = ListSource(client, "queue", count=500)
+        
+        assert await source.fetch() == ["a", "b"]
+        client.rpop.assert_called_with("queue", 500)
+        client.brpop.assert_not_called()
+        
+        assert await source.fetch() == ["c"]
+        client.brpop.assert_called_once_with(["queue"], timeout=1.0)
+
+
+class TestStreamSource:
+    """Test cases for StreamSource class."""
+    
+    @pytest.mark.asyncio
+    async def test_pending_entries_first_then_ack(self):
+        """Test that pending entries are replayed before new ones and acknowledged."""
+        client = AsyncMock()
+        client.xreadgroup.side_effect = [
+            [["stream", [("1-0", {'data': "old"})]]],
+            [["stream", []]],
+            [["stream", [("2-0", {'data': "new"})]]],
+        ]
+        source = StreamSource(client, "stream", "group", "consumer-1")
+        
+        assert await source.fetch() == ["old"]
+        await source.ack()
+        client.xack.assert_called_once_with("stream", "group", "1-0")
+        client.xgroup_create.assert_called_once_with("stream", "group", id="0", mkstream=True)
+        
+        assert await source.fetch() == []
+        assert await source.fetch() == ["new"]
+        cursors = [call.args[2]["stream"] for call in client.xreadgroup.call_args_list]
+        assert cursors == ["0", "0", ">"]
+        assert client.xreadgroup.call_args.kwargs['block'] == 1000
+    
+    @pytest.mark.asyncio
+    async def test_raw_replies(self):
+        """Test reading from a client returning bytes."""
+        client = AsyncMock()
+        client.xreadgroup.return_value = [[b"stream", [(b"1-0", {b'data': b"\x81\xa1a\x01"})]]]
+        source = StreamSource(client, "stream", "group", "consumer-1")
+        
+        assert await source.fetch() == [b"\x81\xa1a\x01"]
+
+
+class TestConsumer:
+    """Test cases for Consumer class."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a mocked Redis client."""
+        client = AsyncMock()
+        client.hgetall.return_value = {}
+        return client
+    
+    def make_consumer(self, client, items, **kwargs):
+        """Create a consumer reading one batch of items from a list."""
+        client.rpop.side_effect = [items]
+        return Consumer(client, ListSource(client, "queue"), SlidingWindowIPs(60, 10), **kwargs)
+    
+    @pytest.mark.asyncio
+    async def test_flags_user_over_limit(self, client):
+        """Test that users over the limit are written to the result hash."""
+        items = [entry("sharer", f"10.0.0.{i}", 1000 + i) for i in range(4)]
+        items += [entry("normal", "10.0.1.1", 1000), "not json"]
+        consumer = self.make_consumer(client, items, ip_limit=3)
+        
+        assert await consumer.step() == 6
+        
+        mapping = client.hset.call_args.kwargs['mapping']
+        assert list(mapping) == ["sharer"]
+        flagged = json.loads(mapping["sharer"])
+        assert flagged['distinct_ips'] == 4
+        assert flagged['limit'] == 3
+        assert sorted(flagged['ips']) == [f"10.0.0.{i}" for i in range(4)]
+        assert client.hset.call_args.args == ("ip_limit_violations",)
+        
+        stats = consumer.get_stats()
+        assert stats['events'] == 5
+        assert stats['decode_errors'] == 1
+        assert stats['violations'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_per_user_limits(self, client):
+        """Test that per-user limits override the default."""
+        client.hgetall.return_value = {"vip": "10", "family": "2"}
+        items = [entry(user, f"10.0.0.{i}", 1000) for user in ("vip", "family") for i in range(3)]
+        consumer = self.make_consumer(client, items, ip_limit=1, limits_key="ip_limits")
+        
+        await consumer.step()
+        
+        client.hgetall.assert_called_once_with("ip_limits")
+        assert list(client.hset.call_args.kwargs['mapping']) == ["family"]
+    
+    @pytest.mark.asyncio
+    async def test_recovered_users_cleared(self, client):
+        """Test that users back within their limit leave the result hash."""
+        items = [entry("sharer", f"10.0.0.{i}", 1000) for i in range(3)]
+        consumer = self.make_consumer(client, items, ip_limit=2)
+        await consumer.step()
+        
+        # The window moves on and the old connections expire
+        consumer.index.add("sharer", "10.0.0.1", 1200)
+        await consumer._clear_recovered()
+        
+        client.hdel.assert_called_once_with("ip_limit_violations", "sharer")
+        assert consumer.get_stats()['users_over_limit'] == 0
+    
+    def test_parse_args_requires_a_limit(self):
+        """Test that running without any limit is rejected."""
+        with pytest.raises(SystemExit):
+            parse_args([])
+        assert parse_args(["--ip-limit", "3"]).window == 300.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,91 @@
+"""
+Tests for the flush deadline.
+
+This module contains unit tests for the FlushDeadline class, run against a
+controllable clock.
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.deadline import FlushDeadline
+
+
+class FakeClock:
+    """Clock that only moves when slept on."""
+    
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    
+    def __call__(self):
+        return self.now
+    
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class TestFlushDeadline:
+    """Test cases for FlushDeadline class."""
+    
+    @pytest.mark.asyncio
+    async def test_idle_does_not_wake(self):
+        """Test that wait() blocks without sleeping while nothing is armed."""
+        clock = FakeClock()
+        deadline = FlushDeadline(1.0, clock, clock.sleep)
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(deadline.wait(), 0.05)
+        
+        assert clock.sleeps == []
+        assert deadline.wakeups == 0
+    
+    @pytest.mark.asyncio
+    async def test_deadline_from_first_arm(self):
+        """Test that the deadline is set by the first arm() and kept by later ones."""
+        clock = FakeClock()
+        deadline = FlushDeadline(1.0, clock, clock.sleep)
+        
+        clock.now = 0.3
+        deadline.arm()
+        clock.now = 0.9
+        deadline.arm()
+        await deadline.wait()
+        
+        assert clock.now == pytest.approx(1.3)
+        assert deadline.deadline is None
+        assert deadline.wakeups == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancel_and_rearm(self):
+        """Test that a sleep for a cancelled deadline never overshoots the next one."""
+        clock = FakeClock()
+        deadline = FlushDeadline(1.0, clock, clock.sleep)
+        deadline.arm()
+        
+        async def sleep(delay):
+            if not clock.sleeps:
+                # While sleeping, a size-triggered flush empties the buffer
+                # and a new entry arrives
+                clock.now = 0.2
+                deadline.cancel()
+                clock.now = 0.4
+                deadline.arm()
+                clock.now = 0.0
+            await FakeClock.sleep(clock, delay)
+        
+        deadline._sleep = sleep
+        await deadline.wait()
+        
+        assert clock.now == pytest.approx(1.4)
+        assert clock.sleeps == [pytest.approx(1.0), pytest.approx(0.4)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,201 @@
+"""
+Tests for email dictionary encoding.
+
+This module contains unit tests for the EmailDictionary and EmailDecoder
+classes and their use by the forwarder and the consumer.
+"""
+
+import json
+import pytest
+import os
+from unittest.mock import AsyncMock, MagicMock
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.consumer import Consumer, ListSource, SlidingWindowIPs
+from node_agent.email_dictionary import EmailDecoder, EmailDictionary
+from node_agent.log_forwarder import LogForwarder
+
+
+def mock_pipeline(client, results):
+    """Attach a pipeline returning the given results to a mocked client."""
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=results)
+    client.pipeline = MagicMock(return_value=pipe)
+    return pipe
+
+
+class TestEmailDictionary:
+    """Test cases for EmailDictionary class."""
+    
+    def test_encode_assigns_ids_once(self):
+        """Test that each email gets one id, pending until registered."""
+        dictionary = EmailDictionary()
+        
+        assert dictionary.encode("alice") == 1
+        assert dictionary.encode("bob") == 2
+        assert dictionary.encode("alice") == 1
+        assert dictionary.pending == {1: "alice", 2: "bob"}
+        
+        dictionary.registered({1: "alice"})
+        assert dictionary.pending == {2: "bob"}
+    
+    def test_load_keeps_registered_ids(self):
+        """Test that ids registered by a previous run are reused."""
+        dictionary = EmailDictionary()
+        
+        assert dictionary.load({"1": "alice", "7": "bob"}) == 0
+        
+        assert dictionary.encode("bob") == 7
+        assert dictionary.encode("carol") == 8
+        assert dictionary.pending == {8: "carol"}
+    
+    def test_load_merges_local_ids(self):
+        """Test merging with another endpoint's hash after a failover."""
+        dictionary = EmailDictionary()
+        for email in ("alice", "bob", "carol"):
+            dictionary.encode(email)
+        
+        # The endpoint knows alice, and has id 2 registered for someone else
+        conflicts = dictionary.load({"1": "alice", "2": "dave"})
+        
+        assert conflicts == 1
+        assert dictionary.pending == {3: "carol"}
+        assert dictionary.encode("bob") == 4
+        assert dictionary.encode("dave") == 2
+
+
+class TestEmailDecoder:
+    """Test cases for EmailDecoder class."""
+    
+    @pytest.mark.asyncio
+    async def test_resolves_ids_per_node(self):
+        """Test that misses are fetched per node and then served from the cache."""
+        client = MagicMock()
+        pipe = mock_pipeline(client, [[["alice", None], ["alice"]]])
+        decoder = EmailDecoder(client)
+        entries = [
+            {'node_id': "n1", 'email_id': 1},
+            {'node_id': "n1", 'email_id': 2},
+            {'node_id': "n2", 'email_id': 1},
+            {'node_id': "n1", 'email': "plain"},
+        ]
+        
+        assert await decoder.decode(entries) == 1
+        
+        pipe.hmget.assert_any_call("node_agent:n1:emails", 1, 2)
+        pipe.hmget.assert_any_call("node_agent:n2:emails", 1)
+        assert [entry.get('email') for entry in entries] == ["alice", None, "alice", "plain"]
+        
+        again = [{'node_id': "n1", 'email_id': 1}]
+        assert await decoder.decode(again) == 0
+        assert again[0]['email'] == "alice"
+        assert pipe.execute.call_count == 1
+        assert decoder.get_stats()['email_cache_hits'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        """Test that the least recently used mapping is evicted first."""
+        decoder = EmailDecoder(MagicMock(), cache_size=2)
+        decoder._remember(("n1", 1), "a")
+        decoder._remember(("n1", 2), "b")
+        await decoder.decode([{'node_id': "n1", 'email_id': 1}])
+        decoder._remember(("n1", 3), "c")
+        
+        assert list(decoder._cache) == [("n1", 1), ("n1", 3)]
+
+
+class TestDictionaryEncoding:
+    """Test cases for encoding in the forwarder and decoding in the consumer."""
+    
+    @pytest.fixture
+    def config(self):
+        """Create test configuration with dictionary encoding."""
+        return NodeConfig(
+            node_id="test-node",
+            node_name="Test Node",
+            central_redis_url="redis://localhost:6379/0",
+            access_log_path="/tmp/test_access.log",
+            email_dictionary=True
+        )
+    
+    @pytest.mark.asyncio
+    async def test_forwarder_registers_new_ids_with_batch(self, config):
+        """Test that new mappings go out in the batch's pipeline, once."""
+        forwarder = LogForwarder(config)
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.hgetall.return_value = {"1": "alice@example.com"}
+        pipe = mock_pipeline(forwarder.redis_client, [[1, 1]])
+        
+        forwarder.log_buffer = [
+            {'email': "alice@example.com", 'client_ip': "10.0.0.1"},
+            {'email': "bob@example.com", 'client_ip': "10.0.0.2"},
+        ]
+        await forwarder._flush_batch()
+        
+        forwarder.redis_client.hgetall.assert_called_once_with("node_agent:test-node:emails")
+        pipe.hsetnx.assert_called_once_with("node_agent:test-node:emails", 2, "bob@example.com")
+        pushed = [json.loads(item) for item in pipe.lpush.call_args.args[1:]]
+        assert pushed == [
+            {'client_ip': "10.0.0.1", 'email_id': 1},
+            {'client_ip': "10.0.0.2", 'email_id': 2},
+        ]
+        
+        # Known emails go out without registering anything
+        forwarder.log_buffer = [{'email': "bob@example.com", 'client_ip': "10.0.0.3"}]
+        await forwarder._flush_batch()
+        assert json.loads(forwarder.redis_client.lpush.call_args.args[1]) == {'client_ip': "10.0.0.3", 'email_id': 2}
+        assert forwarder.get_stats()['email_dictionary_pending'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_mapping_kept_pending_after_failure(self, config):
+        """Test that a failed batch keeps its emails and its mappings pending."""
+        config.max_retries = 1
+        forwarder = LogForwarder(config)
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.hgetall.return_value = {}
+        mock_pipeline(forwarder.redis_client, [Exception("Redis error")])
+        
+        forwarder.log_buffer = [{'email': "alice@example.com", 'client_ip': "10.0.0.1"}]
+        await forwarder._flush_batch()
+        
+        assert forwarder.log_buffer == [{'email': "alice@example.com", 'client_ip': "10.0.0.1"}]
+        assert forwarder.email_dictionary.pending == {1: "alice@example.com"}
+    
+    def test_relays_rejected(self):
+        """Test that dictionary encoding cannot be combined with relays."""
+        with pytest.raises(ValueError, match="EMAIL_DICTIONARY"):
+            NodeConfig(
+                node_id="test-node",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/tmp/test_access.log",
+                relay_url="tcp://relay:7380",
+                email_dictionary=True
+            )
+    
+    @pytest.mark.asyncio
+    async def test_consumer_decodes_ids(self):
+        """Test that the consumer indexes encoded entries by email."""
+        client = AsyncMock()
+        client.rpop.side_effect = [[
+            json.dumps({'node_id': "n1", 'email_id': 1, 'client_ip': f"10.0.0.{i}", 'timestamp': 1000})
+            for i in range(3)
+        ]]
+        mock_pipeline(client, [[["alice"]]])
+        consumer = Consumer(
+            client, ListSource(client, "queue"), SlidingWindowIPs(60, 10), ip_limit=2,
+            decoder=EmailDecoder(client)
+        )
+        
+        await consumer.step()
+        
+        assert consumer.index.distinct_ips("alice") == 3
+        assert list(client.hset.call_args.kwargs['mapping']) == ["alice"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,280 @@
+"""
+Tests for Redis endpoint functionality.
+
+This module contains unit tests for Redis URL parsing and endpoint
+selection, and integration tests against local redis-server instances
+in standalone, Sentinel and Cluster configurations. The integration
+tests are skipped when redis-server is not installed.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import redis
+from redis.asyncio.cluster import RedisCluster
+from node_agent.config import NodeConfig
+from node_agent.endpoints import (
+    EndpointSelector, create_redis_client, is_cluster_url,
+    parse_cluster_url, parse_sentinel_url, redact_url
+)
+from node_agent.log_forwarder import LogForwarder
+
+
+REDIS_SERVER = shutil.which("redis-server")
+requires_redis = pytest.mark.skipif(REDIS_SERVER is None, reason="redis-server is not installed")
+
+
+class FakeClock:
+    """Controllable monotonic clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRedisUrls:
+    """Test cases for Redis URL helpers."""
+    
+    def test_parse_sentinel_url(self):
+        """Test parsing of Sentinel URLs."""
+        params = parse_sentinel_url("redis+sentinel://:secret@s1:26379,s2,s3:26380/mymaster/2")
+        
+        assert params['sentinels'] == [('s1', 26379), ('s2', 26379), ('s3', 26380)]
+        assert params['service_name'] == 'mymaster'
+        assert params['db'] == 2
+        assert params['password'] == 'secret'
+        assert params['username'] is None
+        assert not params['ssl']
+        
+        with pytest.raises(ValueError, match="service name"):
+            parse_sentinel_url("redis+sentinel://s1:26379")
+    
+    def test_parse_cluster_url(self):
+        """Test parsing of Cluster URLs."""
+        params = parse_cluster_url("rediss+cluster://user:p%40ss@c1:7000,c2:7001")
+        
+        assert params['startup_nodes'] == [('c1', 7000), ('c2', 7001)]
+        assert params['username'] == 'user'
+        assert params['password'] == 'p@ss'
+        assert params['ssl']
+        assert is_cluster_url("redis+cluster://c1:7000")
+        assert not is_cluster_url("redis://c1:7000/0")
+    
+    def test_redact_url(self):
+        """Test hiding passwords in URLs."""
+        assert redact_url("redis://:secret@host:6379/0") == "redis://:***@host:6379/0"
+        assert redact_url("redis://user:secret@h1,h2/m") == "redis://user:***@h1,h2/m"
+        assert redact_url("redis://host:6379/0") == "redis://host:6379/0"
+    
+    def test_create_redis_client_types(self):
+        """Test that the client type follows the URL scheme."""
+        assert isinstance(create_redis_client("redis+cluster://c1:7000"), RedisCluster)
+        
+        sentinel_client = create_redis_client("redis+sentinel://s1:26379/mymaster/1")
+        assert sentinel_client.connection_pool.service_name == "mymaster"
+        
+        plain_client = create_redis_client("redis://localhost:6379/0", max_connections=3)
+        assert plain_client.connection_pool.max_connections == 3
+
+
+class TestEndpointSelector:
+    """Test cases for EndpointSelector class."""
+    
+    def test_prefers_configured_order(self):
+        """Test that healthy endpoints are tried in configured order."""
+        selector = EndpointSelector(["a", "b", "c"], clock=FakeClock())
+        
+        assert selector.candidates() == ["a", "b", "c"]
+        assert selector.candidates(exclude="a") == ["b", "c"]
+    
+    def test_failed_endpoints_are_tried_last(self):
+        """Test that failed endpoints move back until their cooldown expires."""
+        clock = FakeClock()
+        selector = EndpointSelector(["a", "b", "c"], cooldown=10.0, clock=clock)
+        
+        selector.mark_failed("a")
+        assert selector.candidates() == ["b", "c", "a"]
+        
+        clock.now = 10.0
+        assert selector.candidates() == ["a", "b", "c"]
+    
+    def test_failover_count(self):
+        """Test counting of endpoint switches."""
+        selector = EndpointSelector(["a", "b"], clock=FakeClock())
+        
+        selector.switch_to("a")
+        selector.switch_to("a")
+        selector.switch_to("b")
+        
+        assert selector.current == "b"
+        assert selector.failovers == 1
+
+
+def _free_port() -> int:
+    """Get a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 10.0) -> redis.Redis:
+    """Wait until a local Redis (or Sentinel) answers PING."""
+    client = redis.Redis(port=port, decode_responses=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client.ping()
+            return client
+        except redis.ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+@pytest.fixture
+def redis_launcher():
+    """Start local redis-server processes and stop them after the test."""
+    processes = []
+    workdir = tempfile.mkdtemp()
+    
+    def launch(*args: str) -> int:
+        port = _free_port()
+        processes.append(subprocess.Popen(
+            [REDIS_SERVER, *args, "--port", str(port), "--save", "", "--appendonly", "no", "--dir", workdir],
+            stdout=subprocess.DEVNULL
+        ))
+        return port
+    
+    yield launch, workdir
+    
+    for process in processes:
+        process.terminate()
+        process.wait()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _forwarder_config(url: str, fallbacks=None) -> NodeConfig:
+    """Create a forwarder configuration for integration tests."""
+    return NodeConfig(
+        node_id="test-node",
+        node_name="Test Node",
+        central_redis_url=url,
+        central_redis_fallback_urls=fallbacks or [],
+        access_log_path="/tmp/test_access.log",
+        max_retries=2,
+        retry_delay=0.1
+    )
+
+
+async def _push_one(forwarder: LogForwarder) -> None:
+    """Connect and push a single entry through the forwarder."""
+    await forwarder._connect_redis()
+    forwarder.log_buffer = [{'email': 'user@example.com', 'client_ip': '10.0.0.1'}]
+    forwarder.current_position = 42
+    await forwarder._flush_batch()
+    assert forwarder.log_buffer == []
+
+
+@requires_redis
+class TestRedisTopologies:
+    """Integration tests against local redis-server instances."""
+    
+    @pytest.mark.asyncio
+    async def test_fallback_endpoint(self, redis_launcher):
+        """Test that an unreachable primary falls back to the next endpoint."""
+        launch, _ = redis_launcher
+        port = launch()
+        client = _wait_ready(port)
+        
+        forwarder = LogForwarder(_forwarder_config(
+            f"redis://127.0.0.1:{_free_port()}/0",
+            [f"redis://127.0.0.1:{port}/0"]
+        ))
+        await _push_one(forwarder)
+        
+        assert forwarder.endpoints.current == f"redis://127.0.0.1:{port}/0"
+        assert client.llen("node_logs_queue") == 1
+        await forwarder.redis_client.close()
+    
+    @pytest.mark.asyncio
+    async def test_idempotent_push_drops_duplicates(self, redis_launcher):
+        """Test that a batch pushed twice under one id reaches the queue once."""
+        launch, _ = redis_launcher
+        port = launch()
+        client = _wait_ready(port)
+        
+        config = _forwarder_config(f"redis://127.0.0.1:{port}/0")
+        config.idempotent_delivery = True
+        forwarder = LogForwarder(config)
+        await forwarder._connect_redis()
+        
+        entries = [json.dumps({'n': n}) for n in range(2500)]
+        assert await forwarder._push_idempotent(1, entries, 42) == (1, 2500)
+        assert await forwarder._push_idempotent(1, entries, 42) == (0, 2500)
+        
+        assert client.llen("node_logs_queue") == 2500
+        assert client.get("node_agent:test-node:position") == "42"
+        assert 0 < client.ttl(f"node_agent:test-node:batch:{forwarder.batch_epoch}:1") <= config.dedup_ttl
+        await forwarder.redis_client.close()
+    
+    @pytest.mark.asyncio
+    async def test_sentinel(self, redis_launcher):
+        """Test pushing to the master discovered through Sentinel."""
+        launch, workdir = redis_launcher
+        master_port = launch()
+        master = _wait_ready(master_port)
+        
+        sentinel_conf = os.path.join(workdir, "sentinel.conf")
+        with open(sentinel_conf, "w") as f:
+            f.write(f"sentinel monitor mymaster 127.0.0.1 {master_port} 1\n")
+            f.write("sentinel down-after-milliseconds mymaster 1000\n")
+        sentinel_port = launch(sentinel_conf, "--sentinel")
+        sentinel = _wait_ready(sentinel_port)
+        assert sentinel.execute_command("SENTINEL", "get-master-addr-by-name", "mymaster")
+        
+        forwarder = LogForwarder(_forwarder_config(
+            f"redis+sentinel://127.0.0.1:{sentinel_port}/mymaster/0"
+        ))
+        await _push_one(forwarder)
+        
+        assert json.loads(master.lindex("node_logs_queue", 0))['email'] == 'user@example.com'
+        assert master.get("node_agent:test-node:position") == "42"
+        await forwarder.redis_client.close()
+    
+    @pytest.mark.asyncio
+    async def test_cluster(self, redis_launcher):
+        """Test pushing to a single-shard Redis Cluster with hash-tagged keys."""
+        launch, workdir = redis_launcher
+        port = launch("--cluster-enabled", "yes", "--cluster-config-file", os.path.join(workdir, "nodes.conf"))
+        node = _wait_ready(port)
+        node.execute_command("CLUSTER", "ADDSLOTS", *range(16384))
+        
+        deadline = time.monotonic() + 10
+        while "cluster_state:ok" not in node.execute_command("CLUSTER", "INFO"):
+            assert time.monotonic() < deadline, "cluster did not become ready"
+            await asyncio.sleep(0.05)
+        
+        forwarder = LogForwarder(_forwarder_config(f"redis+cluster://127.0.0.1:{port}"))
+        assert forwarder.queue_key == "{node_logs_queue}"
+        await _push_one(forwarder)
+        
+        assert node.llen("{node_logs_queue}") == 1
+        assert node.get("{node_logs_queue}:node_agent:test-node:position") == "42"
+        await forwarder.redis_client.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,117 @@
+"""
+Tests for IP enrichment.
+
+This module contains unit tests for the CidrTable and IPEnricher classes.
+"""
+
+import os
+import tempfile
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.enrichment import CidrTable, IPEnricher, open_database
+
+
+TABLE = [
+    "# network,asn,cc",
+    "10.0.0.0/8,64500,US",
+    "10.1.0.0/16 AS64501 DE",
+    "10.1.2.0/24,-,fr",
+    "192.0.2.0/24,64502",
+    "2001:db8::/32,64503,NL",
+]
+
+
+class TestCidrTable:
+    """Test cases for CidrTable class."""
+    
+    def test_most_specific_network_wins(self):
+        """Test lookups across nested and disjoint networks."""
+        table = CidrTable.from_lines(TABLE)
+        
+        assert table.lookup("10.0.0.1") == (64500, "US")
+        assert table.lookup("10.1.0.1") == (64501, "DE")
+        assert table.lookup("10.1.2.3") == (None, "FR")
+        # Back in the wider networks after a nested one ends
+        assert table.lookup("10.1.3.0") == (64501, "DE")
+        assert table.lookup("10.255.255.255") == (64500, "US")
+        assert table.lookup("192.0.2.7") == (64502, None)
+        assert table.lookup("2001:db8::1") == (64503, "NL")
+        assert table.lookup("11.0.0.0") == (None, None)
+        assert table.lookup("::1") == (None, None)
+        assert table.lookup("not an ip") == (None, None)
+        assert len(table) == 7
+    
+    def test_malformed_line_rejected(self):
+        """Test that malformed entries are reported with their line."""
+        with pytest.raises(ValueError, match="line 2"):
+            CidrTable.from_lines(["10.0.0.0/8,1,US", "10.0.0.0/33,1,US"])
+        with pytest.raises(ValueError, match="line 1"):
+            CidrTable.from_lines(["10.0.0.0/8,ASX,US"])
+    
+    def test_mmdb_requires_maxminddb(self, monkeypatch):
+        """Test that an .mmdb file without maxminddb is a configuration error."""
+        monkeypatch.setitem(sys.modules, "maxminddb", None)
+        
+        with pytest.raises(ValueError, match="maxminddb"):
+            open_database("/tmp/GeoLite2-ASN.mmdb")
+
+
+class TestIPEnricher:
+    """Test cases for IPEnricher class."""
+    
+    def test_enrich_and_cache(self):
+        """Test that fields are added and lookups are cached per IP."""
+        enricher = IPEnricher([CidrTable.from_lines(TABLE)], cache_size=2)
+        entries = [{'client_ip': ip} for ip in ("10.0.0.1", "10.0.0.1", "192.0.2.7", "11.0.0.1")]
+        
+        for entry in entries:
+            enricher.enrich(entry)
+        
+        assert entries[0] == {'client_ip': "10.0.0.1", 'asn': 64500, 'cc': "US"}
+        assert entries[2] == {'client_ip': "192.0.2.7", 'asn': 64502}
+        assert entries[3] == {'client_ip': "11.0.0.1"}
+        stats = enricher.get_stats()
+        assert (stats['enrich_cache_hits'], stats['enrich_cache_misses']) == (1, 3)
+        assert stats['enrich_cache_size'] == 2
+        assert stats['enrich_cache_hit_rate'] == 0.25
+        assert stats['enrich_unresolved'] == 1
+    
+    def test_databases_combined(self):
+        """Test that each field comes from the first database having it."""
+        asn_only = CidrTable.from_lines(["10.0.0.0/8,64500"])
+        countries = CidrTable.from_lines(["10.0.0.0/8,64999,DE"])
+        entry = {'client_ip': "10.0.0.1"}
+        
+        IPEnricher([asn_only, countries]).enrich(entry)
+        
+        assert (entry['asn'], entry['cc']) == (64500, "DE")
+    
+    def test_from_config(self):
+        """Test loading the databases named in the configuration."""
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("\n".join(TABLE))
+        try:
+            options = dict(
+                node_id="test-node",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/tmp/test_access.log",
+            )
+            assert IPEnricher.from_config(NodeConfig(**options)) is None
+            
+            enricher = IPEnricher.from_config(NodeConfig(enrich_databases=[f.name], **options))
+            assert enricher._lookup("10.1.0.1") == (64501, "DE")
+            
+            with pytest.raises(ValueError, match="ENRICH_CACHE_SIZE must be positive"):
+                NodeConfig(enrich_databases=[f.name], enrich_cache_size=0, **options)
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -6,6 +6,7 @@ including Redis communication, batching, and error handling.
 """
 
 import asyncio
+import dataclasses
 import json
 import pytest
 import tempfile
@@ -17,7 +18,10 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from node_agent.config import NodeConfig
+from node_agent.deadline import FlushDeadline
+from node_agent.enrichment import IPEnricher
 from node_agent.log_forwarder import LogForwarder
+from node_agent.memory import MemoryBudget
 
 
 class TestLogForwarder:
@@ -64,7 +68,7 @@ class TestLogForwarder:
         
         with patch('redis.asyncio.from_url', return_value=mock_redis):
             await forwarder._connect_redis()
-            
+        
         assert forwarder.redis_client == mock_redis
         mock_redis.ping.assert_called_once()
     
@@ -104,6 +108,131 @@ class TestLogForwarder:
         assert log_entry['client_ip'] == '192.168.1.100'
         assert log_entry['node_id'] == 'test-node'
     
+    @pytest.mark.asyncio
+    async def test_process_log_line_enriched(self, config):
+        """Test that entries carry the ASN and country of the client IP."""
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("192.168.0.0/16,64500,DE\n")
+        config.enrich_databases = [f.name]
+        forwarder = LogForwarder(config)
+        os.unlink(f.name)
+        
+        await forwarder._process_log_line(
+            "2024/01/15 10:30:45 [info] accepted connection from 192.168.1.100 email: user@example.com"
+        )
+        
+        assert (forwarder.log_buffer[0]['asn'], forwarder.log_buffer[0]['cc']) == (64500, "DE")
+        assert forwarder.get_stats()['enrich_cache_misses'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_reload_closes_previous_enricher(self, config):
+        """Test that replacing the enrichment databases releases the old readers."""
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("192.168.0.0/16,64500,DE\n")
+        forwarder = LogForwarder(config)
+        reader = MagicMock()
+        forwarder.enricher = IPEnricher([reader])
+        
+        forwarder.apply_config(dataclasses.replace(config, enrich_databases=[f.name]))
+        os.unlink(f.name)
+        
+        reader.close.assert_called_once()
+        assert forwarder.enricher.databases[0] is not reader
+        
+        # The current one is closed on stop
+        forwarder.enricher.databases[0] = reader
+        forwarder._running = True
+        await forwarder.stop()
+        assert reader.close.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_memory_budget_degrades(self, config):
+        """Test that raw lines are dropped and reading pauses as memory runs short."""
+        config.memory_budget = 1
+        forwarder = LogForwarder(config)
+        forwarder.memory = MemoryBudget(1, baseline=0)
+        sizes = {'buffer': 0}
+        forwarder.memory.register("buffer", lambda: sizes['buffer'])
+        line = "2024/01/15 10:30:45 [info] accepted connection from 192.168.1.100 email: user@example.com"
+        await forwarder._process_log_line(line)
+        
+        forwarder.memory.limit = 1000
+        sizes['buffer'] = 750
+        forwarder._check_memory()
+        await forwarder._process_log_line(line.replace("100", "101"))
+        
+        assert [entry['raw_line'] for entry in forwarder.log_buffer] == ["", ""]
+        assert forwarder._drop_raw_lines and not forwarder._spilling
+        
+        sizes['buffer'] = 950
+        forwarder._check_memory()
+        assert forwarder._spilling
+        assert forwarder.get_stats()['memory_level'] == "spill"
+        
+        sizes['buffer'] = 0
+        forwarder._check_memory()
+        assert not forwarder._drop_raw_lines and not forwarder._spilling
+    
+    @pytest.mark.asyncio
+    async def test_memory_budget_turned_off_by_reload(self, config, monkeypatch):
+        """Test that reloading MEMORY_BUDGET=0 without a cgroup limit ends the degradation."""
+        monkeypatch.setattr("node_agent.log_forwarder.read_cgroup_limit", lambda: None)
+        monkeypatch.setattr("node_agent.log_forwarder.MEMORY_CHECK_INTERVAL", 0.01)
+        config.memory_budget = 1000
+        forwarder = LogForwarder(config)
+        forwarder.memory.register("buffer", lambda: 950)
+        forwarder._check_memory()
+        assert forwarder._spilling and forwarder._drop_raw_lines
+        forwarder._running = True
+        monitor = asyncio.create_task(forwarder._memory_monitor())
+        await asyncio.sleep(0)
+        
+        forwarder.apply_config(dataclasses.replace(config, memory_budget=0))
+        
+        assert forwarder.memory is None
+        assert not forwarder._spilling and not forwarder._drop_raw_lines
+        await asyncio.wait_for(monitor, 1.0)
+        assert 'memory_level' not in forwarder.get_stats()
+        forwarder._running = False
+    
+    @pytest.mark.asyncio
+    async def test_flush_deadline_bounds_latency(self, forwarder):
+        """Test that entries wait at most flush_interval and an idle forwarder never wakes."""
+        now = [0.0]
+        
+        async def sleep(delay):
+            now[0] += delay
+        
+        flushed_at = []
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.lpush = AsyncMock(side_effect=lambda *args: flushed_at.append(now[0]))
+        forwarder.flush_deadline = FlushDeadline(forwarder.config.flush_interval, lambda: now[0], sleep)
+        forwarder._running = True
+        scheduler = asyncio.create_task(forwarder._flush_scheduler())
+        line = "2024/01/15 10:30:45 [info] accepted connection from 192.168.1.{} email: user@example.com"
+        try:
+            await asyncio.sleep(0.01)
+            assert forwarder.flush_deadline.wakeups == 0
+            
+            # Arriving just after a flush no longer waits up to two intervals
+            for arrival in (0.3, 1.35):
+                now[0] = arrival
+                await forwarder._process_log_line(line.format(1))
+                await asyncio.sleep(0.01)
+            assert flushed_at == [pytest.approx(1.3), pytest.approx(2.35)]
+            
+            # A size-triggered flush cancels the deadline
+            for i in range(forwarder.config.batch_size):
+                await forwarder._process_log_line(line.format(i))
+            assert forwarder.flush_deadline.deadline is None
+            
+            await asyncio.sleep(0.01)
+            assert forwarder.flush_deadline.wakeups == 2
+            assert len(flushed_at) == 3
+        finally:
+            forwarder._running = False
+            scheduler.cancel()
+    
     @pytest.mark.asyncio
     async def test_process_log_line_invalid(self, forwarder):
         """Test processing invalid log line."""
@@ -167,6 +296,391 @@ class TestLogForwarder:
         assert forwarder.redis_client.lpush.call_count == 2
         assert len(forwarder.log_buffer) == 0
     
+    @pytest.mark.asyncio
+    async def test_flush_batch_with_orjson(self, config):
+        """Test that the configured serializer is used on the flush path."""
+        pytest.importorskip("orjson")
+        config.serializer = "orjson"
+        forwarder = LogForwarder(config)
+        forwarder.redis_client = AsyncMock()
+        forwarder.log_buffer = [{'test': 'data', 'n': 1}]
+        
+        await forwarder._flush_batch()
+        
+        forwarder.redis_client.lpush.assert_called_once_with(forwarder.queue_key, '{"test":"data","n":1}')
+        assert forwarder.get_stats()['serializer'] == "orjson"
+    
+    @pytest.mark.asyncio
+    async def test_flush_batch_keeps_logs_on_failure(self, forwarder):
+        """Test that a failed flush keeps logs buffered and opens the circuit."""
+        forwarder.circuit_breaker.failure_threshold = 2
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.lpush = AsyncMock(side_effect=Exception("Redis error"))
+        forwarder.log_buffer = [{'test': 'data'}]
+        
+        await forwarder._flush_batch()
+        
+        assert forwarder.log_buffer == [{'test': 'data'}]
+        assert forwarder.get_stats()['circuit_state'] == "open"
+        
+        # While the circuit is open, flushes do not touch Redis
+        await forwarder._flush_batch()
+        
+        assert forwarder.redis_client.lpush.call_count == 2
+        assert forwarder.log_buffer == [{'test': 'data'}]
+    
+    @pytest.mark.asyncio
+    async def test_restart_in_place_keeps_state(self, forwarder):
+        """Test that restarting a forwarder keeps its buffer and cursor."""
+        mock_redis = AsyncMock()
+        mock_redis.get = AsyncMock(return_value="1000")
+        
+        with patch('redis.asyncio.from_url', return_value=mock_redis):
+            await forwarder._connect_redis()
+            await forwarder._restore_position()
+        
+        forwarder.current_position = 1500
+        forwarder.log_buffer = [{'test': 'data'}]
+        
+        with patch('redis.asyncio.from_url', return_value=mock_redis), \
+                patch.object(forwarder, '_tail_logs', AsyncMock(side_effect=Exception("crash"))):
+            with pytest.raises(Exception, match="crash"):
+                await forwarder.start()
+        
+        assert mock_redis.get.call_count == 1
+        assert forwarder.current_position == 1500
+        # The buffered entry was delivered on stop rather than discarded
+        mock_redis.lpush.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_failover_to_fallback_endpoint(self, config):
+        """Test switching to a fallback endpoint when the current one goes down."""
+        config.central_redis_fallback_urls = ["redis://fallback:6379/0"]
+        config.circuit_breaker_threshold = 1
+        forwarder = LogForwarder(config)
+        
+        primary = AsyncMock()
+        primary.lpush = AsyncMock(side_effect=Exception("Redis down"))
+        fallback = AsyncMock()
+        clients = {config.central_redis_url: primary, "redis://fallback:6379/0": fallback}
+        
+        with patch('redis.asyncio.from_url', side_effect=lambda url, **kwargs: clients[url]):
+            await forwarder._connect_redis()
+            assert forwarder.redis_client is primary
+            
+            forwarder.log_buffer = [{'test': 'data'}]
+            await forwarder._flush_batch()
+        
+        assert forwarder.redis_client is fallback
+        fallback.lpush.assert_called_once()
+        assert forwarder.log_buffer == []
+        
+        stats = forwarder.get_stats()
+        assert stats['redis_endpoint'] == "redis://fallback:6379/0"
+        assert stats['redis_failovers'] == 1
+        assert stats['circuit_state'] == "closed"
+    
+    @pytest.mark.asyncio
+    async def test_idempotent_push(self, forwarder):
+        """Test pushing batches through the dedup script with sequence ids."""
+        forwarder.config.idempotent_delivery = True
+        script = AsyncMock(return_value=[1, 10])
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.register_script = MagicMock(return_value=script)
+        forwarder.current_position = 700
+        
+        forwarder.log_buffer = [{'test': 'data'}]
+        await forwarder._flush_batch()
+        forwarder.log_buffer = [{'test': 'more'}]
+        await forwarder._flush_batch()
+        
+        forwarder.redis_client.register_script.assert_called_once()
+        forwarder.redis_client.lpush.assert_not_called()
+        forwarder.redis_client.set.assert_not_called()
+        
+        first, second = script.call_args_list
+        epoch = forwarder.batch_epoch
+        assert first.kwargs['keys'] == [
+            f"node_agent:test-node:batch:{epoch}:1", forwarder.queue_key, forwarder.position_key,
+            forwarder.email_dictionary_key
+        ]
+        # No email ids to register
+        assert first.kwargs['args'][:3] == [forwarder.config.dedup_ttl, 700, 0]
+        assert json.loads(first.kwargs['args'][3]) == {'test': 'data'}
+        assert second.kwargs['keys'][0] == f"node_agent:test-node:batch:{epoch}:2"
+    
+    @pytest.mark.asyncio
+    async def test_idempotent_retry_keeps_batch_id(self, forwarder):
+        """Test that a failed batch is retried under its original id."""
+        forwarder.config.idempotent_delivery = True
+        forwarder.config.max_retries = 1
+        script = AsyncMock(side_effect=[Exception("timeout"), [0, 10], [1, 11]])
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.register_script = MagicMock(return_value=script)
+        
+        forwarder.log_buffer = [{'n': 1}, {'n': 2}]
+        await forwarder._flush_batch()
+        assert len(forwarder.log_buffer) == 2
+        
+        # New entries arrive while the failed batch is pending
+        forwarder.log_buffer.append({'n': 3})
+        await forwarder._flush_batch()
+        
+        # The first push had reached Redis, so the retry is a duplicate
+        assert forwarder.duplicate_batches == 1
+        assert forwarder.log_buffer == [{'n': 3}]
+        
+        await forwarder._flush_batch()
+        
+        seqs = [call.kwargs['keys'][0].rsplit(':', 1)[1] for call in script.call_args_list]
+        assert seqs == ['1', '1', '2']
+        assert len(script.call_args_list[1].kwargs['args']) == 5
+        assert forwarder.log_buffer == []
+    
+    @pytest.mark.asyncio
+    async def test_checkpoint_tracks_acknowledged_lines(self, forwarder):
+        """Test that checkpoints never include lines that were not delivered."""
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.lpush = AsyncMock(side_effect=[None, Exception("Redis error"), Exception("Redis error")])
+        
+        forwarder.current_position = 100
+        forwarder.log_buffer = [{'n': 1}]
+        await forwarder._flush_batch()
+        assert forwarder.acked_position == 100
+        
+        # A batch that fails stays unacknowledged even though it was read
+        forwarder.current_position = 200
+        forwarder.log_buffer = [{'n': 2}]
+        await forwarder._flush_batch()
+        assert forwarder.acked_position == 100
+        
+        await forwarder._maybe_checkpoint(force=True)
+        forwarder.redis_client.set.assert_called_with(forwarder.position_key, "100")
+    
+    @pytest.mark.asyncio
+    async def test_checkpoints_are_throttled(self, forwarder):
+        """Test that back-to-back flushes do not each write a checkpoint."""
+        forwarder.config.checkpoint_interval = 60.0
+        forwarder.config.checkpoint_bytes = 1000
+        forwarder.redis_client = AsyncMock()
+        
+        for position in (100, 200, 300):
+            forwarder.current_position = position
+            forwarder.log_buffer = [{'test': 'data'}]
+            await forwarder._flush_batch()
+        
+        assert forwarder.redis_client.set.call_count == 1
+        assert forwarder.checkpoint_position == 100
+        
+        # Enough acknowledged bytes trigger a checkpoint before the interval
+        forwarder.current_position = 1100
+        forwarder.log_buffer = [{'test': 'data'}]
+        await forwarder._flush_batch()
+        
+        forwarder.redis_client.set.assert_called_with(forwarder.position_key, "1100")
+        assert forwarder.checkpoint_position == 1100
+    
+    @pytest.mark.asyncio
+    async def test_local_checkpoint_file(self, forwarder):
+        """Test restoring from the local checkpoint file and mirroring to Redis."""
+        checkpoint_path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        forwarder.config.checkpoint_file = checkpoint_path
+        forwarder.config.checkpoint_interval = 0.001
+        restarted = LogForwarder(forwarder.config)
+        restarted.redis_client = AsyncMock()
+        
+        try:
+            restarted.current_position = 300
+            restarted.log_buffer = [{'test': 'data'}]
+            await restarted._flush_batch()
+            
+            # The first checkpoint is mirrored, later ones only go to the file
+            restarted.redis_client.set.assert_called_once_with(restarted.position_key, "300")
+            
+            await asyncio.sleep(0.01)
+            restarted.current_position = 400
+            restarted.log_buffer = [{'test': 'data'}]
+            await restarted._flush_batch()
+            assert restarted.redis_client.set.call_count == 1
+            
+            # A restart restores from the file without asking Redis
+            fresh = LogForwarder(forwarder.config)
+            fresh.redis_client = AsyncMock()
+            await fresh._restore_position()
+            
+            assert fresh.current_position == 400
+            fresh.redis_client.get.assert_not_called()
+        finally:
+            os.unlink(checkpoint_path)
+    
+    @pytest.mark.asyncio
+    async def test_reads_while_connecting(self, config):
+        """Test that lines are buffered before Redis connects and flushed after."""
+        workdir = tempfile.mkdtemp()
+        config.access_log_path = os.path.join(workdir, "access.log")
+        config.checkpoint_file = os.path.join(workdir, "checkpoint.json")
+        with open(config.access_log_path, 'w') as f:
+            f.write("2024/01/15 10:30:45 [info] accepted connection from 192.168.1.1 email: a@example.com\n")
+        forwarder = LogForwarder(config)
+        forwarder.checkpoint_file.save(0)
+        connected = asyncio.Event()
+        
+        async def slow_connect():
+            await connected.wait()
+            forwarder.redis_client = AsyncMock()
+        
+        with patch.object(forwarder, '_connect_redis', slow_connect):
+            task = asyncio.create_task(forwarder.start())
+            await asyncio.sleep(0.1)
+            
+            # Read from the local checkpoint and buffered, but not flushed yet
+            assert len(forwarder.log_buffer) == 1
+            await forwarder._flush_batch()
+            assert len(forwarder.log_buffer) == 1
+            assert forwarder.get_stats()['time_to_first_line'] is not None
+            
+            connected.set()
+            await asyncio.sleep(0)
+            await forwarder._flush_batch()
+            
+            assert forwarder.log_buffer == []
+            forwarder.redis_client.lpush.assert_called_once()
+            assert forwarder.get_stats()['time_to_first_ack'] >= forwarder.time_to_first_line
+            
+            await forwarder.stop()
+            await asyncio.gather(task, return_exceptions=True)
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_trial_does_not_block_delivery(self, forwarder):
+        """Test that a trial send cancelled mid-flight does not leave the circuit half-open."""
+        async def hang(*args):
+            await asyncio.Event().wait()
+        
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.lpush = AsyncMock(side_effect=hang)
+        forwarder.circuit_breaker.failure_threshold = 1
+        forwarder.circuit_breaker.reset_timeout = 0.0
+        forwarder.circuit_breaker.record_failure()
+        forwarder.log_buffer = [{'email': 'a@example.com', 'client_ip': '192.168.1.1'}]
+        
+        flush = asyncio.create_task(forwarder._flush_batch())
+        await asyncio.sleep(0.01)
+        assert forwarder.circuit_breaker.state == "half_open"
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        
+        forwarder.redis_client.lpush = AsyncMock()
+        await forwarder._flush_batch()
+        
+        forwarder.redis_client.lpush.assert_called_once()
+        assert forwarder.circuit_breaker.state == "closed"
+        assert forwarder.log_buffer == []
+    
+    @pytest.mark.asyncio
+    async def test_state_handed_over_on_stop(self, config):
+        """Test that a stop during an outage saves the buffer for the next start."""
+        workdir = tempfile.mkdtemp()
+        config.access_log_path = os.path.join(workdir, "access.log")
+        config.checkpoint_file = os.path.join(workdir, "checkpoint.json")
+        config.state_file = os.path.join(workdir, "state.json")
+        config.shutdown_timeout = 0.2
+        config.batch_size = 2
+        line = "2024/01/15 10:30:45 [info] accepted connection from 192.168.1.1 email: a@example.com\n"
+        with open(config.access_log_path, 'w') as f:
+            f.write(line * 2)
+        forwarder = LogForwarder(config)
+        forwarder.checkpoint_file.save(0)
+        
+        async def hang(*args):
+            await asyncio.Event().wait()
+        
+        async def connect():
+            # The server accepts the connection but never answers
+            forwarder.redis_client = AsyncMock()
+            forwarder.redis_client.lpush = AsyncMock(side_effect=hang)
+        
+        with patch.object(forwarder, '_connect_redis', connect):
+            # The tail flushes a full batch and waits for the reply
+            task = asyncio.create_task(forwarder.start())
+            await asyncio.sleep(0.1)
+            
+            await asyncio.wait_for(forwarder.stop(), 1.0)
+            await asyncio.gather(task, return_exceptions=True)
+        
+        # The interrupted batch went back to the buffer and into the state file
+        assert len(forwarder.log_buffer) == 2
+        assert os.path.exists(config.state_file)
+        
+        restarted = LogForwarder(config)
+        await restarted._restore_state()
+        
+        assert len(restarted.log_buffer) == 2
+        assert restarted.current_position == len(line) * 2
+        assert restarted.acked_position == 0
+        # The pending batch is sent again under a new id of the new epoch
+        assert restarted._pending_batch == (1,) + forwarder._pending_batch[1:]
+        assert restarted.batch_epoch != forwarder.batch_epoch
+        assert not os.path.exists(config.state_file)
+        
+        os.unlink(config.access_log_path)
+        os.unlink(config.checkpoint_file)
+        os.rmdir(workdir)
+    
+    @pytest.mark.asyncio
+    async def test_state_not_restored_after_restart_in_place(self, config):
+        """Test that state saved on a crash is consumed by the restart in place, not by a later start."""
+        workdir = tempfile.mkdtemp()
+        config.checkpoint_file = os.path.join(workdir, "checkpoint.json")
+        config.state_file = os.path.join(workdir, "state.json")
+        config.retry_delay = 0.01
+        forwarder = LogForwarder(config)
+        forwarder.checkpoint_file.save(0)
+        clients = [AsyncMock(), AsyncMock()]
+        clients[0].lpush = AsyncMock(side_effect=Exception("Redis down"))
+        
+        async def connect():
+            forwarder.redis_client = clients.pop(0)
+        
+        async def crash():
+            forwarder.log_buffer = [{'email': 'a@example.com'}]
+            forwarder.current_position = 100
+            raise Exception("crash")
+        
+        state_seen = []
+        
+        async def tail():
+            state_seen.append(os.path.exists(config.state_file))
+            await forwarder._connect_task
+            await forwarder._flush_batch()
+            await asyncio.Event().wait()
+        
+        with patch.object(forwarder, '_connect_redis', connect):
+            # The crash saves the undelivered entry in the state file
+            with patch.object(forwarder, '_tail_logs', crash):
+                with pytest.raises(Exception, match="crash"):
+                    await forwarder.start()
+            assert os.path.exists(config.state_file)
+            
+            # The restart in place delivers it, then the process is killed
+            with patch.object(forwarder, '_tail_logs', tail):
+                task = asyncio.create_task(forwarder.start())
+                await asyncio.sleep(0.1)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        
+        assert state_seen == [False]
+        assert forwarder.entries_sent == 1
+        
+        # Nothing is left for the next process to send again under stale ids
+        restarted = LogForwarder(config)
+        await restarted._restore_state()
+        assert restarted.log_buffer == []
+        assert restarted._pending_batch is None
+        assert restarted.batch_seq == 0
+        
+        os.unlink(config.checkpoint_file)
+        os.rmdir(workdir)
+    
     @pytest.mark.asyncio
     async def test_position_save_restore(self, forwarder):
         """Test file position save and restore."""
@@ -178,8 +692,8 @@ class TestLogForwarder:
         await forwarder._restore_position()
         assert forwarder.current_position == 1000
         
-        # Test save
-        forwarder.current_position = 2000
+        # Test save (of the acknowledged position)
+        forwarder.acked_position = 2000
         await forwarder._save_position()
         forwarder.redis_client.set.assert_called_with(forwarder.position_key, "2000")
     
@@ -218,6 +732,230 @@ class TestLogForwarder:
         finally:
             os.unlink(test_log_path)
     
+    @pytest.mark.asyncio
+    async def test_file_tail_waits_for_complete_lines(self, forwarder):
+        """Test that a partially written line is processed once it is complete."""
+        first = "2024/01/15 10:30:45 [info] accepted connection from 192.168.1.1 email: first@example.com\n"
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
+            test_log_path = f.name
+            f.write(first + "2024/01/15 10:30:46 [info] accepted conn")
+        
+        try:
+            forwarder.config.access_log_path = test_log_path
+            forwarder._running = True
+            
+            with patch.object(forwarder, '_process_log_line', AsyncMock()) as mock_process:
+                tail_task = asyncio.create_task(forwarder._tail_logs())
+                await asyncio.sleep(0.05)
+                
+                assert mock_process.call_count == 1
+                assert forwarder.current_position == len(first)
+                
+                with open(test_log_path, 'a') as f:
+                    f.write("ection from 192.168.1.2 email: second@example.com\n")
+                await asyncio.sleep(0.2)
+                
+                forwarder._running = False
+                tail_task.cancel()
+                
+                assert mock_process.call_count == 2
+                assert mock_process.call_args.args[0].endswith("second@example.com")
+                assert forwarder.current_position == os.path.getsize(test_log_path)
+                assert forwarder.lines_read == 2
+        
+        finally:
+            os.unlink(test_log_path)
+    
+    @pytest.mark.asyncio
+    async def test_backpressure_mode_transitions(self, forwarder):
+        """Test switching between backpressure modes with hysteresis."""
+        forwarder.config.backpressure_degraded_depth = 1000
+        forwarder.config.backpressure_critical_depth = 5000
+        
+        forwarder._update_backpressure(999)
+        assert forwarder.backpressure_mode == "normal"
+        
+        forwarder._update_backpressure(1000)
+        assert forwarder.backpressure_mode == "degraded"
+        assert forwarder._effective_batch_size() == forwarder.config.batch_size * 4
+        
+        forwarder._update_backpressure(6000)
+        assert forwarder.backpressure_mode == "critical"
+        
+        # Stays critical until drained to half the critical threshold
+        forwarder._update_backpressure(3000)
+        assert forwarder.backpressure_mode == "critical"
+        
+        forwarder._update_backpressure(2000)
+        assert forwarder.backpressure_mode == "degraded"
+        
+        forwarder._update_backpressure(600)
+        assert forwarder.backpressure_mode == "degraded"
+        
+        forwarder._update_backpressure(400)
+        assert forwarder.backpressure_mode == "normal"
+        assert forwarder._effective_batch_size() == forwarder.config.batch_size
+    
+    @pytest.mark.asyncio
+    async def test_flush_samples_queue_depth(self, forwarder):
+        """Test that queue depth is sampled in the same pipeline as the push."""
+        forwarder.config.backpressure_degraded_depth = 1000
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[1, 1500])
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.pipeline = MagicMock(return_value=pipe)
+        forwarder.log_buffer = [{'email': 'test@example.com'}]
+        
+        await forwarder._flush_batch()
+        
+        pipe.lpush.assert_called_once()
+        pipe.llen.assert_called_once_with(forwarder.queue_key)
+        forwarder.redis_client.lpush.assert_not_called()
+        assert forwarder.central_queue_depth == 1500
+        assert forwarder.get_stats()['backpressure_mode'] == "degraded"
+        
+        # The next flush within the check interval uses a plain push
+        forwarder.log_buffer = [{'email': 'test@example.com'}]
+        await forwarder._flush_batch()
+        
+        forwarder.redis_client.lpush.assert_called_once()
+        assert pipe.execute.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_degraded_modes_shrink_entries(self, forwarder):
+        """Test raw_line dropping and dedup-only buffering under backpressure."""
+        log_line = "2024/01/15 10:30:45 [info] accepted connection from 192.168.1.100 email: user@example.com"
+        
+        forwarder.backpressure_mode = "degraded"
+        await forwarder._process_log_line(log_line)
+        await forwarder._process_log_line(log_line)
+        
+        assert len(forwarder.log_buffer) == 2
+        assert forwarder.log_buffer[0]['raw_line'] == ""
+        
+        forwarder.log_buffer = []
+        forwarder.backpressure_mode = "critical"
+        await forwarder._process_log_line(log_line)
+        await forwarder._process_log_line(log_line)
+        
+        assert len(forwarder.log_buffer) == 1
+        assert forwarder.entries_deduplicated == 1
+    
+    @pytest.mark.asyncio
+    async def test_periodic_summary(self, forwarder):
+        """Test the one-line throughput summary replacing per-flush logging."""
+        forwarder.config.stats_log_interval = 10.0
+        forwarder.redis_client = AsyncMock()
+        forwarder.lines_read = 500
+        forwarder.log_buffer = [{'test': 'data'}]
+        await forwarder._flush_batch()
+        
+        summary = forwarder._format_summary()
+        
+        assert summary.startswith("Summary: 50.0 lines/s, 1 batches, 1 entries, ")
+        assert "mode normal" in summary
+        
+        # The next summary only covers the new period
+        assert forwarder._format_summary().startswith("Summary: 0.0 lines/s, 0 batches")
+        assert forwarder.get_stats()['entries_sent'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_filtered_lines_not_buffered(self, config):
+        """Test that connections dropped by the filter never reach the buffer."""
+        with tempfile.NamedTemporaryFile("w", suffix=".cidr", delete=False) as f:
+            f.write("deny 192.168.1.0/24\nallow 192.168.1.100/32\n")
+        config.filter_ip_file = f.name
+        config.filter_exclude_email = r"^probe"
+        try:
+            forwarder = LogForwarder(config)
+            for ip, email in [("192.168.1.100", "user"), ("192.168.1.5", "user"), ("10.0.0.1", "probe")]:
+                await forwarder._process_log_line(
+                    f"2024/01/15 10:30:45 [info] accepted connection from {ip} email: {email}@example.com"
+                )
+            
+            assert [entry['client_ip'] for entry in forwarder.log_buffer] == ["192.168.1.100"]
+            stats = forwarder.get_stats()
+            assert stats['filter_dropped_ip'] == 1
+            assert stats['filter_dropped_email'] == 1
+            assert "filtered 2 total" in forwarder._format_summary()
+        finally:
+            os.unlink(f.name)
+    
+    @pytest.mark.asyncio
+    async def test_heavy_hitters_published(self, config):
+        """Test that parsed connections feed the top-K and are published as a hash."""
+        config.heavy_hitters_top_k = 1
+        forwarder = LogForwarder(config)
+        for ip, email in [("10.0.0.1", "busy"), ("10.0.0.2", "busy"), ("10.0.0.3", "quiet")]:
+            await forwarder._process_log_line(
+                f"2024/01/15 10:30:45 [info] accepted connection from {ip} email: {email}@example.com"
+            )
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[1, 2, True])
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.pipeline = MagicMock(return_value=pipe)
+        
+        report = forwarder.heavy_hitters.snapshot()
+        assert await forwarder._publish_heavy_hitters(report)
+        
+        key = "node_agent:test-node:heavy_hitters"
+        assert forwarder.heavy_hitters_key == key
+        pipe.delete.assert_called_once_with(key)
+        mapping = pipe.hset.call_args.kwargs['mapping']
+        assert set(mapping) == {'_window', "busy@example.com"}
+        assert json.loads(mapping["busy@example.com"]) == {'connections': 2, 'error': 0, 'distinct_ips': 2}
+        assert json.loads(mapping['_window'])['lines'] == 3
+        pipe.expire.assert_called_once_with(key, 181)
+    
+    @pytest.mark.asyncio
+    async def test_governor_throttles_backfill_only(self, config):
+        """Test that backfill waits for the delivery caps and live traffic does not."""
+        config.governor_batches_per_second = 1.0
+        config.governor_burst = 1.0
+        forwarder = LogForwarder(config)
+        forwarder.redis_client = AsyncMock()
+        log = {'email': 'test@example.com', 'client_ip': '192.168.1.1'}
+        
+        with patch('asyncio.sleep', new=AsyncMock()) as sleep:
+            forwarder.log_buffer = [log]
+            await forwarder._flush_batch()
+            
+            # Live tail: the bucket is empty now, but nothing waits
+            forwarder.log_buffer = [log]
+            await forwarder._flush_batch()
+            sleep.assert_not_called()
+            
+            # Backfill: the tail is behind the end of the file
+            forwarder._tail_caught_up = False
+            forwarder.log_buffer = [log]
+            await forwarder._flush_batch()
+            sleep.assert_called_once()
+            assert sleep.call_args.args[0] == pytest.approx(2.0, abs=0.1)
+        
+        assert forwarder.redis_client.lpush.call_count == 3
+        stats = forwarder.get_stats()
+        assert stats['governor_batches_deferred'] == 1
+        assert stats['governor_throttle_time'] > 0
+    
+    @pytest.mark.asyncio
+    async def test_governor_reserves_once_per_batch(self, config):
+        """Test that retries of a batch do not reserve delivery tokens again."""
+        config.governor_bytes_per_second = 1000.0
+        forwarder = LogForwarder(config)
+        forwarder.redis_client = AsyncMock()
+        forwarder.redis_client.lpush.side_effect = Exception("Redis error")
+        forwarder._tail_caught_up = False
+        forwarder.governor.reserve = MagicMock(return_value=0)
+        
+        with patch('asyncio.sleep', new=AsyncMock()):
+            forwarder.log_buffer = [{'email': 'test@example.com', 'client_ip': '192.168.1.1'}]
+            await forwarder._flush_batch()
+            forwarder.redis_client.lpush.side_effect = None
+            await forwarder._flush_batch()
+        
+        assert forwarder.redis_client.lpush.call_count == config.max_retries + 1
+        forwarder.governor.reserve.assert_called_once()
+    
     def test_get_stats(self, config):
         """Test statistics retrieval."""
         forwarder = LogForwarder(config)
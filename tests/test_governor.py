@@ -0,0 +1,103 @@
+"""
+Tests for delivery governor functionality.
+
+This module contains unit tests for the TokenBucket and DeliveryGovernor
+classes.
+"""
+
+import pytest
+import os
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.governor import DeliveryGovernor, TokenBucket
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket class."""
+    
+    def test_burst_then_rate(self):
+        """Test that the burst is free and further tokens come at the rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, capacity=200, clock=clock)
+        
+        assert bucket.reserve(200) == 0
+        assert bucket.reserve(50) == pytest.approx(0.5)
+        
+        clock.now = 1.5
+        assert bucket.tokens == pytest.approx(100)
+    
+    def test_large_request_goes_into_debt(self):
+        """Test that a request over the capacity waits for its excess."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, capacity=100, clock=clock)
+        
+        assert bucket.reserve(400) == pytest.approx(3.0)
+        
+        # Refill never goes above the capacity
+        clock.now = 60
+        assert bucket.tokens == 100
+
+
+class TestDeliveryGovernor:
+    """Test cases for DeliveryGovernor class."""
+    
+    def test_disabled_by_default(self):
+        """Test that no caps means no throttling."""
+        governor = DeliveryGovernor()
+        
+        assert not governor.enabled
+        assert governor.reserve(10 ** 9) == 0
+    
+    def test_backfill_throttled_and_reported(self):
+        """Test that backfill waits for both caps and is counted."""
+        clock = FakeClock()
+        governor = DeliveryGovernor(bytes_per_second=1000, batches_per_second=1, burst=1.0, clock=clock)
+        
+        assert governor.reserve(500) == 0
+        # Within the byte budget, but the second batch in the same second
+        assert governor.reserve(500) == pytest.approx(1.0)
+        assert governor.reserve(1500) == pytest.approx(2.0)
+        
+        stats = governor.get_stats()
+        assert stats['governor_throttle_time'] == pytest.approx(3.0)
+        assert stats['governor_bytes_deferred'] == 2000
+        assert stats['governor_batches_deferred'] == 2
+    
+    def test_live_exempt_but_counted(self):
+        """Test that live batches never wait but leave less for backfill."""
+        clock = FakeClock()
+        governor = DeliveryGovernor(bytes_per_second=1000, burst=1.0, clock=clock)
+        
+        assert governor.reserve(3000, live=True) == 0
+        assert governor.reserve(100) == pytest.approx(2.1)
+        assert governor.get_stats()['governor_live_bytes'] == 3000
+    
+    def test_reconfigure(self):
+        """Test that unchanged settings keep the bucket and new ones replace it."""
+        clock = FakeClock()
+        governor = DeliveryGovernor(bytes_per_second=1000, clock=clock)
+        governor.reserve(1000)
+        
+        governor.configure(1000, 0, 1.0)
+        assert governor.bytes_bucket.tokens == 0
+        
+        governor.configure(0, 0, 1.0)
+        assert not governor.enabled
+        assert governor.get_stats()['governor_bytes_deferred'] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
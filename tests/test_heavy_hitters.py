@@ -0,0 +1,148 @@
+"""
+Tests for heavy-hitter tracking.
+
+This module contains unit tests for the HyperLogLog, SpaceSaving and
+HeavyHitters classes.
+"""
+
+import json
+import os
+import random
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.heavy_hitters import CAPACITY_FACTOR, HeavyHitters, HyperLogLog, SpaceSaving
+
+
+class TestHyperLogLog:
+    """Test cases for HyperLogLog class."""
+    
+    def test_small_cardinality_is_exact(self):
+        """Test that linear counting gives exact results for a few values."""
+        sketch = HyperLogLog()
+        for ip in ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.1"] * 10:
+            sketch.add(ip)
+        
+        assert sketch.count() == 3
+    
+    def test_large_cardinality_estimate(self):
+        """Test the estimate stays within a few standard errors."""
+        sketch = HyperLogLog(precision=10)
+        for i in range(50000):
+            sketch.add(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+        
+        assert abs(sketch.count() - 50000) / 50000 < 0.15
+    
+    def test_memory_is_fixed(self):
+        """Test that the sketch size depends only on the precision."""
+        sketch = HyperLogLog(precision=8)
+        for i in range(10000):
+            sketch.add(str(i))
+        
+        assert len(sketch.registers) == 256
+
+
+class TestSpaceSaving:
+    """Test cases for SpaceSaving class."""
+    
+    def test_exact_below_capacity(self):
+        """Test that counts are exact while every key fits."""
+        summary = SpaceSaving(3)
+        for key in "aabbbc":
+            summary.add(key)
+        
+        assert summary.top(2) == [("b", 3, 0), ("a", 2, 0)]
+    
+    def test_evicts_smallest_counter(self):
+        """Test that a new key replaces the minimum and inherits it as error."""
+        summary = SpaceSaving(2)
+        for key in "aaab":
+            summary.add(key)
+        
+        assert summary.add("c") == "b"
+        assert summary.top(2) == [("a", 3, 0), ("c", 2, 1)]
+    
+    def test_heavy_keys_survive_long_tail(self):
+        """Test the Space-Saving guarantees on a skewed stream."""
+        rng = random.Random(42)
+        stream = ["heavy-1"] * 3000 + ["heavy-2"] * 2000 + [f"user-{rng.randrange(5000)}" for _ in range(20000)]
+        rng.shuffle(stream)
+        true_counts = {}
+        summary = SpaceSaving(100)
+        for key in stream:
+            true_counts[key] = true_counts.get(key, 0) + 1
+            summary.add(key)
+        
+        top = summary.top(2)
+        assert [key for key, _, _ in top] == ["heavy-1", "heavy-2"]
+        for key, count, error in summary.top(100):
+            assert count - error <= true_counts[key] <= count
+        assert len(summary.counts) == 100
+        assert len(summary._heap) == 100
+
+
+class TestHeavyHitters:
+    """Test cases for HeavyHitters class."""
+    
+    def test_snapshot_reports_top_users(self):
+        """Test connection counts and distinct IP estimates per user."""
+        tracker = HeavyHitters(top_k=2)
+        for i in range(30):
+            tracker.add("busy@example.com", f"10.0.0.{i % 6}")
+        for i in range(10):
+            tracker.add("quiet@example.com", "10.0.1.1")
+        tracker.add("rare@example.com", "10.0.2.1")
+        
+        snapshot = tracker.snapshot()
+        
+        assert snapshot['lines'] == 41
+        assert snapshot['users'] == [
+            {'email': "busy@example.com", 'connections': 30, 'error': 0, 'distinct_ips': 6},
+            {'email': "quiet@example.com", 'connections': 10, 'error': 0, 'distinct_ips': 1},
+        ]
+    
+    def test_memory_bounded_by_top_k(self):
+        """Test that sketches are dropped along with evicted users."""
+        tracker = HeavyHitters(top_k=5, precision=4)
+        for i in range(1000):
+            tracker.add(f"user-{i}", "10.0.0.1")
+        
+        assert len(tracker.counter.counts) == 5 * CAPACITY_FACTOR
+        assert set(tracker.sketches) == set(tracker.counter.counts)
+    
+    def test_reset_starts_new_window(self):
+        """Test that a reset forgets the previous window."""
+        tracker = HeavyHitters(top_k=2)
+        tracker.add("user@example.com", "10.0.0.1")
+        started = tracker.window_start
+        
+        tracker.reset()
+        
+        assert tracker.snapshot()['users'] == []
+        assert tracker.lines == 0
+        assert tracker.window_start >= started
+
+    
+    def test_state_round_trip(self):
+        """Test that a saved window continues after a restart."""
+        tracker = HeavyHitters(top_k=2)
+        for i in range(5):
+            tracker.add("busy@example.com", f"10.0.0.{i}")
+        state = json.loads(json.dumps(tracker.get_state()))
+        
+        restored = HeavyHitters(top_k=2)
+        assert restored.set_state(state)
+        restored.add("busy@example.com", "10.0.0.9")
+        
+        assert restored.snapshot()['users'][0] == {
+            'email': "busy@example.com", 'connections': 6, 'error': 0, 'distinct_ips': 6
+        }
+        assert restored.window_start == tracker.window_start
+        assert not HeavyHitters(top_k=2, precision=4).set_state(state)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
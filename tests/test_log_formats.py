@@ -0,0 +1,194 @@
+"""
+Tests for log format detection.
+
+This module contains unit tests for the format-specific parsers and the
+LogFormatParser class choosing between them.
+"""
+
+import json
+import pytest
+import os
+import tempfile
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent import log_formats
+from node_agent.config import NodeConfig
+from node_agent.log_formats import (
+    SKIP, JsonLineParser, LogFormatParser, RegexParser, SingBoxParser, XrayTextParser, split_address
+)
+from node_agent.log_parser import LogFilter
+
+
+XRAY_LINE = (
+    "2024/01/15 10:30:45.123456 from tcp:10.0.0.1:5555 accepted tcp:www.example.com:443 "
+    "[VLESS TCP REALITY >> DIRECT] email: 1.user"
+)
+SINGBOX_LINE = (
+    "+0000 2024-01-15 10:30:45 INFO [3842527373 0ms] inbound/vless[vless-in]: "
+    "[alice] inbound connection from 10.0.0.2:5678"
+)
+JSON_LINE = json.dumps({
+    'time': "2024-01-15T10:30:45Z", 'from': "10.0.0.3:555", 'status': "accepted",
+    'email': "bob", 'inboundTag': "vmess-in"
+})
+REGEX_LINE = "2024/01/15 10:30:45 [info] accepted connection from 10.0.0.4 email: user@example.com"
+
+
+class TestFormatParsers:
+    """Test cases for the format-specific parsers."""
+    
+    def test_split_address(self):
+        """Test IP extraction from the address forms cores write."""
+        assert split_address("1.2.3.4:5678") == "1.2.3.4"
+        assert split_address("udp:1.2.3.4:53") == "1.2.3.4"
+        assert split_address("[2001:db8::1]:443") == "2001:db8::1"
+        assert split_address("2001:db8::1") == "2001:db8::1"
+        assert split_address("[info]") is None
+    
+    def test_xray_text(self):
+        """Test the positional Xray parser on current and old layouts."""
+        parser = XrayTextParser()
+        
+        parsed = parser.parse(XRAY_LINE)
+        assert (parsed.email, parsed.client_ip, parsed.inbound) == ("1.user", "10.0.0.1", "VLESS TCP REALITY")
+        assert parser.timestamp(parsed.stamp) == parser.timestamp("2024/01/15 10:30:45")
+        
+        old = parser.parse("2021/09/01 12:00:00 1.2.3.4:12345 accepted tcp:google.com:443 [in -> direct] email: old")
+        assert (old.email, old.client_ip, old.inbound) == ("old", "1.2.3.4", "in")
+        
+        # API traffic and rejections are recognized but carry nothing to forward
+        assert parser.parse("2024/01/15 10:30:46 from 127.0.0.1:6000 accepted tcp:127.0.0.1:62050 [api >> api]") == SKIP
+        assert parser.parse("2024/01/15 10:30:46 from 1.2.3.4:6000 rejected  proxy/vless: invalid request") == SKIP
+        assert parser.parse(SINGBOX_LINE) is None
+    
+    def test_json_lines(self):
+        """Test the JSON parser and its key aliases."""
+        parser = JsonLineParser()
+        
+        parsed = parser.parse(JSON_LINE)
+        assert (parsed.email, parsed.client_ip, parsed.inbound) == ("bob", "10.0.0.3", "vmess-in")
+        assert parser.timestamp(parsed.stamp) == 1705314645.0
+        
+        aliased = parser.parse(json.dumps({'ts': 1705314645000, 'source': "tcp:[::1]:80", 'user': "eve"}))
+        assert (aliased.email, aliased.client_ip) == ("eve", "::1")
+        assert parser.timestamp(aliased.stamp) == 1705314645.0
+        
+        assert parser.parse(json.dumps({'status': "rejected", 'email': "bob", 'from': "1.2.3.4"})) == SKIP
+        assert parser.parse("{truncated") is None
+        assert parser.parse(XRAY_LINE) is None
+    
+    def test_sing_box(self):
+        """Test the sing-box parser with and without timestamps."""
+        parser = SingBoxParser()
+        
+        parsed = parser.parse(SINGBOX_LINE)
+        assert (parsed.email, parsed.client_ip, parsed.inbound) == ("alice", "10.0.0.2", "vless-in")
+        assert parser.timestamp(parsed.stamp) == 1705314645.0
+        
+        bare = parser.parse("INFO [1 0ms] inbound/trojan[tr]: [carol] inbound connection from [::1]:5678")
+        assert (bare.email, bare.client_ip, parser.timestamp(bare.stamp)) == ("carol", "::1", None)
+        
+        assert parser.parse("INFO [1 0ms] outbound/direct[direct]: outbound connection to example.com:443") == SKIP
+        assert parser.parse("INFO [1 0ms] inbound/socks[in]: inbound connection from 1.2.3.4:5") == SKIP
+        assert parser.parse(XRAY_LINE) is None
+    
+    def test_regex_fallback(self):
+        """Test that the regex parser keeps the original behaviour."""
+        parser = RegexParser()
+        
+        parsed = parser.parse(REGEX_LINE)
+        assert (parsed.email, parsed.client_ip) == ("user@example.com", "10.0.0.4")
+        assert parser.parse("2024/01/15 10:30:45 [info] connection closed") == SKIP
+
+
+class TestLogFormatParser:
+    """Test cases for LogFormatParser class."""
+    
+    @pytest.mark.parametrize("line, expected", [
+        (XRAY_LINE, "xray"),
+        (SINGBOX_LINE, "sing-box"),
+        (JSON_LINE, "xray-json"),
+        (REGEX_LINE, "regex"),
+    ])
+    def test_detects_format(self, line, expected):
+        """Test that each layout is detected from sample lines."""
+        parser = LogFormatParser()
+        
+        assert parser.detect([line] * 3 + ["", "garbage line"]) == expected
+        assert parser.parse(line, "node", "Node")['client_ip'].startswith("10.0.0.")
+    
+    def test_detects_lazily_from_new_lines(self):
+        """Test that lines are parsed while the format is being detected."""
+        parser = LogFormatParser()
+        assert parser.detect([]) is None
+        
+        entry = parser.parse(SINGBOX_LINE, "node", "Node")
+        
+        assert entry['email'] == "alice"
+        assert entry['timestamp'] == 1705314645.0
+        assert parser.detecting
+        for _ in range(log_formats.DETECT_SAMPLE_LINES):
+            parser.parse(SINGBOX_LINE, "node", "Node")
+        assert parser.format == "sing-box"
+    
+    def test_detect_file(self):
+        """Test detection from the start of a file."""
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+            f.write(f"{JSON_LINE}\n{JSON_LINE}\n{JSON_LINE[:20]}")
+        try:
+            assert LogFormatParser().detect_file(f.name) == "xray-json"
+        finally:
+            os.unlink(f.name)
+    
+    def test_redetects_when_miss_rate_jumps(self, monkeypatch, caplog):
+        """Test that a format change is noticed and detected again."""
+        monkeypatch.setattr(log_formats, "MISS_WINDOW", 10)
+        parser = LogFormatParser()
+        parser.detect([XRAY_LINE])
+        
+        for _ in range(10):
+            assert parser.parse(JSON_LINE, "node", "Node") is None
+        
+        assert parser.detecting
+        assert "100% of lines not recognized as xray" in caplog.text
+        assert parser.get_stats()['parser_redetections'] == 1
+        assert parser.parse(JSON_LINE, "node", "Node")['email'] == "bob"
+    
+    def test_fixed_format_only_warns(self, monkeypatch, caplog):
+        """Test that a configured format is kept despite misses."""
+        monkeypatch.setattr(log_formats, "MISS_WINDOW", 10)
+        parser = LogFormatParser("xray")
+        
+        for _ in range(10):
+            parser.parse(JSON_LINE, "node", "Node")
+        
+        assert parser.format == "xray"
+        assert "check LOG_FORMAT" in caplog.text
+        stats = parser.get_stats()
+        assert stats['parser_misses'] == 10
+        assert stats['parser_miss_rate'] == 1.0
+    
+    def test_filter_uses_parsed_inbound(self):
+        """Test that inbound rules work for formats without Xray routing tags."""
+        parser = LogFormatParser("sing-box")
+        
+        assert parser.parse(SINGBOX_LINE, "node", "Node", LogFilter(exclude_inbounds=["vless-in"])) is None
+        assert parser.parse(SINGBOX_LINE, "node", "Node", LogFilter(include_inbounds=["vless-in"])) is not None
+    
+    def test_invalid_format_rejected(self):
+        """Test configuration validation of LOG_FORMAT."""
+        with pytest.raises(ValueError, match="LOG_FORMAT must be one of"):
+            NodeConfig(
+                node_id="test-node",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/tmp/test_access.log",
+                log_format="v2ray"
+            )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
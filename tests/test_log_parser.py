@@ -8,11 +8,19 @@ and log parsing functionality.
 import pytest
 import sys
 import os
+import time
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from node_agent.log_parser import MarzbanLogParser, create_log_entry
+from node_agent.log_parser import (
+    FILTER_ALLOW, FILTER_DENY, IPPrefixTrie, LogFilter, MarzbanLogParser, create_log_entry
+)
+
+
+def xray_line(email: str = "user@example.com", ip: str = "203.0.113.7", inbound: str = "VLESS TCP REALITY") -> str:
+    """Build an Xray access log line."""
+    return f"2024/01/15 10:30:45 from {ip}:51234 accepted tcp:example.com:443 [{inbound} >> DIRECT] email: {email}"
 
 
 class TestMarzbanLogParser:
@@ -234,5 +242,101 @@ class TestCreateLogEntry:
         assert result is None
 
 
+class TestIPPrefixTrie:
+    """Test cases for IPPrefixTrie class."""
+    
+    def test_longest_prefix_match(self):
+        """Test that the most specific prefix wins."""
+        trie = IPPrefixTrie.from_lines([
+            "# CDN ranges",
+            "deny 10.0.0.0/8",
+            "allow 10.1.0.0/16",
+            "10.1.2.0/24  # health checkers",
+            "allow 2001:db8::/32",
+            "",
+        ])
+        
+        assert trie.size == 4
+        assert trie.lookup("10.9.9.9") == FILTER_DENY
+        assert trie.lookup("10.1.9.9") == FILTER_ALLOW
+        assert trie.lookup("10.1.2.3") == FILTER_DENY
+        assert trie.lookup("2001:db8::1") == FILTER_ALLOW
+        assert trie.lookup("192.168.1.1") is None
+        assert trie.lookup("not-an-ip") is None
+    
+    def test_default_route_and_host(self):
+        """Test /0 and host prefixes."""
+        trie = IPPrefixTrie()
+        trie.insert("0.0.0.0/0", FILTER_DENY)
+        trie.insert("198.51.100.1", FILTER_ALLOW)
+        
+        assert trie.lookup("8.8.8.8") == FILTER_DENY
+        assert trie.lookup("198.51.100.1") == FILTER_ALLOW
+        assert trie.lookup("::1") is None
+    
+    def test_invalid_rules(self):
+        """Test that malformed rules report their line."""
+        for lines in (["deny 10.0.0.0/33"], ["block 10.0.0.0/8"], ["allow"]):
+            with pytest.raises(ValueError, match="line 1"):
+                IPPrefixTrie.from_lines(lines)
+
+
+class TestLogFilter:
+    """Test cases for LogFilter class."""
+    
+    def test_inbound_rules(self):
+        """Test include and exclude by inbound tag."""
+        log_filter = LogFilter(include_inbounds=["VLESS TCP REALITY", "VMESS WS"], exclude_inbounds=["VMESS WS"])
+        
+        assert create_log_entry(xray_line(), "n1", "Node", log_filter) is not None
+        assert create_log_entry(xray_line(inbound="VMESS WS"), "n1", "Node", log_filter) is None
+        assert create_log_entry(xray_line(inbound="TROJAN"), "n1", "Node", log_filter) is None
+        assert log_filter.dropped_inbound == 2
+    
+    def test_inbound_search_is_timed(self):
+        """Test that the time reported includes the inbound tag search."""
+        class SlowPattern:
+            def search(self, line):
+                time.sleep(0.01)
+                return LogFilter.INBOUND_PATTERN.search(line)
+        
+        log_filter = LogFilter(exclude_inbounds=["API"])
+        log_filter.INBOUND_PATTERN = SlowPattern()
+        
+        assert create_log_entry(xray_line(), "n1", "Node", log_filter) is not None
+        assert log_filter.filter_time >= 0.01
+        assert log_filter.lines_checked == 1
+    
+    def test_email_rules(self):
+        """Test include and exclude by email pattern."""
+        log_filter = LogFilter(include_email=r"@example\.com$", exclude_email=r"^probe-")
+        
+        assert create_log_entry(xray_line(), "n1", "Node", log_filter) is not None
+        assert create_log_entry(xray_line(email="probe-1@example.com"), "n1", "Node", log_filter) is None
+        assert create_log_entry(xray_line(email="user@other.org"), "n1", "Node", log_filter) is None
+        assert log_filter.dropped_email == 2
+    
+    def test_ip_rules(self):
+        """Test that denied client IPs are dropped after extraction."""
+        rules = IPPrefixTrie.from_lines(["deny 203.0.113.0/24", "allow 203.0.113.128/25"])
+        log_filter = LogFilter(ip_rules=rules)
+        
+        assert create_log_entry(xray_line(ip="203.0.113.7"), "n1", "Node", log_filter) is None
+        assert create_log_entry(xray_line(ip="203.0.113.200"), "n1", "Node", log_filter) is not None
+        assert create_log_entry(xray_line(ip="198.51.100.1"), "n1", "Node", log_filter) is not None
+        
+        stats = log_filter.get_stats()
+        assert stats['filter_dropped_ip'] == 1
+        assert stats['filter_dropped'] == 1
+        assert stats['filter_lines_checked'] == 3
+        assert stats['filter_time'] > 0
+    
+    def test_disabled_without_rules(self):
+        """Test that an empty filter reports itself as disabled."""
+        assert not LogFilter().enabled
+        assert not LogFilter(ip_rules=IPPrefixTrie()).enabled
+        assert LogFilter(exclude_inbounds=["API"]).enabled
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,84 @@
+"""
+Tests for logging utilities.
+
+This module contains unit tests for the RateLimitedLogger class
+and summary formatting helpers.
+"""
+
+import logging
+import pytest
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.logging_utils import RateLimitedLogger, format_bytes
+
+
+class FakeClock:
+    """Controllable monotonic clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimitedLogger:
+    """Test cases for RateLimitedLogger class."""
+    
+    def test_suppresses_repeats(self, caplog):
+        """Test that repeated messages are suppressed and counted."""
+        clock = FakeClock()
+        limited = RateLimitedLogger(logging.getLogger("test.ratelimit"), interval=10.0, clock=clock)
+        
+        with caplog.at_level(logging.ERROR, logger="test.ratelimit"):
+            for i in range(5):
+                limited.error("send", "Failed to send: %s", i)
+            
+            clock.now = 10.0
+            limited.error("send", "Failed to send: %s", "again")
+        
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages == [
+            "Failed to send: 0",
+            "Failed to send: again (4 similar messages suppressed)"
+        ]
+    
+    def test_keys_are_independent(self, caplog):
+        """Test that different keys are limited separately."""
+        limited = RateLimitedLogger(logging.getLogger("test.ratelimit"), clock=FakeClock())
+        
+        with caplog.at_level(logging.WARNING, logger="test.ratelimit"):
+            limited.warning("a", "first")
+            limited.warning("b", "second")
+            limited.warning("a", "first again")
+        
+        assert [record.getMessage() for record in caplog.records] == ["first", "second"]
+    
+    def test_disabled_level_is_not_counted(self, caplog):
+        """Test that messages below the logger level cost nothing."""
+        logger = logging.getLogger("test.ratelimit.disabled")
+        logger.setLevel(logging.CRITICAL)
+        limited = RateLimitedLogger(logger, clock=FakeClock())
+        
+        limited.error("send", "hidden")
+        
+        assert limited._state == {}
+
+
+class TestFormatBytes:
+    """Test cases for format_bytes."""
+    
+    def test_units(self):
+        """Test unit selection."""
+        assert format_bytes(512) == "512 B"
+        assert format_bytes(1536) == "1.5 KiB"
+        assert format_bytes(5 * 1024 * 1024) == "5.0 MiB"
+        assert format_bytes(3 * 1024 ** 3) == "3.0 GiB"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
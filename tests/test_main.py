@@ -0,0 +1,196 @@
+"""
+Tests for the agent entry point.
+
+This module contains unit tests for event loop selection and live
+configuration reload.
+"""
+
+import asyncio
+import dataclasses
+import logging
+import pytest
+import os
+import subprocess
+import types
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import ConfigService, NodeConfig
+from node_agent.log_forwarder import LogForwarder
+from node_agent.main import NodeAgent, setup_event_loop
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows always uses the proactor loop")
+class TestSetupEventLoop:
+    """Test cases for event loop selection."""
+    
+    @pytest.fixture(autouse=True)
+    def restore_policy(self):
+        """Restore the default event loop policy after each test."""
+        yield
+        asyncio.set_event_loop_policy(None)
+    
+    def test_default_loop(self):
+        """Test that the default loop leaves the policy alone."""
+        assert setup_event_loop("asyncio") == "asyncio"
+        assert type(asyncio.get_event_loop_policy()) is asyncio.DefaultEventLoopPolicy
+    
+    def test_uvloop_fallback(self, monkeypatch):
+        """Test the fallback when uvloop is not installed."""
+        monkeypatch.setitem(sys.modules, "uvloop", None)
+        
+        assert setup_event_loop("uvloop") == "asyncio"
+        assert type(asyncio.get_event_loop_policy()) is asyncio.DefaultEventLoopPolicy
+    
+    def test_uvloop_installed(self, monkeypatch):
+        """Test that the uvloop policy is installed when available."""
+        class FakePolicy(asyncio.DefaultEventLoopPolicy):
+            pass
+        monkeypatch.setitem(sys.modules, "uvloop", types.SimpleNamespace(EventLoopPolicy=FakePolicy))
+        
+        assert setup_event_loop("uvloop") == "uvloop"
+        assert isinstance(asyncio.get_event_loop_policy(), FakePolicy)
+
+
+class TestReloadConfig:
+    """Test cases for configuration reload on SIGHUP."""
+    
+    @pytest.fixture
+    def config(self):
+        """Create test configuration."""
+        return NodeConfig(
+            node_id="test-node",
+            node_name="Test Node",
+            central_redis_url="redis://localhost:6379/0",
+            access_log_path="/tmp/test_access.log",
+            batch_size=50
+        )
+    
+    @pytest.fixture
+    def agent(self, config):
+        """Create an agent with a forwarder holding buffered data."""
+        agent = NodeAgent(config)
+        agent.log_forwarder = LogForwarder(config)
+        agent.log_forwarder.log_buffer = [{'n': 1}]
+        agent.log_forwarder.current_position = 1234
+        return agent
+    
+    def reload_with(self, monkeypatch, agent, **changes):
+        """Reload the agent with a configuration differing by `changes`."""
+        new_config = dataclasses.replace(agent.config, **changes)
+        monkeypatch.setattr(ConfigService, "load_from_env", staticmethod(lambda *args, **kwargs: new_config))
+        return agent.reload_config(), new_config
+    
+    def test_hot_settings_applied_in_place(self, monkeypatch, agent):
+        """Test that tunable settings reach the running forwarder without losing data."""
+        forwarder = agent.log_forwarder
+        
+        reloaded, new_config = self.reload_with(
+            monkeypatch, agent,
+            batch_size=500, log_level="WARNING", filter_exclude_email="^probe", circuit_breaker_threshold=9
+        )
+        
+        assert reloaded
+        assert agent.config is new_config
+        assert agent.log_forwarder is forwarder
+        assert forwarder.config is new_config
+        assert forwarder._effective_batch_size() == 500
+        assert forwarder.log_filter is not None
+        assert forwarder.circuit_breaker.failure_threshold == 9
+        assert forwarder.log_buffer == [{'n': 1}]
+        assert forwarder.current_position == 1234
+        assert logging.getLogger().level == logging.WARNING
+    
+    def test_identity_change_rejected(self, monkeypatch, agent, caplog):
+        """Test that settings requiring a restart reject the whole reload."""
+        old_config = agent.config
+        
+        reloaded, _ = self.reload_with(
+            monkeypatch, agent, batch_size=500, node_id="other-node", access_log_path="/tmp/other.log"
+        )
+        
+        assert not reloaded
+        assert agent.config is old_config
+        assert agent.log_forwarder.config is old_config
+        assert "NODE_ID, ACCESS_LOG_PATH cannot change at runtime" in caplog.text
+    
+    def test_invalid_configuration_rejected(self, monkeypatch, agent, caplog):
+        """Test that a configuration failing validation is not applied."""
+        def load_invalid(*args, **kwargs):
+            return NodeConfig(
+                node_id="test-node",
+                node_name="Test Node",
+                central_redis_url="redis://localhost:6379/0",
+                access_log_path="/tmp/test_access.log",
+                batch_size=0
+            )
+        monkeypatch.setattr(ConfigService, "load_from_env", staticmethod(load_invalid))
+        old_config = agent.config
+        
+        assert not agent.reload_config()
+        assert agent.config is old_config
+        assert "BATCH_SIZE must be positive" in caplog.text
+    
+    def test_unreadable_filter_file_rejected(self, monkeypatch, agent):
+        """Test that a reload whose filter cannot be built changes nothing."""
+        forwarder = agent.log_forwarder
+        old_config = agent.config
+        
+        reloaded, _ = self.reload_with(monkeypatch, agent, batch_size=500, filter_ip_file="/nonexistent/ip.txt")
+        
+        assert not reloaded
+        assert agent.config is old_config
+        assert forwarder.config is old_config
+        assert forwarder.log_filter is None
+    
+    def test_unchanged_or_removed_keys_accepted(self, monkeypatch, tmp_path, caplog):
+        """Test that reloading an unchanged .env, or one missing a key, is not rejected."""
+        env_file = tmp_path / ".env"
+        settings = {
+            'NODE_ID': "test-node",
+            'NODE_NAME': "Test Node",
+            'CENTRAL_REDIS_URL': "redis://localhost:6379/0",
+            'ACCESS_LOG_PATH': "/tmp/test_access.log",
+            'BATCH_SIZE': "100",
+        }
+        # Registered with monkeypatch so the values load_dotenv sets are undone
+        for name in settings:
+            monkeypatch.setenv(name, "")
+        env_file.write_text("".join(f"{name}={value}\n" for name, value in settings.items()))
+        load_from_env = ConfigService.load_from_env
+        monkeypatch.setattr(
+            ConfigService, "load_from_env",
+            staticmethod(lambda *args, **kwargs: load_from_env(str(env_file), **kwargs))
+        )
+        config = ConfigService.load_from_env(override=True)
+        agent = NodeAgent(config)
+        agent.log_forwarder = LogForwarder(config)
+        caplog.set_level(logging.INFO)
+        
+        assert agent.reload_config()
+        assert "Configuration unchanged" in caplog.text
+        
+        del settings['BATCH_SIZE']
+        env_file.write_text("".join(f"{name}={value}\n" for name, value in settings.items()))
+        assert agent.reload_config()
+        assert agent.config is config
+        assert agent.log_forwarder.config.batch_size == 100
+        assert "rejected" not in caplog.text
+
+
+class TestStartup:
+    """Test cases for startup cost."""
+    
+    def test_optional_modules_not_imported(self):
+        """Test that redis-py and the profilers are only imported when used."""
+        src = os.path.join(os.path.dirname(__file__), '..', 'src')
+        code = "import sys, node_agent.main; print(sorted({'redis', 'cProfile', 'tracemalloc'} & set(sys.modules)))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=src, capture_output=True, text=True, check=True)
+        
+        assert result.stdout.strip() == "[]"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
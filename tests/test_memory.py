@@ -0,0 +1,98 @@
+"""
+Tests for the memory budget.
+
+This module contains unit tests for cgroup limit detection, entry size
+estimates and the MemoryBudget degradation levels.
+"""
+
+import os
+import tempfile
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.memory import (
+    MEMORY_DROP_RAW_LINES, MEMORY_NORMAL, MEMORY_SHRINK_CACHES, MEMORY_SPILL,
+    MemoryBudget, estimate_entries_size, read_cgroup_limit
+)
+
+
+class TestCgroupLimit:
+    """Test cases for read_cgroup_limit."""
+    
+    def write(self, value):
+        """Write a cgroup file and return its path."""
+        with tempfile.NamedTemporaryFile("w", delete=False) as f:
+            f.write(value)
+        return f.name
+    
+    def test_limits(self):
+        """Test limited, unlimited and unreadable cgroup files."""
+        paths = [self.write("268435456\n"), self.write("max\n"), self.write(str(1 << 62))]
+        try:
+            assert read_cgroup_limit([paths[0]]) == 268435456
+            assert read_cgroup_limit([paths[1], paths[0]]) is None
+            assert read_cgroup_limit([paths[2]]) is None
+            assert read_cgroup_limit(["/nonexistent/memory.max", paths[0]]) == 268435456
+            assert read_cgroup_limit(["/nonexistent/memory.max"]) is None
+        finally:
+            for path in paths:
+                os.unlink(path)
+
+
+class TestMemoryBudget:
+    """Test cases for MemoryBudget class."""
+    
+    def test_estimate_entries_size(self):
+        """Test that estimates grow with the entries and their raw lines."""
+        entries = [{'email': "user@example.com", 'raw_line': "x" * 200} for _ in range(1000)]
+        
+        size = estimate_entries_size(entries)
+        
+        assert size > 1000 * 200
+        assert estimate_entries_size(entries[:100]) < size
+        for entry in entries:
+            entry['raw_line'] = ""
+        assert estimate_entries_size(entries) < size - 1000 * 150
+        assert estimate_entries_size([]) > 0
+    
+    def test_levels_in_order(self):
+        """Test that levels follow the share of the budget used."""
+        used = [0]
+        budget = MemoryBudget(1000, baseline=100, clock=lambda: 42.0)
+        budget.register("buffer", lambda: used[0])
+        
+        levels = []
+        for size in (0, 650, 750, 850, 900):
+            used[0] = size
+            levels.append(budget.update())
+        
+        assert levels == [MEMORY_NORMAL, MEMORY_DROP_RAW_LINES, MEMORY_SHRINK_CACHES, MEMORY_SPILL, MEMORY_SPILL]
+        assert budget.at_least(MEMORY_SHRINK_CACHES)
+        stats = budget.get_stats()
+        assert stats['memory_used'] == 1000
+        assert stats['memory_buffer_bytes'] == 900
+        assert stats['memory_escalations'] == 3
+        assert stats['memory_decisions'][-1] == {'time': 42.0, 'level': MEMORY_SPILL, 'used': 950}
+    
+    def test_hysteresis(self):
+        """Test that a level is only left well below its threshold."""
+        used = [950]
+        budget = MemoryBudget(1000, baseline=0)
+        budget.register("buffer", lambda: used[0])
+        budget.update()
+        
+        used[0] = 850
+        assert budget.update() == MEMORY_SPILL
+        used[0] = 790
+        assert budget.update() == MEMORY_SHRINK_CACHES
+        used[0] = 0
+        assert budget.update() == MEMORY_NORMAL
+        assert budget.escalations == 1
+        assert len(budget.decisions) == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,164 @@
+"""
+Tests for profiling functionality.
+
+This module contains unit tests for the on-demand profiler, the event
+loop lag sampler and the admin endpoint.
+"""
+
+import asyncio
+import json
+import pytest
+import os
+import tempfile
+import time
+import tracemalloc
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.admin import AdminServer
+from node_agent.config import NodeConfig
+from node_agent.profiling import LoopLagMonitor, Profiler
+
+
+class TestProfiler:
+    """Test cases for Profiler class."""
+    
+    @pytest.fixture
+    def profiler(self):
+        """Create a profiler writing to a temporary directory."""
+        return Profiler(os.path.join(tempfile.mkdtemp(), "profiles"), "test-node")
+    
+    def test_cpu_toggle_writes_reports(self, profiler):
+        """Test that toggling twice writes pstats and text reports."""
+        assert profiler.toggle_cpu() is None
+        assert profiler.cpu_running
+        sum(i * i for i in range(10000))
+        
+        path = profiler.toggle_cpu()
+        
+        assert not profiler.cpu_running
+        assert path.endswith(".pstats") and "test-node" in path
+        assert os.path.getsize(path) > 0
+        with open(path[:-len(".pstats")] + ".txt") as f:
+            assert "function calls" in f.read()
+    
+    def test_stop_without_session(self, profiler):
+        """Test that stopping without a session is a no-op."""
+        assert profiler.stop_cpu() is None
+    
+    def test_memory_snapshot(self, profiler):
+        """Test that the first call starts tracing and the second writes a snapshot."""
+        was_tracing = tracemalloc.is_tracing()
+        try:
+            if not was_tracing:
+                assert profiler.snapshot_memory() is None
+                assert tracemalloc.is_tracing()
+            
+            data = [str(i) * 10 for i in range(1000)]
+            path = profiler.snapshot_memory()
+            
+            with open(path) as f:
+                assert f.readline().startswith("Traced memory")
+            assert data
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+
+class TestLoopLagMonitor:
+    """Test cases for LoopLagMonitor class."""
+    
+    def test_record(self):
+        """Test lag statistics and slow sample counting."""
+        monitor = LoopLagMonitor(interval=1.0, warn_threshold=0.1)
+        for lag in (0.01, 0.5, -0.001):
+            monitor.record(lag)
+        
+        stats = monitor.get_stats()
+        assert stats['loop_lag_last'] == 0.0
+        assert stats['loop_lag_max'] == 0.5
+        assert stats['loop_lag_avg'] == pytest.approx(0.17)
+        assert stats['loop_lag_slow_samples'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_detects_blocking_callback(self):
+        """Test that a blocking call shows up as loop lag."""
+        monitor = LoopLagMonitor(interval=0.01, warn_threshold=0.05)
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0)
+        
+        time.sleep(0.1)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        
+        assert monitor.max_lag >= 0.05
+        assert monitor.slow_samples >= 1
+
+
+class TestAdminServer:
+    """Test cases for AdminServer class."""
+    
+    @pytest.fixture
+    async def server(self):
+        """Create a running admin server on an ephemeral port."""
+        profiler = Profiler(tempfile.mkdtemp(), "test-node")
+        server = AdminServer("127.0.0.1:0", profiler, lambda: {'buffer_size': 3})
+        await server.start()
+        server.port = server._server.sockets[0].getsockname()[1]
+        yield server
+        if profiler.cpu_running:
+            profiler.stop_cpu()
+        await server.stop()
+    
+    async def _request(self, server, method, path):
+        """Send a request and return the status code and JSON body."""
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+    
+    @pytest.mark.asyncio
+    async def test_stats_and_health(self, server):
+        """Test the read-only routes."""
+        assert await self._request(server, "GET", "/health") == (200, {'status': "ok"})
+        assert await self._request(server, "GET", "/stats") == (200, {'buffer_size': 3})
+        
+        status, _ = await self._request(server, "GET", "/missing")
+        assert status == 404
+    
+    @pytest.mark.asyncio
+    async def test_cpu_profile_toggle(self, server):
+        """Test starting and stopping a CPU profile over HTTP."""
+        status, body = await self._request(server, "POST", "/profile/cpu")
+        assert status == 200 and body == {'running': True, 'report': None}
+        
+        status, body = await self._request(server, "POST", "/profile/cpu")
+        assert not body['running']
+        assert os.path.exists(body['report'])
+
+
+class TestProfilingConfig:
+    """Test cases for profiling configuration."""
+    
+    def test_admin_listen_validation(self):
+        """Test that admin addresses must be host:port."""
+        base = dict(
+            node_id="n1",
+            node_name="Node",
+            central_redis_url="redis://localhost:6379/0",
+            access_log_path="/tmp/access.log"
+        )
+        assert NodeConfig(**base, admin_listen="127.0.0.1:8080").admin_listen == "127.0.0.1:8080"
+        
+        for value in ["8080", "localhost", "localhost:http"]:
+            with pytest.raises(ValueError, match="ADMIN_LISTEN"):
+                NodeConfig(**base, admin_listen=value)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
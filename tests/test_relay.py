@@ -0,0 +1,251 @@
+"""
+Tests for relay functionality.
+
+This module contains unit tests for the relay frame protocol,
+the RelayClient and the LogRelay aggregator.
+"""
+
+import asyncio
+import json
+import pytest
+import os
+import tempfile
+import zlib
+from unittest.mock import AsyncMock
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.memory import MemoryBudget
+from node_agent.relay import (
+    FLAG_ZLIB, FRAME_HEADER, MAX_FRAME_SIZE, OP_LPUSH, LogRelay, RelayClient,
+    RelayProtocolError, encode_frame, parse_relay_address, read_frame
+)
+
+
+class TestRelayProtocol:
+    """Test cases for relay frame encoding."""
+    
+    def test_parse_relay_address(self):
+        """Test parsing of relay addresses."""
+        assert parse_relay_address("tcp://127.0.0.1:7380") == ("tcp", ("127.0.0.1", 7380))
+        assert parse_relay_address("tcp://[::1]:7380") == ("tcp", ("::1", 7380))
+        assert parse_relay_address("unix:///run/relay.sock") == ("unix", "/run/relay.sock")
+        
+        for url in ["tcp://host", "tcp://:7380", "unix://", "redis://host:6379"]:
+            with pytest.raises(ValueError):
+                parse_relay_address(url)
+    
+    @pytest.mark.asyncio
+    async def test_frame_roundtrip(self):
+        """Test that frames decode to what was encoded."""
+        parts = [b"node_logs_queue", b'{"email": "a"}', b'{"email": "b"}']
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_frame(OP_LPUSH, parts))
+        
+        opcode, flags, payload = await read_frame(reader)
+        
+        assert opcode == OP_LPUSH
+        assert not flags & FLAG_ZLIB
+        assert payload.split(b"\n") == parts
+    
+    @pytest.mark.asyncio
+    async def test_frame_compression(self):
+        """Test that large payloads are compressed and transparently decompressed."""
+        parts = [b"node_logs_queue"] + [b'{"email": "user@example.com"}'] * 100
+        frame = encode_frame(OP_LPUSH, parts, compress_min_bytes=64)
+        reader = asyncio.StreamReader()
+        reader.feed_data(frame)
+        
+        opcode, flags, payload = await read_frame(reader)
+        
+        assert flags & FLAG_ZLIB
+        assert len(frame) < len(b"\n".join(parts))
+        assert payload.split(b"\n") == parts
+    
+    @pytest.mark.asyncio
+    async def test_decompression_is_bounded(self):
+        """Test that a frame expanding past MAX_FRAME_SIZE is rejected."""
+        payload = zlib.compress(b"\0" * (MAX_FRAME_SIZE + 1), 9)
+        reader = asyncio.StreamReader()
+        reader.feed_data(FRAME_HEADER.pack(len(payload) + 2, OP_LPUSH, FLAG_ZLIB) + payload)
+        
+        with pytest.raises(RelayProtocolError, match="exceeds"):
+            await read_frame(reader)
+
+
+class TestLogRelay:
+    """Test cases for LogRelay class."""
+    
+    @pytest.fixture
+    def config(self):
+        """Create test relay configuration."""
+        socket_path = os.path.join(tempfile.mkdtemp(), "relay.sock")
+        return NodeConfig(
+            node_id="test-relay",
+            node_name="Test Relay",
+            central_redis_url="redis://localhost:6379/0",
+            access_log_path="/tmp/test_access.log",
+            batch_size=4,
+            flush_interval=1.0,
+            max_retries=2,
+            retry_delay=0.1,
+            relay_listen=f"unix://{socket_path}"
+        )
+    
+    @pytest.fixture
+    async def relay(self, config):
+        """Create a listening LogRelay with a mocked upstream."""
+        relay = LogRelay(config)
+        relay.redis_client = AsyncMock()
+        relay._running = True
+        relay._server = await relay._start_server()
+        yield relay
+        await relay.stop()
+    
+    @pytest.mark.asyncio
+    async def test_merges_batches_from_agents(self, relay):
+        """Test that small agent batches are merged into one upstream push."""
+        clients = [RelayClient(relay.config.relay_listen) for _ in range(2)]
+        
+        assert await clients[0].ping()
+        await clients[0].lpush("node_logs_queue", json.dumps({'email': 'a'}), json.dumps({'email': 'b'}))
+        relay.redis_client.lpush.assert_not_called()
+        
+        await clients[1].lpush("node_logs_queue", json.dumps({'email': 'c'}), json.dumps({'email': 'd'}))
+        
+        relay.redis_client.lpush.assert_called_once()
+        key, *values = relay.redis_client.lpush.call_args.args
+        assert key == relay.queue_key
+        assert [json.loads(v)['email'] for v in values] == ['a', 'b', 'c', 'd']
+        assert relay.get_stats()['entries_received'] == 4
+        
+        for client in clients:
+            await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_position_passthrough(self, relay):
+        """Test that agent position reads and writes reach the upstream."""
+        relay.redis_client.get = AsyncMock(return_value="1234")
+        client = RelayClient(relay.config.relay_listen)
+        
+        assert await client.get("node_agent:n1:position") == "1234"
+        await client.set("node_agent:n1:position", "5678")
+        
+        relay.redis_client.get.assert_called_once_with("node_agent:n1:position")
+        relay.redis_client.set.assert_called_once_with("node_agent:n1:position", "5678")
+        await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_position_held_until_entries_delivered(self, relay):
+        """Test that a position write waits for the entries received before it."""
+        client = RelayClient(relay.config.relay_listen)
+        
+        await client.lpush("node_logs_queue", json.dumps({'email': 'a'}))
+        await client.set("node_agent:n1:position", "100")
+        relay.redis_client.set.assert_not_called()
+        assert relay.get_stats()['queued_positions'] == 1
+        
+        # A failed delivery keeps the position queued
+        relay.redis_client.lpush = AsyncMock(side_effect=Exception("upstream down"))
+        await relay._flush_batch()
+        relay.redis_client.set.assert_not_called()
+        
+        relay.redis_client.lpush = AsyncMock()
+        await relay._flush_batch()
+        relay.redis_client.set.assert_called_once_with("node_agent:n1:position", "100")
+        assert relay.get_stats()['queued_positions'] == 0
+        await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_batches_refused_while_spilling(self, relay):
+        """Test that a relay over its memory budget refuses batches instead of buffering them."""
+        relay.redis_client.lpush = AsyncMock(side_effect=Exception("upstream down"))
+        client = RelayClient(relay.config.relay_listen)
+        await client.lpush("node_logs_queue", json.dumps({'email': 'a'}))
+        
+        sizes = {'buffer': 950}
+        relay.memory = MemoryBudget(1000, baseline=0)
+        relay.memory.register("buffer", lambda: sizes['buffer'])
+        relay._check_memory()
+        assert relay.get_stats()['memory_level'] == "spill"
+        
+        with pytest.raises(RelayProtocolError, match="memory budget"):
+            await client.lpush("node_logs_queue", json.dumps({'email': 'b'}))
+        assert [entry['email'] for entry in relay.log_buffer] == ['a']
+        assert relay.get_stats()['batches_refused'] == 1
+        
+        # Accepted again once the budget recovers
+        sizes['buffer'] = 0
+        relay._check_memory()
+        await client.lpush("node_logs_queue", json.dumps({'email': 'b'}))
+        assert [entry['email'] for entry in relay.log_buffer] == ['a', 'b']
+        await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_only_position_keys_allowed(self, relay):
+        """Test that agents cannot read or write other keys through the relay."""
+        relay.redis_client.get = AsyncMock(return_value="1")
+        client = RelayClient(relay.config.relay_listen)
+        
+        assert await client.get("{node_logs_queue}:node_agent:n1:position") == "1"
+        for key in ("node_logs_queue", "node_agent:n1:emails", "node_agent::position", "secret"):
+            with pytest.raises(RelayProtocolError, match="not allowed"):
+                await client.get(key)
+            with pytest.raises(RelayProtocolError, match="not allowed"):
+                await client.set(key, "1")
+        
+        relay.redis_client.get.assert_called_once()
+        relay.redis_client.set.assert_not_called()
+        await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_shared_secret(self, config):
+        """Test that with RELAY_SECRET set only clients sending it are served."""
+        config.relay_secret = "s3cret"
+        relay = LogRelay(config)
+        relay.redis_client = AsyncMock()
+        relay._running = True
+        relay._server = await relay._start_server()
+        clients = [RelayClient(config.relay_listen, secret=secret) for secret in ("s3cret", "wrong", "")]
+        try:
+            assert await clients[0].ping()
+            with pytest.raises(RelayProtocolError, match="authentication failed"):
+                await clients[1].ping()
+            with pytest.raises((RelayProtocolError, ConnectionError, asyncio.IncompleteReadError)):
+                await clients[2].lpush("node_logs_queue", json.dumps({'email': 'a'}))
+            
+            assert relay.log_buffer == []
+            assert relay.get_stats()['auth_failures'] == 2
+        finally:
+            for client in clients:
+                await client.close()
+            await relay.stop()
+    
+    @pytest.mark.asyncio
+    async def test_missing_key_returns_none(self, relay):
+        """Test that a nil upstream reply is passed back as None."""
+        relay.redis_client.get = AsyncMock(return_value=None)
+        client = RelayClient(relay.config.relay_listen)
+        
+        assert await client.get("node_agent:n1:position") is None
+        await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_upstream_error_is_reported(self, relay):
+        """Test that upstream failures surface as client errors."""
+        relay.redis_client.get = AsyncMock(side_effect=Exception("upstream down"))
+        client = RelayClient(relay.config.relay_listen)
+        
+        with pytest.raises(Exception, match="upstream down"):
+            await client.get("node_agent:n1:position")
+        
+        # The client reconnects transparently on the next request
+        assert await client.ping()
+        await client.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
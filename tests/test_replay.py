@@ -0,0 +1,197 @@
+"""
+Tests for replay functionality.
+
+This module contains unit tests for the historical log replay CLI.
+"""
+
+import gzip
+import json
+import pytest
+import os
+import tempfile
+from unittest.mock import AsyncMock, MagicMock
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.replay import Replayer, find_log_files, parse_args, parse_time
+
+
+def write_lines(path: str, lines) -> None:
+    """Write access log lines to a plain or gzip-compressed file."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as f:
+        f.write("".join(f"{line}\n" for line in lines))
+
+
+def access_line(minute: int, i: int) -> str:
+    """Build an access log line at 10:<minute>."""
+    return f"2024/01/15 10:{minute:02d}:00 [info] accepted connection from 10.0.0.{i} email: user{i}@example.com"
+
+
+# Access line builders for every supported format, all in local time
+FORMAT_LINES = {
+    "xray": lambda minute, i: (
+        f"2024/01/15 10:{minute:02d}:00.123456 from tcp:10.0.0.{i}:5555 accepted tcp:example.com:443 "
+        f"[VLESS TCP >> DIRECT] email: user{i}"
+    ),
+    "xray-json": lambda minute, i: json.dumps({
+        'time': f"2024-01-15T10:{minute:02d}:00", 'from': f"10.0.0.{i}:5555",
+        'status': "accepted", 'email': f"user{i}", 'inboundTag': "vmess-in"
+    }),
+    "sing-box": lambda minute, i: (
+        f"2024-01-15 10:{minute:02d}:00 INFO [3842527373 0ms] inbound/vless[vless-in]: "
+        f"[user{i}] inbound connection from 10.0.0.{i}:5678"
+    ),
+    "regex": access_line,
+}
+
+
+class TestReplayHelpers:
+    """Test cases for replay helper functions."""
+    
+    def test_parse_time(self):
+        """Test normalization of time range bounds."""
+        assert parse_time("2024-01-15") == "2024/01/15 00:00:00"
+        assert parse_time("2024-01-15T10:30:00") == "2024/01/15 10:30:00"
+        assert parse_time("2024/01/15 10:30:05") == "2024/01/15 10:30:05"
+        with pytest.raises(ValueError):
+            parse_time("yesterday")
+    
+    def test_find_log_files_orders_rotations(self):
+        """Test that rotations are replayed oldest first."""
+        directory = tempfile.mkdtemp()
+        for name in ["access.log", "access.log.1", "access.log.2.gz", "access.log.10.gz"]:
+            write_lines(os.path.join(directory, name), [])
+        
+        files = find_log_files([os.path.join(directory, "access.log*")])
+        
+        assert [os.path.basename(path) for path in files] == [
+            "access.log.10.gz", "access.log.2.gz", "access.log.1", "access.log"
+        ]
+    
+    def test_parse_args(self):
+        """Test command line parsing."""
+        args = parse_args(["a.log", "--since", "2024-01-15", "--dry-run", "--batch-size", "100"])
+        
+        assert args.paths == ["a.log"]
+        assert args.since == "2024/01/15 00:00:00"
+        assert args.dry_run
+        assert args.batch_size == 100
+
+
+class TestReplayer:
+    """Test cases for Replayer class."""
+    
+    @pytest.fixture
+    def config(self):
+        """Create test configuration."""
+        return NodeConfig(
+            node_id="test-node",
+            node_name="Test Node",
+            central_redis_url="redis://localhost:6379/0",
+            access_log_path="/tmp/test_access.log",
+            max_retries=2,
+            retry_delay=0.01
+        )
+    
+    @pytest.fixture
+    def log_files(self):
+        """Create a gzip rotation and a current log file."""
+        directory = tempfile.mkdtemp()
+        write_lines(os.path.join(directory, "access.log.1.gz"), [access_line(m, m) for m in range(0, 5)])
+        write_lines(os.path.join(directory, "access.log"), [access_line(m, m) for m in range(5, 10)] + ["noise"])
+        return find_log_files([os.path.join(directory, "access.log*")])
+    
+    @pytest.mark.asyncio
+    async def test_dry_run_with_time_range(self, config, log_files):
+        """Test that a dry run counts in-range entries without connecting."""
+        replayer = Replayer(
+            config, batch_size=3, since="2024/01/15 10:02:00", until="2024/01/15 10:08:00", dry_run=True
+        )
+        
+        stats = await replayer.run(log_files)
+        
+        assert stats['files_read'] == 2
+        assert stats['lines_read'] == 11
+        assert stats['entries_sent'] == 6
+        assert stats['batches_sent'] == 2
+        assert stats['lines_out_of_range'] == 4
+        assert replayer.redis_client is None
+        assert "would send 6 entries" in replayer.format_progress()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("log_format", sorted(FORMAT_LINES))
+    async def test_time_range_for_every_format(self, config, log_format):
+        """Test that the time range applies to the timestamp of each format."""
+        path = os.path.join(tempfile.mkdtemp(), "access.log")
+        write_lines(path, [FORMAT_LINES[log_format](m, m) for m in range(10)])
+        config.log_format = log_format
+        replayer = Replayer(config, since="2024/01/15 10:02:00", until="2024/01/15 10:08:00", dry_run=True)
+        
+        stats = await replayer.run([path])
+        
+        assert stats['entries_sent'] == 6
+        assert stats['lines_out_of_range'] == 4
+    
+    @pytest.mark.asyncio
+    async def test_pipelined_push(self, config, log_files, monkeypatch):
+        """Test that batches are split into LPUSH chunks within one pipeline."""
+        monkeypatch.setattr("node_agent.replay.LPUSH_CHUNK", 2)
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        client = AsyncMock()
+        client.pipeline = MagicMock(return_value=pipe)
+        monkeypatch.setattr("node_agent.replay.create_redis_client", MagicMock(return_value=client))
+        
+        stats = await Replayer(config, batch_size=5).run(log_files)
+        
+        assert stats['entries_sent'] == 10
+        assert pipe.execute.call_count == 2
+        assert pipe.lpush.call_count == 6
+        values = [json.loads(v) for call in pipe.lpush.call_args_list for v in call.args[1:]]
+        assert [v['client_ip'] for v in values] == [f"10.0.0.{i}" for i in range(10)]
+        client.close.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_configured_encoding(self, config, log_files, monkeypatch):
+        """Test that replay uses SERIALIZER and registers new email ids with the batch."""
+        pytest.importorskip("orjson")
+        config.serializer = "orjson"
+        config.email_dictionary = True
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        client = AsyncMock()
+        client.pipeline = MagicMock(return_value=pipe)
+        client.hgetall = AsyncMock(return_value={"1": "user0@example.com"})
+        monkeypatch.setattr("node_agent.replay.create_redis_client", MagicMock(return_value=client))
+        replayer = Replayer(config, batch_size=100)
+        
+        stats = await replayer.run(log_files)
+        
+        values = [json.loads(v) for call in pipe.lpush.call_args_list for v in call.args[1:]]
+        assert [v['email_id'] for v in values] == list(range(1, 11))
+        assert all('email' not in v for v in values)
+        client.hgetall.assert_called_once_with(replayer.email_dictionary_key)
+        registered = {call.args[1]: call.args[2] for call in pipe.hsetnx.call_args_list}
+        assert registered == {i: f"user{i - 1}@example.com" for i in range(2, 11)}
+        assert replayer.email_dictionary.pending == {}
+        assert stats['serializer'] == "orjson"
+    
+    @pytest.mark.asyncio
+    async def test_send_failure(self, config, log_files, monkeypatch):
+        """Test that a batch failing every retry aborts the replay."""
+        config.sink = "null"
+        replayer = Replayer(config, batch_size=100)
+        replayer.sink.push = AsyncMock(side_effect=OSError("disk full"))
+        
+        with pytest.raises(OSError):
+            await replayer.run(log_files)
+        assert replayer.sink.push.call_count == 2
+        assert replayer.entries_sent == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
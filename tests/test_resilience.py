@@ -0,0 +1,114 @@
+"""
+Tests for resilience helpers.
+
+This module contains unit tests for jittered backoff and
+the CircuitBreaker class.
+"""
+
+import pytest
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.resilience import CircuitBreaker, jittered_backoff
+
+
+class FakeClock:
+    """Controllable monotonic clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestJitteredBackoff:
+    """Test cases for jittered_backoff."""
+    
+    def test_bounds(self):
+        """Test that delays stay within the exponential envelope and cap."""
+        for attempt in range(10):
+            delay = jittered_backoff(attempt, 0.5, cap=4.0)
+            assert 0 <= delay <= min(4.0, 0.5 * (2 ** attempt))
+
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker class."""
+    
+    def test_opens_after_threshold(self):
+        """Test that consecutive failures open the circuit."""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=FakeClock())
+        
+        for _ in range(2):
+            breaker.record_failure()
+            assert breaker.allow_request()
+        
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+        assert breaker.times_opened == 1
+    
+    def test_success_resets_failures(self):
+        """Test that a success clears the failure count."""
+        breaker = CircuitBreaker(failure_threshold=2, clock=FakeClock())
+        
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        
+        assert breaker.state == "closed"
+    
+    def test_half_open_trial(self):
+        """Test the single trial call after the reset timeout."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+        breaker.record_failure()
+        
+        clock.now = 9.9
+        assert not breaker.allow_request()
+        
+        clock.now = 10.0
+        assert breaker.allow_request()
+        assert breaker.state == "half_open"
+        assert not breaker.allow_request()
+        
+        # A failed trial re-opens the circuit for another timeout
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.times_opened == 2
+        
+        clock.now = 20.0
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow_request()
+    
+    def test_cancelled_trial(self):
+        """Test that a cancelled trial lets the next call be the trial."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+        assert breaker.allow_request()
+        
+        breaker.cancel_trial()
+        
+        assert breaker.state == "open"
+        assert breaker.allow_request()
+        assert breaker.times_opened == 1
+    
+    def test_disabled(self):
+        """Test that a zero threshold never opens the circuit."""
+        breaker = CircuitBreaker(failure_threshold=0, clock=FakeClock())
+        
+        for _ in range(100):
+            breaker.record_failure()
+        
+        assert breaker.allow_request()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
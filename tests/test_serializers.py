@@ -0,0 +1,107 @@
+"""
+Tests for serializers.
+
+This module contains unit tests for the serializers and the batch
+decoder of the central side.
+"""
+
+import json
+import os
+import pytest
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.serializers import (
+    SERIALIZER_JSON, SERIALIZERS, available_serializers, create_serializer, decode_batch, decode_entry
+)
+
+
+ENTRY = {
+    'timestamp': 1705314645.123, 'node_id': "node-1", 'node_name': "Node 1", 'client_ip': "10.0.0.1",
+    'email': "user@example.com", 'inbound': "VLESS TCP REALITY", 'raw_line': "line with \"quotes\" and ü",
+}
+
+
+class TestSerializers:
+    """Test cases for the serializers."""
+    
+    @pytest.mark.parametrize("name", SERIALIZERS)
+    def test_round_trip(self, name):
+        """Test that every available serializer decodes its own output."""
+        if name not in available_serializers():
+            pytest.skip(f"{name} is not installed")
+        serializer = create_serializer(name)
+        
+        data = serializer.dumps(ENTRY)
+        
+        assert serializer.name == name
+        assert isinstance(data, bytes) == serializer.binary
+        assert serializer.loads(data) == ENTRY
+        assert decode_entry(data) == ENTRY
+    
+    def test_json_output_unchanged(self):
+        """Test that the default keeps the stdlib encoding."""
+        assert create_serializer(SERIALIZER_JSON).dumps(ENTRY) == json.dumps(ENTRY)
+    
+    def test_orjson_is_compact_json(self):
+        """Test that orjson output is text JSON any decoder reads."""
+        pytest.importorskip("orjson")
+        
+        data = create_serializer("orjson").dumps(ENTRY)
+        
+        assert isinstance(data, str)
+        assert json.loads(data) == ENTRY
+    
+    def test_falls_back_when_not_installed(self, monkeypatch):
+        """Test that a missing library falls back to stdlib json."""
+        monkeypatch.setitem(sys.modules, "msgpack", None)
+        
+        assert create_serializer("msgpack").name == SERIALIZER_JSON
+        assert "msgpack" not in available_serializers()
+        with pytest.raises(ValueError, match="Unknown serializer"):
+            create_serializer("pickle")
+    
+    def test_msgpack_requires_redis_sink(self):
+        """Test configuration validation of SERIALIZER."""
+        options = dict(
+            node_id="test-node",
+            node_name="Test Node",
+            central_redis_url="redis://localhost:6379/0",
+            access_log_path="/tmp/test_access.log",
+        )
+        with pytest.raises(ValueError, match="SERIALIZER must be one of"):
+            NodeConfig(serializer="pickle", **options)
+        with pytest.raises(ValueError, match="requires a Redis sink"):
+            NodeConfig(serializer="msgpack", sink="file", sink_path="/tmp/out.ndjson", **options)
+        with pytest.raises(ValueError, match="RELAY_URL"):
+            NodeConfig(serializer="msgpack", relay_url="tcp://relay:7000", **options)
+        assert NodeConfig(serializer="MsgPack", sink="redis-stream", **options).serializer == "msgpack"
+
+
+class TestDecodeBatch:
+    """Test cases for decode_batch function."""
+    
+    def test_text_and_bytes(self):
+        """Test that JSON batches decode from str and from bytes."""
+        items = [json.dumps(dict(ENTRY, email=email)) for email in ("a", "b")]
+        
+        assert [e['email'] for e in decode_batch(items)] == ["a", "b"]
+        assert [e['email'] for e in decode_batch([item.encode() for item in items])] == ["a", "b"]
+        assert decode_batch([]) == []
+    
+    def test_mixed_encodings(self):
+        """Test a batch mixing encodings and malformed entries."""
+        items = [json.dumps(ENTRY).encode(), b"{broken", "not json", b"\xc1"]
+        if "msgpack" in available_serializers():
+            items.append(create_serializer("msgpack").dumps(ENTRY))
+        
+        entries = decode_batch(items)
+        
+        assert entries == [ENTRY] * (len(items) - 3)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
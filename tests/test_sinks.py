@@ -0,0 +1,183 @@
+"""
+Tests for sink functionality.
+
+This module contains unit tests for the sink implementations and for
+the forwarder delivering through non-Redis sinks.
+"""
+
+import io
+import json
+import pytest
+import os
+import tempfile
+from unittest.mock import AsyncMock, MagicMock
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from node_agent.config import NodeConfig
+from node_agent.log_forwarder import LogForwarder
+from node_agent.sinks import (
+    FileSink, NullSink, RedisListSink, RedisStreamSink, StdoutSink, create_sink
+)
+
+
+class TestSinks:
+    """Test cases for sink implementations."""
+    
+    @pytest.mark.asyncio
+    async def test_redis_list_sink(self):
+        """Test LPUSH delivery with and without depth sampling."""
+        client = AsyncMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[2, 42])
+        client.pipeline = MagicMock(return_value=pipe)
+        sink = RedisListSink(lambda: client, "node_logs_queue")
+        
+        assert await sink.push(["a", "b"]) is None
+        client.lpush.assert_called_once_with("node_logs_queue", "a", "b")
+        
+        assert await sink.push(["c"], sample_depth=True) == 42
+        pipe.lpush.assert_called_once_with("node_logs_queue", "c")
+    
+    @pytest.mark.asyncio
+    async def test_redis_list_sink_registers_fields(self):
+        """Test that hash fields are set in the same pipeline, before the entries."""
+        client = AsyncMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[1, 1])
+        client.pipeline = MagicMock(return_value=pipe)
+        sink = RedisListSink(lambda: client, "node_logs_queue")
+        
+        assert await sink.push(["a"], register=("emails", {1: "alice"})) is None
+        
+        client.lpush.assert_not_called()
+        assert [call[0] for call in pipe.method_calls] == ["hsetnx", "lpush", "execute"]
+        pipe.hsetnx.assert_called_once_with("emails", 1, "alice")
+    
+    @pytest.mark.asyncio
+    async def test_redis_stream_sink(self):
+        """Test XADD delivery in a single pipeline."""
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=["1-0", "1-1", 7])
+        client = MagicMock()
+        client.pipeline = MagicMock(return_value=pipe)
+        sink = RedisStreamSink(lambda: client, "node_logs_stream", maxlen=1000)
+        
+        assert await sink.push(["a", "b"], sample_depth=True) == 7
+        
+        assert pipe.xadd.call_count == 2
+        pipe.xadd.assert_called_with("node_logs_stream", {'data': "b"}, maxlen=1000, approximate=True)
+        pipe.xlen.assert_called_once_with("node_logs_stream")
+    
+    @pytest.mark.asyncio
+    async def test_file_sink_rotation(self):
+        """Test that the NDJSON file is rotated and old files are pruned."""
+        path = os.path.join(tempfile.mkdtemp(), "out", "logs.ndjson")
+        sink = FileSink(path, max_bytes=8, backups=2)
+        
+        for batch in (["1111"], ["2222"], ["3333"], ["4444"]):
+            await sink.push(batch)
+        await sink.close()
+        
+        with open(path) as f:
+            assert f.read() == "4444\n"
+        with open(f"{path}.1") as f:
+            assert f.read() == "3333\n"
+        with open(f"{path}.2") as f:
+            assert f.read() == "2222\n"
+        assert not os.path.exists(f"{path}.3")
+    
+    @pytest.mark.asyncio
+    async def test_stdout_and_null_sinks(self):
+        """Test the stream and null sinks."""
+        stream = io.StringIO()
+        await StdoutSink(stream).push(['{"a": 1}', '{"b": 2}'])
+        assert stream.getvalue() == '{"a": 1}\n{"b": 2}\n'
+        
+        assert await NullSink().push(["x"], sample_depth=True) is None
+    
+    def test_create_sink(self):
+        """Test sink selection from configuration."""
+        config = NodeConfig(
+            node_id="n1",
+            node_name="Node",
+            central_redis_url="",
+            access_log_path="/tmp/access.log",
+            sink="NULL"
+        )
+        assert isinstance(create_sink(config, lambda: None, "q"), NullSink)
+        
+        config.sink = "redis-stream"
+        sink = create_sink(config, lambda: None, "q")
+        assert isinstance(sink, RedisStreamSink) and sink.key == "node_logs_stream"
+    
+    def test_sink_validation(self):
+        """Test sink configuration errors."""
+        base = dict(node_id="n1", node_name="Node", central_redis_url="", access_log_path="/tmp/access.log")
+        
+        with pytest.raises(ValueError, match="SINK must be one of"):
+            NodeConfig(**base, sink="kafka")
+        with pytest.raises(ValueError, match="SINK_PATH"):
+            NodeConfig(**base, sink="file")
+        with pytest.raises(ValueError, match="CENTRAL_REDIS_URL"):
+            NodeConfig(**base)
+        with pytest.raises(ValueError, match="IDEMPOTENT_DELIVERY"):
+            NodeConfig(**base, sink="null", idempotent_delivery=True)
+
+
+class TestForwarderWithSinks:
+    """Test cases for the forwarder delivering through non-Redis sinks."""
+    
+    @pytest.fixture
+    def config(self):
+        """Create a file sink configuration without a central Redis."""
+        directory = tempfile.mkdtemp()
+        return NodeConfig(
+            node_id="test-node",
+            node_name="Test Node",
+            central_redis_url="",
+            access_log_path=os.path.join(directory, "access.log"),
+            batch_size=2,
+            max_retries=2,
+            retry_delay=0.01,
+            sink="file",
+            sink_path=os.path.join(directory, "logs.ndjson"),
+            checkpoint_file=os.path.join(directory, "checkpoint.json")
+        )
+    
+    @pytest.mark.asyncio
+    async def test_file_sink_delivery_and_checkpoint(self, config):
+        """Test that batches reach the file and advance the local checkpoint."""
+        forwarder = LogForwarder(config)
+        forwarder.current_position = 321
+        for i in range(2):
+            await forwarder._process_log_line(
+                f"2024/01/15 10:30:45 [info] accepted connection from 10.0.0.{i} email: user{i}@example.com"
+            )
+        await forwarder.sink.close()
+        
+        with open(config.sink_path) as f:
+            assert [json.loads(line)['client_ip'] for line in f] == ["10.0.0.0", "10.0.0.1"]
+        assert forwarder.checkpoint_file.load() == 321
+        assert forwarder.get_stats()['sink'] == "file"
+        assert forwarder.redis_client is None
+    
+    @pytest.mark.asyncio
+    async def test_sink_failure_keeps_batch(self, config):
+        """Test that a failing sink goes through the usual retry and buffering."""
+        forwarder = LogForwarder(config)
+        forwarder.sink.push = AsyncMock(side_effect=OSError("disk full"))
+        forwarder.log_buffer = [{'n': 1}]
+        
+        await forwarder._flush_batch()
+        
+        assert forwarder.sink.push.call_count == 2
+        assert forwarder.log_buffer == [{'n': 1}]
+        assert forwarder._pending_batch is not None
+        assert forwarder.checkpoint_position is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])